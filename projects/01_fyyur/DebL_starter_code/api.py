@@ -0,0 +1,293 @@
+#----------------------------------------------------------------------------#
+# JSON API, version 1 (/api/v1).
+#
+# Venues and artists use the dict shapes of the detail pages (see
+# queries.venue_detail / artist_detail), and shows use the /shows listing
+# shape. Every endpoint takes ?fields=a,b,c. Only the columns behind the
+# requested fields are selected, and show lists are loaded only when asked
+# for. Responses carry a strong ETag (a hash of the body) and answer
+# If-None-Match with 304 Not Modified. /venues/browse and /artists/browse
+# add facet filters and counts (see facets.py).
+#----------------------------------------------------------------------------#
+
+import hashlib
+import json
+from datetime import date
+import dateutil.parser
+from flask import Blueprint, current_app, request, abort
+from sqlalchemy import func
+from models import db, Venue, Artist, Show, Job
+from queries import venue_detail, artist_detail, shows_page
+from jobs import job_status
+from show_calendar import show_calendar, parse_range
+from facets import facet_indexes, facet_filters
+
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+
+api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+# API field -> column, for the fields that come straight from the row
+VENUE_COLUMNS = {
+    'id': Venue.id,
+    'name': Venue.name,
+    'genres': Venue.genres,
+    'address': Venue.address,
+    'city': Venue.city,
+    'state': Venue.state,
+    'phone': Venue.phone,
+    'website': Venue.website_link,
+    'facebook_link': Venue.facebook_link,
+    'seeking_talent': Venue.seeking_talent,
+    'seeking_description': Venue.seeking_description,
+    'image_link': Venue.image_link,
+    'num_upcoming_shows': func.coalesce(Venue.upcoming_shows, 0),
+}
+ARTIST_COLUMNS = {
+    'id': Artist.id,
+    'name': Artist.name,
+    'genres': Artist.genres,
+    'city': Artist.city,
+    'state': Artist.state,
+    'phone': Artist.phone,
+    'facebook_link': Artist.facebook_link,
+    'website_link': Artist.website_link,
+    'image_link': Artist.image_link,
+    'seeking_venue': Artist.seeking_venue,
+    'seeking_description': Artist.seeking_description,
+    'num_upcoming_shows': func.coalesce(Artist.upcoming_shows, 0),
+}
+# detail-only fields that need the show list
+SHOW_FIELDS = ('upcoming_shows', 'upcoming_shows_count', 'past_shows', 'past_shows_count')
+SHOW_LIST_FIELDS = ('id', 'venue_id', 'venue_name', 'artist_id', 'artist_name',
+                    'artist_image_link', 'start_time')
+DEFAULT_LIST_FIELDS = ('id', 'name', 'city', 'state', 'num_upcoming_shows')
+
+
+def _json_value(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def json_response(data):
+    """Serialize ``data`` deterministically and answer conditional GETs.
+
+    The strong ETag is a hash of the exact body, so equal bodies always
+    share a tag and a matching If-None-Match gets an empty 304.
+    """
+
+    body = json.dumps(data, default=_json_value, sort_keys=True, separators=(',', ':'))
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(hashlib.sha256(body.encode()).hexdigest())
+    return response.make_conditional(request)
+
+
+def requested_fields(allowed, default):
+    """The ?fields= list, in request order; 400 for unknown names."""
+
+    value = request.args.get('fields')
+    if not value:
+        return list(default)
+    fields = []
+    for name in value.split(','):
+        name = name.strip()
+        if name not in allowed:
+            abort(400, f'Unknown field {name!r}')
+        if name not in fields:
+            fields.append(name)
+    return fields
+
+
+def select_fields(model, columns, fields):
+    """Query for ``model.id`` followed by the columns behind ``fields``."""
+
+    return db.session.query(model.id, *[columns[name].label(name) for name in fields])
+
+
+def listing(model, columns):
+    fields = requested_fields(columns, DEFAULT_LIST_FIELDS)
+    limit = request.args.get('limit', API_PAGE_SIZE, type=int)
+    if not 0 < limit <= API_MAX_PAGE_SIZE:
+        abort(400, f'limit must be between 1 and {API_MAX_PAGE_SIZE}')
+    rows = select_fields(model, columns, fields) \
+        .filter(model.id > request.args.get('after_id', 0, type=int)) \
+        .order_by(model.id) \
+        .limit(limit + 1) \
+        .all()
+    next_after_id = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after_id = rows[-1][0]
+    return json_response({
+        'data': [dict(zip(fields, row[1:])) for row in rows],
+        'next_after_id': next_after_id,
+    })
+
+
+def faceted_listing(model, columns):
+    fields = requested_fields(columns, DEFAULT_LIST_FIELDS)
+    limit = request.args.get('limit', API_PAGE_SIZE, type=int)
+    if not 0 < limit <= API_MAX_PAGE_SIZE:
+        abort(400, f'limit must be between 1 and {API_MAX_PAGE_SIZE}')
+    try:
+        filters = facet_filters(model, request.args)
+    except ValueError as e:
+        abort(400, str(e))
+    page = facet_indexes[model].browse(filters, request.args.get('after_id', 0, type=int), limit)
+    rows = []
+    if page['ids']:
+        rows = select_fields(model, columns, fields) \
+            .filter(model.id.in_(page['ids'])) \
+            .order_by(model.id) \
+            .all()
+    return json_response({
+        'data': [dict(zip(fields, row[1:])) for row in rows],
+        'count': page['count'],
+        'facets': page['facets'],
+        'next_after_id': page['next_after_id'],
+    })
+
+
+def detail(model, columns, entity_id, load_detail):
+    fields = requested_fields(list(columns) + list(SHOW_FIELDS),
+                              list(columns) + list(SHOW_FIELDS))
+    if any(name in SHOW_FIELDS for name in fields):
+        # the detail page query already has every field; it counts upcoming
+        # shows exactly rather than reading the counter
+        data = load_detail(entity_id)
+        if data is None:
+            abort(404)
+        data['num_upcoming_shows'] = data['upcoming_shows_count']
+        return json_response({'data': {name: data[name] for name in fields}})
+
+    row = select_fields(model, columns, fields).filter(model.id == entity_id).one_or_none()
+    if row is None:
+        abort(404)
+    return json_response({'data': dict(zip(fields, row[1:]))})
+
+
+#  Venues and artists
+#  ----------------------------------------------------------------
+
+@api_v1.route('/venues')
+def venues():
+    return listing(Venue, VENUE_COLUMNS)
+
+
+@api_v1.route('/venues/browse')
+def browse_venues():
+    # ?genres=, ?state=, ?city= (repeatable) and ?seeking_talent=true|false
+    return faceted_listing(Venue, VENUE_COLUMNS)
+
+
+@api_v1.route('/venues/<int:venue_id>')
+def venue(venue_id):
+    return detail(Venue, VENUE_COLUMNS, venue_id, venue_detail)
+
+
+@api_v1.route('/artists')
+def artists():
+    return listing(Artist, ARTIST_COLUMNS)
+
+
+@api_v1.route('/artists/browse')
+def browse_artists():
+    # ?genres=, ?state=, ?city= (repeatable) and ?seeking_venue=true|false
+    return faceted_listing(Artist, ARTIST_COLUMNS)
+
+
+@api_v1.route('/artists/<int:artist_id>')
+def artist(artist_id):
+    return detail(Artist, ARTIST_COLUMNS, artist_id, artist_detail)
+
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@api_v1.route('/shows')
+def shows():
+    # same filters as the /shows page: ?when=, ?from=, ?to= and ?cursor=
+    fields = requested_fields(SHOW_LIST_FIELDS, SHOW_LIST_FIELDS)
+    limit = request.args.get('limit', API_PAGE_SIZE, type=int)
+    if not 0 < limit <= API_MAX_PAGE_SIZE:
+        abort(400, f'limit must be between 1 and {API_MAX_PAGE_SIZE}')
+    start, end = request.args.get('from'), request.args.get('to')
+    try:
+        page = shows_page(when=request.args.get('when', 'all'),
+                          start=dateutil.parser.parse(start) if start else None,
+                          end=dateutil.parser.parse(end) if end else None,
+                          cursor=request.args.get('cursor'), per_page=limit)
+    except (ValueError, OverflowError) as e:
+        abort(400, str(e))
+    return json_response({
+        'data': [{name: show[name] for name in fields} for show in page['shows']],
+        'next_cursor': page['next_cursor'],
+    })
+
+
+@api_v1.route('/calendar')
+def calendar():
+    # same parameters as the /shows/calendar page, plus ?limit=
+    try:
+        start, end = parse_range(request.args.get('from'), request.args.get('to'))
+        page = show_calendar(start, end,
+                             city=request.args.get('city'),
+                             state=request.args.get('state'),
+                             genre=request.args.get('genre'),
+                             cursor=request.args.get('cursor'),
+                             per_page=request.args.get('limit', API_PAGE_SIZE, type=int))
+    except (ValueError, OverflowError) as e:
+        abort(400, str(e))
+    return json_response({'data': page['days'], 'next_cursor': page['next_cursor']})
+
+
+@api_v1.route('/shows/<int:show_id>')
+def show(show_id):
+    fields = requested_fields(SHOW_LIST_FIELDS, SHOW_LIST_FIELDS)
+    row = db.session.query(
+            Show.id, Show.venue_id, Venue.name.label('venue_name'),
+            Show.artist_id, Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link'), Show.start_time) \
+        .join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id) \
+        .filter(Show.id == show_id) \
+        .one_or_none()
+    if row is None:
+        abort(404)
+    return json_response({'data': {name: getattr(row, name) for name in fields}})
+
+
+#  Background jobs
+#  ----------------------------------------------------------------
+
+@api_v1.route('/jobs')
+def jobs():
+    # number of jobs in each status; ?key= looks one up by idempotency key
+    key = request.args.get('key')
+    if key:
+        job = Job.query.filter_by(idempotency_key=key).one_or_none()
+        if job is None:
+            abort(404)
+        return json_response({'data': job_status(job)})
+    counts = db.session.query(Job.status, func.count(Job.id)).group_by(Job.status)
+    return json_response({'data': dict(counts.all())})
+
+
+@api_v1.route('/jobs/<int:job_id>')
+def job(job_id):
+    job = Job.query.get(job_id)
+    if job is None:
+        abort(404)
+    return json_response({'data': job_status(job)})
+
+
+#  Errors
+#  ----------------------------------------------------------------
+
+@api_v1.errorhandler(400)
+@api_v1.errorhandler(404)
+def api_error(error):
+    response = json_response({'error': {'code': error.code, 'message': error.description}})
+    response.status_code = error.code
+    return response
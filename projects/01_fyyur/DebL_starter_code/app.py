@@ -3,17 +3,31 @@
 #----------------------------------------------------------------------------#
 
 import json
+from datetime import datetime
 import dateutil.parser
-import babel
 from flask import Flask, render_template, request
-from flask import Response, flash, redirect, url_for
+from flask import Response, flash, redirect, url_for, abort, jsonify, stream_with_context
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
+from models import db, Venue, Artist, Show
+from queries import venue_areas, venue_detail, artist_detail, shows_page, counterpart_ids
+from jobs import job_queue
+from genres import genre_cache
+from commands import fyyur_cli
+from search import search
+from formatting import format_datetime
+from cache import page_cache
+from pool import pool_status
+from profiler import SQLProfiler
+from exporter import Export, EXPORT_KINDS
+from show_calendar import show_calendar, parse_range
+from bookings import find_conflicts
+from sqlalchemy.exc import IntegrityError
+from api import api_v1
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -21,87 +35,19 @@ from forms import *
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+db.init_app(app)
 
 migrate = Migrate(app, db)
-
-#----------------------------------------------------------------------------#
-# Models.
-#----------------------------------------------------------------------------#
-
-
-class Venue(db.Model):
-    __tablename__ = 'Venue'
-
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(), nullable=False)
-    city = db.Column(db.String(120), nullable=False)
-    state = db.Column(db.String(120), nullable=False)
-    address = db.Column(db.String(240), nullable=False)
-    phone = db.Column(db.String(120), nullable=False)
-    image_link = db.Column(db.String(500))
-    facebook_link = db.Column(db.String(120))
-    website_link = db.Column(db.String(250))
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
-    seeking_talent = db.Column(db.Boolean, default=True)
-    seeking_description = db.Column(db.String(250))
-    upcoming_shows = db.Column(db.Integer)
-
-    def __repr__(self):
-        return f'<Venue {self.id} name: {self.name}>'
-
-
-class Artist(db.Model):
-    __tablename__ = 'Artist'
-
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String, nullable=False)
-    city = db.Column(db.String(120), nullable=False)
-    state = db.Column(db.String(120), nullable=False)
-    phone = db.Column(db.String(120), nullable=False)
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
-    image_link = db.Column(db.String(500))
-    facebook_link = db.Column(db.String(120))
-    website_link = db.Column(db.String(120))
-    seeking_venue = db.Column(db.Boolean, default=True)
-    seeking_description = db.Column(db.String(250))
-
-    def __repr__(self):
-        return f'<Artist {self.id} name: {self.name}>'
-
-
-class Show(db.Model):
-    __tablename__ = 'Show'
-
-    id = db.Column(db.Integer, primary_key=True)
-    start_time = db.Column(db.DateTime(), nullable=False,
-        default=datetime.utcnow)
-    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'),
-        nullable=False)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'),
-        nullable=False)
-    artist = db.relationship(Artist,
-        backref=db.backref('shows', cascade='all, delete'))
-    venue = db.relationship(Venue,
-        backref=db.backref('shows', cascade='all, delete'))
-
-    def __repr__(self):
-        return f'<Show {self.id}, Artist {self.artist_id}, Venue {self.venue_id}>'
+sql_profiler = SQLProfiler(app)
+job_queue.init_app(app)
+genre_cache.init_app(app)
+app.cli.add_command(fyyur_cli)
+app.register_blueprint(api_v1)
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-
-def format_datetime(value, format='medium'):
-    if isinstance(value, str):
-        date = dateutil.parser.parse(value)
-    elif format == 'medium':
-        format="EE MM, dd, y h:mma"
-    else:
-        date = value
-    return babel.dates.format_datetime(date, format, locale='en')
-
 app.jinja_env.filters['datetime'] = format_datetime
 
 #----------------------------------------------------------------------------#
@@ -113,112 +59,35 @@ def index():
     return render_template('pages/home.html')
 
 
+@app.route('/health')
+def health():
+    # connection pool and page cache statistics for this worker
+    return jsonify({
+        'database': pool_status(db.engine),
+        'page_cache': page_cache.stats()
+    })
+
+
 #  Venues
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@page_cache.cached('venues')
 def venues():
-    data = []
-    venues = Venue.query.all()
-    # Use set so there are no duplicate venues
-    locations = set()
-
-    for venue in venues:
-        # add city/state tuples
-      locations.add((venue.city, venue.state))
-
-    # for each unique city/state, add venues
-    for location in locations:
-      data.append({
-          "city": location[0],
-          "state": location[1],
-          "venues": []
-      })
-
-    for venue in venues:
-      num_upcoming_shows = 0
-
-      shows = Show.query.filter_by(venue_id=venue.id).all()
-
-      # get current date to filter num_upcoming_shows
-      current_date = datetime.now()
-
-      for show in shows:
-        if show.start_time > current_date:
-            num_upcoming_shows += 1
-
-      for venue_location in data:
-        if venue.state == venue_location['state'] and venue.city == venue_location['city']:
-          venue_location['venues'].append({
-              "id": venue.id,
-              "name": venue.name,
-              "num_upcoming_shows": num_upcoming_shows
-          })
-
-    return render_template('pages/venues.html', areas=data)
+    return render_template('pages/venues.html', areas=venue_areas())
 
 @app.route('/venues/search', methods=['GET', 'POST'])
 def search_venues():
-
-    search_term = request.form.get('search_term', '')
-    venues = Venue.query.filter(Venue.name.ilike(f"%{search_term}%")).all()
-    venue_list = []
-    now = datetime.now()
-    for venue in venues:
-        venue_list.append({
-            "id": venue.id,
-            "name": venue.name,
-            "num_upcoming_shows": len(Venue.query.join(Show).filter(Show.start_time > datetime.utcnow(), Show.venue_id == venue.id).all())
-        })
-        print(venue_list)
-
-    response = {
-        "count": len(venues),
-        "data": venue_list
-    }
-
-    return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+    search_term = request.values.get('search_term', '')
+    response = search(Venue, search_term, page=request.args.get('page', 1, type=int))
+    return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
 @app.route('/venues/<int:venue_id>')
+@page_cache.cached('venue:{venue_id}')
 def show_venue(venue_id):
-  
-    venue = Venue.query.filter_by(id=venue_id).first()
-    data = None
-    shows = db.session.query(Show).filter(Show.venue_id == venue.id).all()
-    artist_up_show = []
-    artist_past_show = []
-    for show in shows:
-        artist = Artist.query.filter_by(id=show.artist_id).first()
-        start_time = format_datetime(str(show.start_time))
-        artist_show = {
-            "artist_id": artist.id,
-            "artist_name": artist.name,
-            "artist_image_link": artist.image_link,
-            "start_time": start_time
-        }
-        if show.start_time >= datetime.utcnow():
-            artist_up_show.append(artist_show)
-        elif show.start_time < datetime.utcnow():
-            artist_past_show.append(artist_show)
-    data = {
-            "id": venue.id,
-            "name": venue.name,
-            "genres": venue.genres,
-            "address": venue.address,
-            "city": venue.city,
-            "state": venue.state,
-            "phone": venue.phone,
-            "website": venue.website_link,
-            "facebook_link": venue.facebook_link,
-            "seeking_talent": venue.seeking_talent,
-            "seeking_description": venue.seeking_description,
-            "image_link": venue.image_link,
-            "upcoming_shows": artist_up_show,
-            "upcoming_shows_count": len(artist_up_show),
-            "past_shows": artist_past_show,
-            "past_shows_count": len(artist_past_show),
-            }
-
+    data = venue_detail(venue_id)
+    if data is None:
+        abort(404)
     return render_template('pages/show_venue.html', venue=data)
 
 #  Create Venue
@@ -240,7 +109,11 @@ def create_venue_submission():
               facebook_link=form.facebook_link.data, seeking_description=form.seeking_description.data,
               website_link=form.website_link.data, seeking_talent=form.seeking_talent.data)
         db.session.add(venue)
+        db.session.flush()
+        job_queue.enqueue('refresh_recommendations', {'venue_ids': [venue.id]})
         db.session.commit()
+        job_queue.notify()
+        page_cache.invalidate_venue()
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
     except ValueError as e:
         error = True
@@ -260,8 +133,14 @@ def delete_venue(venue_id):
     error = False
     try:
         venue = Venue.query.filter_by(id=venue_id).first_or_404()
+        artist_ids = counterpart_ids(Venue, venue.id)
         db.session.delete(venue)
+        # the artists' counters lose the venue's shows; recomputed in the background
+        job_queue.enqueue('refresh_counters', {'artist_ids': artist_ids})
+        job_queue.enqueue('refresh_recommendations', {'venue_ids': [venue.id]})
         db.session.commit()
+        job_queue.notify()
+        page_cache.invalidate_venue(venue_id, artist_ids)
     except Exception as e:
         error = True
         print(f'Error ==> {e}')
@@ -277,6 +156,7 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists', methods=['GET'])
+@page_cache.cached('artists')
 def artists():
 
     all_artist = []
@@ -291,66 +171,18 @@ def artists():
             data.append({"id": artist.id, "name": artist.name})
     return render_template("pages/artists.html", artists=all_artist)
 
-@app.route('/artists/search', methods=['POST'])
+@app.route('/artists/search', methods=['GET', 'POST'])
 def search_artists():
-
-    search_term = request.form.get("search_term", "")
-    search_response = Artist.query.filter(Artist.name.ilike(f"%{search_term}%")).all()
-    data = []
-    for artist in search_response:
-        data.append({
-            "artist_id": artist.id,
-            "name": artist.name,
-            "num_upcoming_shows": len(Artist.query.join(Show).filter(Show.start_time > datetime.now(), Show.artist_id == artist.id).all())
-        })
-
-    response = {
-        "count": len(search_response),
-        "data": data
-    }
-    return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+    search_term = request.values.get('search_term', '')
+    response = search(Artist, search_term, page=request.args.get('page', 1, type=int))
+    return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 @app.route('/artists/<int:artist_id>')
+@page_cache.cached('artist:{artist_id}')
 def show_artist(artist_id):
-
-    shows = db.session.query(Show).filter(Show.artist_id == artist_id).all()   
-    venue_past_shows = []
-    venue_up_shows = []
-    artist = Artist.query.filter_by(id=artist_id).first()
-    data = None
-
-    for show in shows:
-        venue = Venue.query.filter_by(id=show.venue_id).first()
-        start_time = format_datetime(str(show.start_time))
-
-        venue_show = {
-            "venue_id": venue.id,
-            "venue_name": venue.name,
-            "venue_image_link": venue.image_link,
-            "start_time": str(start_time)
-        }
-        if show.start_time >= datetime.utcnow():
-            venue_up_shows.append(venue_show)
-        elif show.start_time < datetime.utcnow():
-            venue_past_shows.append(venue_show)
-
-    data = {
-            "id": artist.id,
-            "name": artist.name,
-            "genres": artist.genres,
-            "city": artist.city,
-            "state": artist.state,
-            "phone": artist.phone,
-            "facebook_link": artist.facebook_link,
-            "website_link": artist.website_link,
-            "image_link": artist.image_link,
-            "seeking_venue": artist.seeking_venue,
-            "seeking_description": artist.seeking_description,
-            "upcoming_shows_count": len(venue_up_shows),
-            "upcoming_shows":  venue_up_shows,
-            "past_shows": venue_past_shows,
-            "past_shows_count": len(venue_past_shows),
-        }
+    data = artist_detail(artist_id)
+    if data is None:
+        abort(404)
     return render_template('pages/show_artist.html', artist=data)
 
 #  Update
@@ -390,7 +222,10 @@ def edit_artist_submission(artist_id):
         form.image_link.data = artist.image_link
 
         db.session.add(artist)
-        db.session.commit()  
+        job_queue.enqueue('refresh_recommendations', {'artist_ids': [artist.id]})
+        db.session.commit()
+        job_queue.notify()
+        page_cache.invalidate_artist(artist_id, counterpart_ids(Artist, artist_id))
         flash('Artist was successfully updated!')
     except ValueError as e: 
         error = True
@@ -438,7 +273,10 @@ def edit_venue_submission(venue_id):
     venue.image_link = form.image_link.data
 
     db.session.add(venue)
+    job_queue.enqueue('refresh_recommendations', {'venue_ids': [venue.id]})
     db.session.commit()
+    job_queue.notify()
+    page_cache.invalidate_venue(venue_id, counterpart_ids(Venue, venue_id))
     return redirect(url_for('show_venue', venue_id=venue_id))
 
 #  Create Artist
@@ -460,7 +298,11 @@ def create_artist_submission():
               facebook_link=form.facebook_link.data, seeking_description=form.seeking_description.data,
               website_link=form.website_link.data, seeking_venue=form.seeking_venue.data)
         db.session.add(artist)
+        db.session.flush()
+        job_queue.enqueue('refresh_recommendations', {'artist_ids': [artist.id]})
         db.session.commit()
+        job_queue.notify()
+        page_cache.invalidate_artist()
         flash("Artist " + request.form['name'] + " was successfully listed!")
     except ValueError as e:
         error = True
@@ -479,8 +321,13 @@ def delete_artist(artist_id):
     error = False
     try:
         artist = Artist.query.filter_by(id=artist_id).first_or_404()
+        venue_ids = counterpart_ids(Artist, artist.id)
         db.session.delete(artist)
+        job_queue.enqueue('refresh_counters', {'venue_ids': venue_ids})
+        job_queue.enqueue('refresh_recommendations', {'artist_ids': [artist.id]})
         db.session.commit()
+        job_queue.notify()
+        page_cache.invalidate_artist(artist_id, venue_ids)
     except Exception as e:
         error = True
         print(f'Error ==> {e}')
@@ -498,28 +345,38 @@ def delete_artist(artist_id):
 
 @app.route('/shows')
 def shows():
-  # displays list of shows at /shows
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-    all_shows = []
+    # displays a page of shows at /shows, in start time order.
+    # ?when=upcoming|past|all, ?from= and ?to= dates narrow the listing and
+    # ?cursor= is the next_cursor token of the previous page.
+    when = request.args.get('when', 'all')
     try:
-        venues_all = Venue.query.join(Artist, Venue.state == Artist.state).all()
-        data = db.session.query(Show).all()
-        for show in data:
-            artist = Artist.query.filter_by(id=show.artist_id).first()
-            venue = Venue.query.filter_by(id=show.venue_id).first()
-            all_shows.append({
-                        "venue_id": show.id,
-                        "venue_name": venue.name,
-                        "artist_id": artist.id,
-                        "artist_name":artist.name,
-                        "artist_image_link": artist.image_link,
-                        "start_time": show.start_time
-                    })
-    except Exception as e:
-        print(e)
-        pass
-    return render_template('pages/shows.html', shows=all_shows)
+        start = request.args.get('from')
+        end = request.args.get('to')
+        page = shows_page(when=when,
+                          start=dateutil.parser.parse(start) if start else None,
+                          end=dateutil.parser.parse(end) if end else None,
+                          cursor=request.args.get('cursor'))
+    except (ValueError, OverflowError):
+        abort(400)
+    return render_template('pages/shows.html', shows=page['shows'],
+                           next_cursor=page['next_cursor'], filters=request.args)
+
+@app.route('/shows/calendar')
+def show_calendar_page():
+    # shows grouped by day, for ?from= to ?to= (default: the next 7 days),
+    # narrowed by ?city=, ?state= and ?genre=; ?cursor= continues a page
+    try:
+        start, end = parse_range(request.args.get('from'), request.args.get('to'))
+        page = show_calendar(start, end,
+                             city=request.args.get('city'),
+                             state=request.args.get('state'),
+                             genre=request.args.get('genre'),
+                             cursor=request.args.get('cursor'))
+    except (ValueError, OverflowError):
+        abort(400)
+    return render_template('pages/calendar.html', days=page['days'],
+                           next_cursor=page['next_cursor'], filters=request.args,
+                           states=get_states(States), genres=get_genres(Genres))
 
 @app.route('/shows/create')
 def create_shows():
@@ -535,13 +392,34 @@ def create_show_submission():
     form = ShowForm()
 
     try:
-        show = Show(artist_id=form.artist_id.data, venue_id=form.venue_id.data,
-              start_time=form.start_time.data)
+        venue_id, artist_id = int(form.venue_id.data), int(form.artist_id.data)
+        if not all([form.start_time.validate(form), form.duration.validate(form)]):
+            return render_template('forms/new_show.html', form=form)
+        conflicts = find_conflicts(venue_id, artist_id, form.start_time.data, form.duration.data)
+        if conflicts:
+            # list every clashing booking under the start time
+            form.start_time.errors = [
+                f"{' and '.join(c['booked']).capitalize()} already booked: "
+                f"{c['artist_name']} at {c['venue_name']}, "
+                f"{format_datetime(c['start_time'])} to {format_datetime(c['end_time'])}"
+                for c in conflicts]
+            flash('Show could not be listed: it overlaps existing bookings.')
+            return render_template('forms/new_show.html', form=form)
+        show = Show(artist_id=artist_id, venue_id=venue_id,
+              start_time=form.start_time.data, duration_minutes=form.duration.data)
         db.session.add(show)
+        job_queue.enqueue('refresh_counters',
+                          {'venue_ids': [venue_id], 'artist_ids': [artist_id]})
+        if show.start_time < datetime.utcnow():
+            # a past show adds to the pair's history; upcoming ones are
+            # rescored by roll-forward once they start
+            job_queue.enqueue('refresh_recommendations', {'artist_ids': [artist_id]})
         db.session.commit()
+        job_queue.notify()
+        page_cache.invalidate_venue(venue_id, [artist_id])
         # on successful db insert, flash success
         flash("Show was successfully listed!")
-    except ValueError as e:
+    except (ValueError, IntegrityError) as e:
         error = True
         print(e)
         db.session.rollback()
@@ -551,6 +429,25 @@ def create_show_submission():
     return redirect(url_for('shows'))
     #return render_template('pages/home.html')
 
+#  Export
+#  ----------------------------------------------------------------
+
+@app.route('/export/<kind>')
+def export(kind):
+    # streams a whole table; ?format=csv|jsonl|parquet, and ?since=<datetime>
+    # or ?since_id=<id> for incremental exports
+    if kind not in EXPORT_KINDS:
+        abort(404)
+    since, since_id = request.args.get('since'), request.args.get('since_id')
+    try:
+        dump = Export(kind, request.args.get('format', 'csv'),
+                      since=dateutil.parser.parse(since) if since else None,
+                      since_id=int(since_id) if since_id else None)
+    except (ValueError, OverflowError):
+        abort(400)
+    return Response(stream_with_context(dump), mimetype=dump.mimetype, headers={
+        'Content-Disposition': f'attachment; filename={dump.filename}'})
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
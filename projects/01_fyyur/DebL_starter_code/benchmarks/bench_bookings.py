@@ -0,0 +1,54 @@
+"""Benchmark the booking-conflict check as the Show table grows.
+
+The check should cost about the same whatever the table size, since it
+only scans the venue's and artist's shows near the new start time.
+
+    python benchmarks/bench_bookings.py --sizes 1000 10000 --shows-per-venue 20
+"""
+
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from common import DEFAULT_DATABASE_URL, QueryCounter, db, seed_catalogue, setup_database
+from bookings import audit_bookings, find_conflicts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000],
+                        help='Numbers of venues to seed.')
+    parser.add_argument('--shows-per-venue', type=int, default=20)
+    parser.add_argument('--checks', type=int, default=200)
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    for n_venues in args.sizes:
+        ctx = setup_database(args.database_url)
+        seed_catalogue(n_venues, shows_per_venue=args.shows_per_venue)
+        n_artists = max(1, n_venues // 2)
+        samples, conflicts = [], 0
+        with QueryCounter(db.engine) as counter:
+            for _ in range(args.checks):
+                start = datetime.utcnow() + timedelta(hours=rnd.randint(-24 * 365, 24 * 365))
+                began = time.perf_counter()
+                conflicts += bool(find_conflicts(rnd.randint(1, n_venues),
+                                                 rnd.randint(1, n_artists), start, 120))
+                samples.append(time.perf_counter() - began)
+        began = time.perf_counter()
+        report = audit_bookings()
+        audit = time.perf_counter() - began
+        print(f'{n_venues * args.shows_per_venue} shows: check median '
+              f'{statistics.median(samples) * 1000:.2f} ms, '
+              f'{counter.count / args.checks:.0f} queries each, {conflicts} conflicts found; '
+              f"audit {audit:.2f}s ({len(report['venues'])} venue, "
+              f"{len(report['artists'])} artist overlaps)")
+        db.session.remove()
+        ctx.pop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Benchmark the show calendar over a year of synthetic shows in 500 cities.
+
+Times typical calendar questions (a weekend in one city, a week in one
+state, a week of one genre everywhere) and prints their query plans.
+
+    python benchmarks/bench_calendar.py --venues 20000 --shows-per-venue 20
+"""
+
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from common import DEFAULT_DATABASE_URL, db, seed_catalogue, setup_database
+from bench_indexes import explain
+from models import Venue
+from show_calendar import calendar_query, show_calendar
+
+
+def median_latency(call, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = call()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--venues', type=int, default=20000)
+    parser.add_argument('--shows-per-venue', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    ctx = setup_database(args.database_url)
+    seed_catalogue(args.venues, shows_per_venue=args.shows_per_venue, n_cities=500)
+    db.session.execute('ANALYZE')
+    engine = db.engine
+    city, state = db.session.query(Venue.city, Venue.state).filter(Venue.id == 1).one()
+
+    today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    saturday = today + timedelta(days=(5 - today.weekday()) % 7)
+    cases = {
+        f'weekend in {city}, {state}': dict(start=saturday, end=saturday + timedelta(days=2),
+                                            city=city, state=state),
+        f'next week in {state}': dict(start=today, end=today + timedelta(days=7), state=state),
+        'next week of Jazz everywhere': dict(start=today, end=today + timedelta(days=7),
+                                             genre='Jazz'),
+        'next 30 days everywhere': dict(start=today, end=today + timedelta(days=30)),
+    }
+    for name, filters in cases.items():
+        latency, page = median_latency(lambda: show_calendar(**filters), args.repeat)
+        shows = sum(len(day['shows']) for day in page['days'])
+        print(f'{name}: {latency * 1000:.2f} ms, {shows} shows in {len(page["days"])} days'
+              f'{" (more pages)" if page["next_cursor"] else ""}')
+        for line in explain(engine, calendar_query(**filters).limit(101)):
+            print(f'    {line}')
+    db.session.remove()
+    ctx.pop()
+
+
+if __name__ == '__main__':
+    main()
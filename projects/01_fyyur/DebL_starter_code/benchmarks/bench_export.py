@@ -0,0 +1,46 @@
+"""Benchmark the streaming export: throughput and peak memory.
+
+Seeds catalogues of increasing size and streams the Show table through
+each export format, discarding the output. Peak traced memory should stay
+roughly flat as the table grows.
+
+    python benchmarks/bench_export.py --sizes 1000 10000 --shows-per-venue 20
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from common import DEFAULT_DATABASE_URL, db, seed_catalogue, setup_database
+from exporter import Export, pyarrow
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000],
+                        help='Numbers of venues to seed.')
+    parser.add_argument('--shows-per-venue', type=int, default=20)
+    args = parser.parse_args()
+
+    formats = ['csv', 'jsonl'] + (['parquet'] if pyarrow is not None else [])
+    for n_venues in args.sizes:
+        ctx = setup_database(args.database_url)
+        seed_catalogue(n_venues, shows_per_venue=args.shows_per_venue)
+        for fmt in formats:
+            dump = Export('shows', fmt)
+            tracemalloc.start()
+            start = time.perf_counter()
+            size = sum(len(chunk) for chunk in dump)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f'{dump.rows} shows as {fmt}: {elapsed:.2f}s '
+                  f'({dump.rows / elapsed:.0f} rows/s), {size / 1e6:.1f} MB written, '
+                  f'peak {peak / 1e6:.1f} MB')
+        db.session.remove()
+        ctx.pop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark faceted artist browsing over a synthetic catalogue.
+
+Builds the facet bitmaps once, then times random facet clicks (genres,
+states, cities and the seeking flag) and reports the p50/p95 latency,
+with an edit between every tenth click so that the incremental refresh is
+included. For comparison it times the same counts as GROUP BY queries.
+
+    python benchmarks/bench_facets.py --artists 100000
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from sqlalchemy import func
+
+from common import DEFAULT_DATABASE_URL, db, seed_catalogue, setup_database, Genres
+from models import Artist, artist_genres
+from facets import facet_indexes
+from genres import genre_cache
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def random_filters(rng, states, cities):
+    filters = {}
+    if rng.random() < 0.7:
+        filters['genres'] = rng.sample([genre.name for genre in Genres], rng.randint(1, 2))
+    if rng.random() < 0.5:
+        state = rng.choice(states)
+        filters['state'] = [state]
+        if cities[state] and rng.random() < 0.5:
+            filters['city'] = [rng.choice(sorted(cities[state]))]
+    if rng.random() < 0.3:
+        filters['seeking_venue'] = [rng.random() < 0.5]
+    return filters
+
+
+def grouped_counts():
+    """The unfiltered facet counts as GROUP BY queries, for comparison."""
+
+    counts = {
+        'state': db.session.query(Artist.state, func.count()).group_by(Artist.state).all(),
+        'seeking_venue': db.session.query(Artist.seeking_venue, func.count())
+            .group_by(Artist.seeking_venue).all(),
+        'genres': db.session.query(artist_genres.c.genre_id, func.count())
+            .group_by(artist_genres.c.genre_id).all(),
+    }
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--artists', type=int, default=100000)
+    parser.add_argument('--cities', type=int, default=2000)
+    parser.add_argument('--clicks', type=int, default=500)
+    args = parser.parse_args()
+
+    ctx = setup_database(args.database_url)
+    seed_catalogue(max(1, args.artists // 10), n_artists=args.artists, shows_per_venue=1,
+                   n_cities=args.cities)
+    genre_cache.warm()
+    db.session.commit()
+    index = facet_indexes[Artist]
+
+    start = time.perf_counter()
+    index.refresh()
+    print(f'build: {(time.perf_counter() - start) * 1000:.0f} ms for {args.artists} artists')
+    states = sorted(index.cities)
+    rng = random.Random(7)
+
+    samples = []
+    for click in range(args.clicks):
+        if click % 10 == 9:
+            artist = Artist.query.get(rng.randint(1, args.artists))
+            artist.state = rng.choice(states)
+            db.session.commit()
+        filters = random_filters(rng, states, index.cities)
+        start = time.perf_counter()
+        index.browse(filters, limit=50)
+        samples.append(time.perf_counter() - start)
+    print(f'browse: p50 {statistics.median(samples) * 1000:.2f} ms, '
+          f'p95 {percentile(samples, 0.95) * 1000:.2f} ms over {args.clicks} clicks')
+
+    samples = []
+    for _ in range(5):
+        start = time.perf_counter()
+        grouped_counts()
+        samples.append(time.perf_counter() - start)
+    print(f'GROUP BY counts (no filters): median {statistics.median(samples) * 1000:.2f} ms')
+    db.session.remove()
+    ctx.pop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Benchmark the `datetime` Jinja filter.
+
+Formats 10k distinct show times with the original filter (fed
+``str(show.start_time)``, as the detail pages used to do) and with
+``formatting.format_datetime`` / ``formatting.format_datetimes``.
+
+    python benchmarks/bench_format_datetime.py --count 10000
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import formatting  # noqa: E402
+
+
+def legacy_format_datetime(value, format='medium'):
+    """The filter as it was, minus the unbound-name bug for datetimes."""
+
+    if isinstance(value, str):
+        date = dateutil.parser.parse(value)
+    else:
+        date = value
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def run(label, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f'{label:>28} {elapsed:>9.3f}s')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=10000)
+    args = parser.parse_args()
+
+    base = datetime(2026, 1, 1, 20, 0)
+    times = [base + timedelta(minutes=37 * i) for i in range(args.count)]
+
+    run('legacy filter, str input', lambda: [legacy_format_datetime(str(t), 'full') for t in times])
+    run('legacy filter, datetime', lambda: [legacy_format_datetime(t, 'full') for t in times])
+    formatting.format_datetime.cache_clear()
+    run('format_datetime, cold', lambda: [formatting.format_datetime(t, 'full') for t in times])
+    # the memo keeps the most recent 4096 results
+    run('format_datetime, memoized', lambda: [formatting.format_datetime(t, 'full') for t in times[-4096:]])
+    run('format_datetimes, batch', lambda: formatting.format_datetimes(times, 'full'))
+
+
+if __name__ == '__main__':
+    main()
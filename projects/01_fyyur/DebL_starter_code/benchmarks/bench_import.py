@@ -0,0 +1,93 @@
+"""Benchmark `flask fyyur import` throughput.
+
+Writes synthetic venue, artist and show files, imports them and prints the
+inserted rows per second for each kind.
+
+    python benchmarks/bench_import.py --rows 100000 --format csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+from common import DEFAULT_DATABASE_URL, Genres, States, setup_database
+from importer import Importer, read_rows
+
+GENRES = [genre.value for genre in Genres]
+STATES = [state.value for state in States]
+
+
+def profile_rows(n, rng, kind):
+    for i in range(n):
+        row = {
+            'name': f'{kind} {i}',
+            'city': f'City {rng.randrange(500)}',
+            'state': rng.choice(STATES),
+            'phone': f'{rng.randrange(100, 1000)}-555-{rng.randrange(10000):04d}',
+            'genres': ','.join(rng.sample(GENRES, 2)),
+            'website_link': f'https://example.com/{kind}/{i}',
+        }
+        if kind == 'venue':
+            row['address'] = f'{i} Main St'
+            row['seeking_talent'] = rng.choice(['yes', 'no'])
+        else:
+            row['seeking_venue'] = rng.choice(['yes', 'no'])
+        yield row
+
+
+def show_rows(n, rng, n_venues, n_artists):
+    start = datetime.utcnow() - timedelta(days=180)
+    for _ in range(n):
+        yield {
+            'venue_id': rng.randrange(1, n_venues + 1),
+            'artist_id': rng.randrange(1, n_artists + 1),
+            'start_time': (start + timedelta(hours=rng.randrange(24 * 365))).strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+
+def write_file(directory, name, rows, fmt):
+    rows = list(rows)
+    path = os.path.join(directory, f'{name}.{fmt}')
+    with open(path, 'w', newline='') as f:
+        if fmt == 'csv':
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                f.write(json.dumps(row) + '\n')
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    ctx = setup_database(args.database_url)
+    rng = random.Random(42)
+    n_profiles = max(args.rows // 10, 1)
+    with tempfile.TemporaryDirectory() as directory:
+        files = [
+            ('venues', write_file(directory, 'venues', profile_rows(n_profiles, rng, 'venue'), args.format)),
+            ('artists', write_file(directory, 'artists', profile_rows(n_profiles, rng, 'artist'), args.format)),
+            ('shows', write_file(directory, 'shows',
+                                 show_rows(args.rows, rng, n_profiles, n_profiles), args.format)),
+        ]
+        for kind, path in files:
+            with open(path, newline='') as stream:
+                report = Importer(kind, args.batch_size).run(read_rows(stream, args.format))
+            print(f"{kind}: {report['inserted']} rows in {report['seconds']:.2f}s "
+                  f"({report['rows_per_second']:.0f} inserted rows/s, {report['rejected']} rejected)")
+    ctx.pop()
+
+
+if __name__ == '__main__':
+    main()
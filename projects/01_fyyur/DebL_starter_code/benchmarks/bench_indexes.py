@@ -0,0 +1,101 @@
+"""Benchmark the Show/Venue/Artist access paths with and without indexes.
+
+Seeds a catalogue, then for each access path prints the query plan and the
+median latency, first with the access-path indexes dropped and then with
+them created.
+
+    python benchmarks/bench_indexes.py --venues 20000 --shows-per-venue 20
+"""
+
+import argparse
+import statistics
+import time
+from datetime import datetime
+
+from common import DEFAULT_DATABASE_URL, db, seed_catalogue, setup_database
+from models import Venue, Artist, Show, venue_genres
+from genres import genre_filter
+from indexes import drop_upcoming_index, refresh_upcoming_index
+from queries import upcoming_count
+
+TABLES = (Show.__table__, Venue.__table__, Artist.__table__, venue_genres)
+
+
+def access_paths(engine):
+    now = datetime.utcnow()
+    venue_ids = list(range(1, 21))
+    paths = {
+        'venue shows by start time': Show.query
+            .filter(Show.venue_id == 7).order_by(Show.start_time),
+        'artist shows by start time': Show.query
+            .filter(Show.artist_id == 7).order_by(Show.start_time),
+        'upcoming counts for 20 venues': db.session
+            .query(Show.venue_id, upcoming_count(now))
+            .filter(Show.venue_id.in_(venue_ids)).group_by(Show.venue_id),
+        'first page of upcoming shows': Show.query
+            .filter(Show.start_time >= now).order_by(Show.start_time, Show.id).limit(30),
+        'venues in a city': Venue.query
+            .filter(Venue.state == 'CA', Venue.city == 'City 7'),
+        'venues by genre': Venue.query.filter(genre_filter(Venue, 'Jazz')),
+    }
+    return paths
+
+
+def explain(engine, query):
+    compiled = query.statement.compile(dialect=engine.dialect)
+    if engine.dialect.name == 'postgresql':
+        rows = db.session.connection().execute('EXPLAIN ' + str(compiled), compiled.params)
+        return [row[0] for row in rows]
+    params = [compiled.params[name] for name in compiled.positiontup]
+    rows = db.session.connection().execute('EXPLAIN QUERY PLAN ' + str(compiled), params)
+    return [row[-1] for row in rows]
+
+
+def median_latency(query, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        query.all()
+        samples.append(time.perf_counter() - start)
+        db.session.expunge_all()
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--venues', type=int, default=20000)
+    parser.add_argument('--shows-per-venue', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    ctx = setup_database(args.database_url)
+    seed_catalogue(args.venues, shows_per_venue=args.shows_per_venue, n_cities=500)
+    engine = db.engine
+
+    for phase in ('before', 'after'):
+        for table in TABLES:
+            for index in table.indexes:
+                if phase == 'before':
+                    index.drop(bind=engine)
+                else:
+                    index.create(bind=engine)
+        if phase == 'before':
+            drop_upcoming_index(engine)
+        else:
+            refresh_upcoming_index(engine=engine)
+        db.session.execute('ANALYZE')
+        db.session.commit()
+
+        print(f'=== {phase} indexes ===')
+        for name, query in access_paths(engine).items():
+            latency = median_latency(query, args.repeat)
+            print(f'{name}: {latency * 1000:.2f} ms')
+            for line in explain(engine, query):
+                print(f'    {line}')
+    db.session.remove()
+    ctx.pop()
+
+
+if __name__ == '__main__':
+    main()
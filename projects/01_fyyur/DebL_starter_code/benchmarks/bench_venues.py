@@ -0,0 +1,66 @@
+"""Benchmark the /venues directory query.
+
+Compares the original per-venue loop (one Show query per venue) against
+``queries.venue_areas``, which reads the ``Venue.upcoming_shows`` counter
+(see counters.py) in one statement, at several catalogue sizes. The seeded
+counters are filled by ``refresh_counters`` before timing.
+
+    python benchmarks/bench_venues.py --sizes 1000 10000 100000
+"""
+
+import argparse
+from datetime import datetime
+
+from common import (DEFAULT_DATABASE_URL, QueryCounter, db, seed_catalogue,
+                    setup_database, timed)
+from models import Venue, Show
+from queries import venue_areas
+
+
+def legacy_venue_areas():
+    """The /venues handler as it was before venue_areas."""
+
+    data = []
+    venues = Venue.query.all()
+    locations = set((venue.city, venue.state) for venue in venues)
+    for location in locations:
+        data.append({"city": location[0], "state": location[1], "venues": []})
+    for venue in venues:
+        shows = Show.query.filter_by(venue_id=venue.id).all()
+        current_date = datetime.now()
+        num_upcoming_shows = len([s for s in shows if s.start_time > current_date])
+        for venue_location in data:
+            if venue.state == venue_location['state'] and venue.city == venue_location['city']:
+                venue_location['venues'].append({
+                    "id": venue.id, "name": venue.name,
+                    "num_upcoming_shows": num_upcoming_shows})
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--legacy-limit', type=int, default=10000,
+                        help='skip the legacy loop above this many venues')
+    args = parser.parse_args()
+
+    print(f"{'venues':>8} {'impl':>8} {'queries':>8} {'seconds':>9}")
+    for size in args.sizes:
+        ctx = setup_database(args.database_url)
+        seed_catalogue(size)
+        impls = [('counter', venue_areas)]
+        if size <= args.legacy_limit:
+            impls.append(('legacy', legacy_venue_areas))
+        for name, impl in impls:
+            results = {}
+            db.session.expunge_all()
+            with QueryCounter(db.engine) as counter, timed(results, name):
+                impl()
+            print(f'{size:>8} {name:>8} {counter.count:>8} {results[name]:>9.3f}')
+        db.session.remove()
+        ctx.pop()
+
+
+if __name__ == '__main__':
+    main()
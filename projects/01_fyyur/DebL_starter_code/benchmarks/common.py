@@ -0,0 +1,118 @@
+"""Shared helpers for the Fyyur benchmarks.
+
+The benchmarks run against ``FYYUR_BENCH_DATABASE_URL`` (or ``--database-url``)
+and default to an in-memory SQLite database. Point them at a scratch Postgres
+database to get numbers that match production; the tables are dropped and
+recreated on every run.
+"""
+
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app  # noqa: E402
+from forms import Genres, States  # noqa: E402
+from models import db, Venue, Artist, Show  # noqa: E402
+from counters import refresh_counters  # noqa: E402
+from genres import relink_genres  # noqa: E402
+
+DEFAULT_DATABASE_URL = os.environ.get('FYYUR_BENCH_DATABASE_URL', 'sqlite://')
+
+
+def setup_database(database_url=DEFAULT_DATABASE_URL):
+    """Bind the app to ``database_url`` and recreate the tables.
+
+    Returns a pushed app context; call ``ctx.pop()`` when done.
+    """
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    ctx = app.app_context()
+    ctx.push()
+    db.drop_all()
+    db.create_all()
+    return ctx
+
+
+class QueryCounter(object):
+    """Counts statements sent to the database while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _before_cursor_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+
+
+@contextmanager
+def timed(results, key):
+    """Store the elapsed wall-clock seconds of the block in ``results[key]``."""
+
+    start = time.perf_counter()
+    yield
+    results[key] = time.perf_counter() - start
+
+
+def seed_catalogue(n_venues, n_artists=None, shows_per_venue=3, n_cities=None, seed=42):
+    """Bulk insert a synthetic catalogue of venues, artists and shows.
+
+    Shows are spread one year either side of now so that roughly half of
+    them are upcoming.
+    """
+
+    rnd = random.Random(seed)
+    n_artists = n_artists or max(1, n_venues // 2)
+    n_cities = n_cities or max(1, n_venues // 50)
+    genres = [genre.value for genre in Genres]
+    states = [state.value for state in States]
+    cities = [(f'City {i}', rnd.choice(states)) for i in range(n_cities)]
+
+    venues = []
+    for i in range(1, n_venues + 1):
+        city, state = rnd.choice(cities)
+        venues.append({
+            'id': i, 'name': f'Venue {i}', 'city': city, 'state': state,
+            'address': f'{i} Main St', 'phone': '555-555-5555',
+            'genres': rnd.sample(genres, 2), 'seeking_talent': rnd.random() < 0.5,
+        })
+    artists = []
+    for i in range(1, n_artists + 1):
+        city, state = rnd.choice(cities)
+        artists.append({
+            'id': i, 'name': f'Artist {i}', 'city': city, 'state': state,
+            'phone': '555-555-5555', 'genres': rnd.sample(genres, 2),
+            'seeking_venue': rnd.random() < 0.5,
+        })
+    now = datetime.utcnow()
+    shows = []
+    for i in range(1, n_venues * shows_per_venue + 1):
+        shows.append({
+            'id': i,
+            'venue_id': rnd.randint(1, n_venues),
+            'artist_id': rnd.randint(1, n_artists),
+            'start_time': now + timedelta(hours=rnd.randint(-24 * 365, 24 * 365)),
+        })
+
+    for model, rows in ((Venue, venues), (Artist, artists), (Show, shows)):
+        for start in range(0, len(rows), 10000):
+            db.session.execute(model.__table__.insert(), rows[start:start + 10000])
+    relink_genres(Venue)
+    relink_genres(Artist)
+    refresh_counters(Venue)
+    refresh_counters(Artist)
+    db.session.commit()
@@ -0,0 +1,123 @@
+#----------------------------------------------------------------------------#
+# Booking conflicts.
+#
+# A show occupies its venue and its artist from start_time for
+# duration_minutes. Durations are capped at MAX_SHOW_MINUTES. So any show
+# overlapping a new one started less than that cap before the new one
+# ends, and the check is a bounded range scan on ix_show_venue_start and
+# ix_show_artist_start: O(log n) plus the handful of nearby shows.
+#
+# `flask fyyur audit-bookings` sweeps the table for existing overlaps. On
+# Postgres, `--enforce` then adds exclusion constraints so that concurrent
+# inserts cannot double-book either.
+#----------------------------------------------------------------------------#
+
+from datetime import timedelta
+from sqlalchemy import text
+from models import db, Venue, Artist, Show, MAX_SHOW_MINUTES
+
+EXCLUSION_CONSTRAINTS = {
+    'ex_show_venue_booking': 'venue_id',
+    'ex_show_artist_booking': 'artist_id',
+}
+
+
+def show_end(start_time, duration_minutes):
+    return start_time + timedelta(minutes=duration_minutes)
+
+
+def find_conflicts(venue_id, artist_id, start_time, duration_minutes, exclude_id=None):
+    """Shows that overlap a booking of the venue or the artist.
+
+    Returns
+    -------
+    conflicts : list (dict)
+        ``{"id", "venue_id", "venue_name", "artist_id", "artist_name",
+        "start_time", "end_time", "booked": ["venue", "artist"]}`` in start
+        time order; ``booked`` says which side is double-booked
+    """
+
+    end_time = show_end(start_time, duration_minutes)
+    earliest = start_time - timedelta(minutes=MAX_SHOW_MINUTES)
+    conflicts = {}
+    for side, column, value in (('venue', Show.venue_id, venue_id),
+                                ('artist', Show.artist_id, artist_id)):
+        rows = db.session.query(
+                Show.id, Show.start_time, Show.duration_minutes,
+                Venue.id.label('venue_id'), Venue.name.label('venue_name'),
+                Artist.id.label('artist_id'), Artist.name.label('artist_name')) \
+            .join(Venue, Show.venue_id == Venue.id) \
+            .join(Artist, Show.artist_id == Artist.id) \
+            .filter(column == value, Show.start_time > earliest, Show.start_time < end_time)
+        for row in rows:
+            row_end = show_end(row.start_time, row.duration_minutes)
+            if row.id == exclude_id or row_end <= start_time:
+                continue
+            conflict = conflicts.setdefault(row.id, {
+                "id": row.id,
+                "venue_id": row.venue_id,
+                "venue_name": row.venue_name,
+                "artist_id": row.artist_id,
+                "artist_name": row.artist_name,
+                "start_time": row.start_time,
+                "end_time": row_end,
+                "booked": []
+            })
+            conflict["booked"].append(side)
+    return sorted(conflicts.values(), key=lambda conflict: (conflict["start_time"], conflict["id"]))
+
+
+def overlapping_shows(column, chunk_rows=5000):
+    """Yield ``(key, earlier_id, later_id)`` for overlapping shows sharing ``column``.
+
+    One pass over the table in (column, start_time) index order, keeping
+    only the shows still running at each start time.
+    """
+
+    rows = db.session.query(column, Show.id, Show.start_time, Show.duration_minutes) \
+        .order_by(column, Show.start_time, Show.id) \
+        .yield_per(chunk_rows)
+    current, running = None, []
+    for key, show_id, start_time, duration in rows:
+        if key != current:
+            current, running = key, []
+        running = [(other_id, end) for other_id, end in running if end > start_time]
+        for other_id, end in running:
+            yield key, other_id, show_id
+        running.append((show_id, show_end(start_time, duration)))
+
+
+def audit_bookings():
+    """Every double booking, as ``{"venues": [...], "artists": [...]}``.
+
+    Each entry is ``{"id", "shows": [earlier_id, later_id]}`` where ``id``
+    is the venue or artist.
+    """
+
+    return {
+        kind: [{"id": key, "shows": [earlier, later]}
+               for key, earlier, later in overlapping_shows(column)]
+        for kind, column in (('venues', Show.venue_id), ('artists', Show.artist_id))
+    }
+
+
+def enforce_exclusion_constraints():
+    """Add the Postgres exclusion constraints that are missing.
+
+    Fails if the table still has overlaps. Returns the names added.
+    """
+
+    added = []
+    db.session.execute(text('CREATE EXTENSION IF NOT EXISTS btree_gist'))
+    existing = {name for name, in db.session.execute(text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = '\"Show\"'::regclass"))}
+    for name, column in EXCLUSION_CONSTRAINTS.items():
+        if name in existing:
+            continue
+        db.session.execute(text(
+            f'ALTER TABLE "Show" ADD CONSTRAINT {name} EXCLUDE USING gist ('
+            f'{column} WITH =, '
+            f"tsrange(start_time, start_time + duration_minutes * interval '1 minute') WITH &&)"))
+        added.append(name)
+    db.session.commit()
+    return added
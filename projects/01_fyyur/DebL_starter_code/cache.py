@@ -0,0 +1,246 @@
+#----------------------------------------------------------------------------#
+# Page cache.
+#
+# Rendered /venues, /artists and detail pages are cached under keys such as
+# 'venues' or 'venue:3' and dropped by the write handlers that change them.
+# The backend is picked by PAGE_CACHE_BACKEND:
+#   'lru'    -- in-process LRU with a TTL (one cache per worker)
+#   'socket' -- a cache server on a local Unix socket shared by all workers,
+#               started with `flask fyyur cache-server`
+#   'none'   -- caching disabled
+#----------------------------------------------------------------------------#
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request, session
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache(object):
+    """Thread-safe LRU mapping whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()   # key -> (expires_at, value)
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(('hits', 'misses', 'evictions', 'expirations'), 0)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self.entries[key]
+                self.counters['expirations'] += 1
+                entry = None
+            if entry is None:
+                self.counters['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, entries=len(self.entries))
+
+
+class SocketCache(object):
+    """Client for the cache server started by ``serve``.
+
+    Speaks one JSON object per line over a Unix socket, one connection per
+    thread. If the server is unreachable every lookup is a miss, so pages
+    are still served, just uncached.
+    """
+
+    def __init__(self, path, timeout=0.5):
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def call(self, op, **args):
+        try:
+            stream = getattr(self.local, 'stream', None)
+            if stream is None:
+                conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                conn.settimeout(self.timeout)
+                conn.connect(self.path)
+                stream = self.local.stream = conn.makefile('rw', encoding='utf-8')
+            stream.write(json.dumps(dict(args, op=op)) + '\n')
+            stream.flush()
+            return json.loads(stream.readline())
+        except (OSError, ValueError) as e:
+            logger.warning('Page cache at %s unavailable: %s', self.path, e)
+            self.local.stream = None
+            return None
+
+    def get(self, key):
+        reply = self.call('get', key=key)
+        return reply and reply.get('value')
+
+    def set(self, key, value):
+        self.call('set', key=key, value=value)
+
+    def delete(self, *keys):
+        self.call('delete', keys=keys)
+
+    def clear(self):
+        self.call('clear')
+
+    def stats(self):
+        return self.call('stats') or {}
+
+
+class CacheRequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        cache = self.server.cache
+        for line in self.rfile:
+            message = json.loads(line)
+            op = message['op']
+            if op == 'get':
+                reply = {'value': cache.get(message['key'])}
+            elif op == 'set':
+                cache.set(message['key'], message['value'])
+                reply = {}
+            elif op == 'delete':
+                cache.delete(*message['keys'])
+                reply = {}
+            elif op == 'clear':
+                cache.clear()
+                reply = {}
+            else:
+                reply = cache.stats()
+            self.wfile.write((json.dumps(reply) + '\n').encode())
+
+
+def serve(path, max_entries=1024, ttl=300):
+    """Run a shared LRU cache on the Unix socket ``path`` until interrupted."""
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socketserver.ThreadingUnixStreamServer(path, CacheRequestHandler)
+    server.daemon_threads = True
+    server.cache = LRUCache(max_entries, ttl)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
+
+
+class NullCache(object):
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+def make_backend(config):
+    backend = config.get('PAGE_CACHE_BACKEND', 'lru')
+    if backend == 'lru':
+        return LRUCache(config.get('PAGE_CACHE_MAX_ENTRIES', 1024),
+                        config.get('PAGE_CACHE_TTL', 300))
+    if backend == 'socket':
+        return SocketCache(config['PAGE_CACHE_SOCKET'])
+    if backend == 'none':
+        return NullCache()
+    raise ValueError(f'Unknown PAGE_CACHE_BACKEND {backend!r}')
+
+
+class PageCache(object):
+    """Caches rendered pages for the current app; the backend is built on first use."""
+
+    def __init__(self):
+        self.backends = {}
+
+    @property
+    def backend(self):
+        app = current_app._get_current_object()
+        if app not in self.backends:
+            self.backends[app] = make_backend(app.config)
+        return self.backends[app]
+
+    def cached(self, key):
+        """Cache a GET view's rendered HTML under ``key.format(**view_args)``.
+
+        Requests with pending flash messages bypass the cache, since the
+        layout renders (and consumes) them.
+        """
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                if request.method != 'GET' or session.get('_flashes'):
+                    return view(**kwargs)
+                cache_key = key.format(**kwargs)
+                html = self.backend.get(cache_key)
+                if html is None:
+                    html = view(**kwargs)
+                    if isinstance(html, str):
+                        self.backend.set(cache_key, html)
+                return html
+            return wrapper
+        return decorator
+
+    def invalidate(self, *keys):
+        self.backend.delete(*keys)
+
+    def invalidate_venue(self, venue_id=None, artist_ids=()):
+        """Drop /venues, the venue's page and the pages of artists that played there."""
+        keys = ['venues'] + [f'artist:{artist_id}' for artist_id in artist_ids]
+        if venue_id is not None:
+            keys.append(f'venue:{venue_id}')
+        self.invalidate(*keys)
+
+    def invalidate_artist(self, artist_id=None, venue_ids=()):
+        """Drop /artists, the artist's page and the pages of venues they played."""
+        keys = ['artists'] + [f'venue:{venue_id}' for venue_id in venue_ids]
+        if artist_id is not None:
+            keys.append(f'artist:{artist_id}')
+        self.invalidate(*keys)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return self.backend.stats()
+
+
+page_cache = PageCache()
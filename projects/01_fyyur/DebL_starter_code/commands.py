@@ -0,0 +1,192 @@
+#----------------------------------------------------------------------------#
+# CLI commands, available as `flask fyyur <command>`.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timedelta
+import json
+import click
+from flask import current_app
+from flask.cli import AppGroup
+import bookings
+import cache
+import exporter
+import counters
+import importer
+import indexes
+import recommendations
+from jobs import job_queue
+from models import db, Venue, Artist
+
+fyyur_cli = AppGroup('fyyur', help='Fyyur maintenance commands.')
+
+
+@fyyur_cli.command('roll-forward')
+@click.option('--window-minutes', default=60, show_default=True,
+              help='Recompute counters for shows that started this long ago.')
+def roll_forward_command(window_minutes):
+    """Move shows that have started from upcoming to past counters."""
+    window = timedelta(minutes=window_minutes)
+    updated = counters.roll_forward(window=window)
+    click.echo(f"Refreshed {updated['venues']} venues and {updated['artists']} artists.")
+    if any(updated.values()):
+        # the listings show the counters
+        cache.page_cache.invalidate('venues', 'artists')
+    # shows that have started count towards their pair's recommendation score
+    now = datetime.utcnow()
+    artist_ids = recommendations.artists_starting(now - window, now)
+    if artist_ids:
+        job_queue.enqueue('refresh_recommendations', {'artist_ids': artist_ids})
+        db.session.commit()
+
+
+@fyyur_cli.command('check-counters')
+@click.option('--fix', is_flag=True, help='Rebuild every counter from the Show table.')
+def check_counters_command(fix):
+    """Report venues and artists whose show counters have drifted."""
+    report = counters.check_counters(fix=fix)
+    for kind, drift in report.items():
+        click.echo(f'{len(drift)} {kind} with drifted counters')
+        for row in drift:
+            click.echo(f"  {kind[:-1]} {row['id']}: "
+                       f"upcoming {row['upcoming_shows']} -> {row['expected_upcoming']}, "
+                       f"past {row['past_shows']} -> {row['expected_past']}")
+    if fix:
+        if any(report.values()):
+            cache.page_cache.invalidate('venues', 'artists')
+        click.echo('Counters rebuilt.')
+
+
+@fyyur_cli.command('cache-server')
+def cache_server_command():
+    """Run the shared page cache on PAGE_CACHE_SOCKET."""
+    config = current_app.config
+    click.echo(f"Serving page cache on {config['PAGE_CACHE_SOCKET']}")
+    cache.serve(config['PAGE_CACHE_SOCKET'],
+                config.get('PAGE_CACHE_MAX_ENTRIES', 1024),
+                config.get('PAGE_CACHE_TTL', 300))
+
+
+@fyyur_cli.command('profile-routes')
+@click.option('--output', type=click.File('w'), default='-', help='Report file (default stdout).')
+@click.option('--top', default=20, show_default=True, help='Number of routes to report.')
+@click.option('--timings', is_flag=True, help='Include database time (not stable enough to diff).')
+def profile_routes_command(output, top, timings):
+    """Request each page once and write a JSON report of its SQL usage."""
+    app = current_app._get_current_object()
+    profiler = app.extensions['sql_profiler']
+    venue_id = db.session.query(Venue.id).order_by(Venue.id).limit(1).scalar() or 1
+    artist_id = db.session.query(Artist.id).order_by(Artist.id).limit(1).scalar() or 1
+    requests = [
+        ('GET', '/', None),
+        ('GET', '/venues', None),
+        ('GET', '/artists', None),
+        ('GET', '/shows', None),
+        ('GET', '/shows?when=upcoming', None),
+        ('GET', f'/venues/{venue_id}', None),
+        ('GET', f'/artists/{artist_id}', None),
+        ('POST', '/venues/search', {'search_term': 'a'}),
+        ('POST', '/artists/search', {'search_term': 'a'}),
+    ]
+
+    profiler.reset()
+    enabled, app.config['SQL_PROFILER'] = app.config['SQL_PROFILER'], True
+    client = app.test_client()
+    try:
+        for method, url, data in requests:
+            cache.page_cache.clear()
+            client.open(url, method=method, data=data)
+    finally:
+        app.config['SQL_PROFILER'] = enabled
+    json.dump({'routes': profiler.report(top, timings)}, output, indent=2, sort_keys=True)
+    output.write('\n')
+
+
+@fyyur_cli.command('refresh-upcoming-index')
+def refresh_upcoming_index_command():
+    """Rebuild the partial upcoming-shows index with today's cutoff."""
+    cutoff = indexes.refresh_upcoming_index()
+    click.echo(f'{indexes.UPCOMING_INDEX} now covers shows from {cutoff:%Y-%m-%d}.')
+
+
+@fyyur_cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(importer.Importer.kinds)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']),
+              help='File format (default: from the file extension).')
+@click.option('--batch-size', default=importer.BATCH_SIZE, show_default=True,
+              help='Rows per insert and per transaction.')
+@click.option('--rejects', type=click.File('w'), help='Write rejected rows here as JSON lines.')
+def import_command(kind, path, fmt, batch_size, rejects):
+    """Bulk import venues, artists or shows from a CSV or JSONL file."""
+    fmt = fmt or importer.guess_format(path)
+    with open(path, newline='', encoding='utf-8') as stream:
+        report = importer.Importer(kind, batch_size, rejects).run(importer.read_rows(stream, fmt))
+    click.echo(f"Imported {report['inserted']} of {report['read']} {kind} "
+               f"in {report['seconds']:.2f}s ({report['rows_per_second']:.0f} inserted rows/s), "
+               f"rejected {report['rejected']}.")
+    for rejection in report['sample']:
+        errors = '; '.join(f'{k}: {v}' for k, v in rejection['errors'].items())
+        click.echo(f"  line {rejection['line']}: {errors}", err=True)
+
+
+@fyyur_cli.command('export')
+@click.argument('kind', type=click.Choice(sorted(exporter.EXPORT_KINDS)))
+@click.option('--format', 'fmt', type=click.Choice(sorted(exporter.EXPORT_FORMATS)),
+              default='csv', show_default=True)
+@click.option('--output', type=click.File('wb'), default='-', help='Output file (default stdout).')
+@click.option('--since', type=click.DateTime(['%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f']),
+              help='Only rows updated at or after this UTC time.')
+@click.option('--since-id', type=int, help='Only rows with a greater id.')
+@click.option('--chunk-rows', default=exporter.EXPORT_CHUNK_ROWS, show_default=True,
+              help='Rows fetched and written per chunk.')
+def export_command(kind, fmt, output, since, since_id, chunk_rows):
+    """Stream a table to CSV, JSONL or Parquet."""
+    try:
+        dump = exporter.Export(kind, fmt, since, since_id, chunk_rows)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    for chunk in dump:
+        output.write(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+    click.echo(f'Exported {dump.rows} {kind}.', err=True)
+    if dump.rows:
+        click.echo(f'Resume with --since {dump.last_updated:%Y-%m-%dT%H:%M:%S.%f} '
+                   f'or --since-id {dump.last_id}.', err=True)
+
+
+@fyyur_cli.command('worker')
+@click.option('--once', is_flag=True, help='Run the jobs that are due, then exit.')
+@click.option('--prune-days', type=click.IntRange(min=0), default=None,
+              help='Delete done and failed jobs older than this (default JOB_RETENTION_DAYS; 0 keeps them).')
+def worker_command(once, prune_days):
+    """Run background jobs (use with JOB_QUEUE_THREAD=0)."""
+    app = current_app._get_current_object()
+    click.echo('Running jobs' + (' once.' if once else f" every {app.config['JOB_POLL_SECONDS']}s."))
+    job_queue.work(app, once=once, retention_days=prune_days)
+
+
+@fyyur_cli.command('audit-bookings')
+@click.option('--enforce', is_flag=True,
+              help='If there are no overlaps, add Postgres exclusion constraints.')
+def audit_bookings_command(enforce):
+    """Report venues and artists booked for overlapping shows."""
+    report = bookings.audit_bookings()
+    for kind, overlaps in report.items():
+        click.echo(f'{len(overlaps)} overlapping show pairs by {kind[:-1]}')
+        for overlap in overlaps:
+            earlier, later = overlap['shows']
+            click.echo(f"  {kind[:-1]} {overlap['id']}: show {earlier} overlaps show {later}")
+    if enforce:
+        if any(report.values()):
+            raise click.ClickException('Resolve the overlaps before enforcing.')
+        if db.engine.dialect.name != 'postgresql':
+            raise click.ClickException('Exclusion constraints need Postgres.')
+        added = bookings.enforce_exclusion_constraints()
+        click.echo(f"Added {', '.join(added)}." if added else 'Constraints already in place.')
+
+
+@fyyur_cli.command('refresh-recommendations')
+def refresh_recommendations_command():
+    """Rebuild the artist/venue recommendations from scratch."""
+    scored = recommendations.rebuild_recommendations()
+    cache.page_cache.clear()
+    click.echo(f'Scored {scored} artists seeking venues.')
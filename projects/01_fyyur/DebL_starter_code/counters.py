@@ -0,0 +1,119 @@
+#----------------------------------------------------------------------------#
+# Denormalized show counters.
+#
+# Venue and Artist carry upcoming_shows / past_shows columns so listing and
+# search pages can read counts without touching the Show table. Counters are
+# recomputed by a background job (see jobs.py) when a show is created or a
+# venue or artist is deleted, and rolled forward by `flask fyyur
+# roll-forward` as shows move into the past. `flask fyyur check-counters`
+# rebuilds them from scratch and reports any drift.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, func
+from models import db, Venue, Artist, Show
+from queries import show_column, show_counts
+
+ROLL_FORWARD_WINDOW = timedelta(hours=1)
+
+
+def add_to_counters(model, deltas):
+    """Add ``{id: (upcoming, past)}`` to the counters of ``model`` rows.
+
+    One executemany UPDATE for the whole mapping, for bulk imports. The
+    caller commits.
+    """
+
+    if not deltas:
+        return
+    table = model.__table__
+    statement = table.update().where(table.c.id == bindparam('entity_id')).values(
+        upcoming_shows=func.coalesce(table.c.upcoming_shows, 0) + bindparam('upcoming'),
+        past_shows=func.coalesce(table.c.past_shows, 0) + bindparam('past'))
+    db.session.execute(statement, [
+        {'entity_id': entity_id, 'upcoming': upcoming, 'past': past}
+        for entity_id, (upcoming, past) in deltas.items()])
+
+
+def refresh_counters(model, ids=None, now=None):
+    """Recompute the counters of ``model`` rows from the Show table.
+
+    One correlated UPDATE covers every row in ``ids`` (all rows if None).
+    """
+
+    now = now or datetime.utcnow()
+    fk = show_column(model)
+    upcoming = db.session.query(func.count(Show.id)) \
+        .filter(fk == model.id, Show.start_time >= now).as_scalar()
+    past = db.session.query(func.count(Show.id)) \
+        .filter(fk == model.id, Show.start_time < now).as_scalar()
+    query = model.query
+    if ids is not None:
+        if not ids:
+            return 0
+        query = query.filter(model.id.in_(ids))
+    return query.update({model.upcoming_shows: upcoming, model.past_shows: past},
+                        synchronize_session=False)
+
+
+def roll_forward(now=None, window=ROLL_FORWARD_WINDOW):
+    """Move shows that started in the last ``window`` from upcoming to past.
+
+    Only venues and artists with a show in [now - window, now) are
+    recomputed. Recomputing is idempotent, so overlapping runs are safe; run
+    it at an interval shorter than ``window``.
+
+    Returns
+    -------
+    updated : dict
+        number of venue and artist rows refreshed
+    """
+
+    now = now or datetime.utcnow()
+    started = db.session.query(Show.venue_id, Show.artist_id) \
+        .filter(Show.start_time >= now - window, Show.start_time < now).all()
+    updated = {
+        'venues': refresh_counters(Venue, {row.venue_id for row in started}, now),
+        'artists': refresh_counters(Artist, {row.artist_id for row in started}, now),
+    }
+    db.session.commit()
+    return updated
+
+
+def counter_drift(model, now=None):
+    """Rows of ``model`` whose stored counters differ from the Show table.
+
+    Returns
+    -------
+    drift : list (dict)
+        ``{"id", "upcoming_shows", "expected_upcoming", "past_shows", "expected_past"}``
+    """
+
+    expected = show_counts(model, now=now)
+    drift = []
+    for row in db.session.query(model.id, model.upcoming_shows, model.past_shows):
+        expected_upcoming, expected_past = expected.get(row.id, (0, 0))
+        if (row.upcoming_shows, row.past_shows) != (expected_upcoming, expected_past):
+            drift.append({
+                "id": row.id,
+                "upcoming_shows": row.upcoming_shows,
+                "expected_upcoming": expected_upcoming,
+                "past_shows": row.past_shows,
+                "expected_past": expected_past
+            })
+    return drift
+
+
+def check_counters(fix=False, now=None):
+    """Report counter drift for venues and artists, rebuilding them if ``fix``."""
+
+    now = now or datetime.utcnow()
+    report = {
+        'venues': counter_drift(Venue, now),
+        'artists': counter_drift(Artist, now),
+    }
+    if fix:
+        refresh_counters(Venue, now=now)
+        refresh_counters(Artist, now=now)
+        db.session.commit()
+    return report
@@ -0,0 +1,208 @@
+#----------------------------------------------------------------------------#
+# Streaming export of venues, artists and shows.
+#
+# Rows are read with Query.yield_per (a server-side cursor on Postgres), and
+# the output is produced one chunk at a time, so memory stays flat whatever
+# the table size. Served at /export/<kind> and by `flask fyyur export`.
+#
+# Incremental exports select rows with an id above ``since_id`` or an
+# updated_at at or after ``since``. Deleted rows are not reported.
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+from datetime import datetime
+from models import db, Venue, Artist, Show
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # only needed for format=parquet
+    pyarrow = None
+
+EXPORT_CHUNK_ROWS = 1000
+EXPORT_KINDS = {'venues': Venue, 'artists': Artist, 'shows': Show}
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+SKIPPED_COLUMNS = ('search_vector',)
+
+
+def export_columns(model):
+    return [column for column in model.__table__.columns
+            if column.name not in SKIPPED_COLUMNS]
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return ','.join(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def csv_chunks(names, rows, chunk_rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_csv_value(value) for value in row])
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def jsonl_chunks(names, rows, chunk_rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(names, row)), default=_json_value))
+        if len(lines) == chunk_rows:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+class _Sink(object):
+    """Write-only file object that hands written bytes back to the caller."""
+
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data, self.parts = b''.join(self.parts), []
+        return data
+
+
+def arrow_schema(columns):
+    fields = []
+    for column in columns:
+        # Variant (the genre list) exposes its base type as impl
+        try:
+            python_type = getattr(column.type, 'impl', column.type).python_type
+        except NotImplementedError:
+            python_type = str
+        arrow_type = {
+            int: pyarrow.int64(),
+            bool: pyarrow.bool_(),
+            datetime: pyarrow.timestamp('us'),
+            list: pyarrow.list_(pyarrow.string()),
+        }.get(python_type, pyarrow.string())
+        fields.append(pyarrow.field(column.name, arrow_type))
+    return pyarrow.schema(fields)
+
+
+def parquet_chunks(columns, rows, chunk_rows):
+    """One Parquet row group per chunk of ``chunk_rows`` rows."""
+
+    schema = arrow_schema(columns)
+    sink = _Sink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+
+    def row_group(batch):
+        writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+        return sink.drain()
+
+    names = [column.name for column in columns]
+    batch = []
+    for row in rows:
+        batch.append(dict(zip(names, row)))
+        if len(batch) == chunk_rows:
+            yield row_group(batch)
+            batch = []
+    if batch:
+        yield row_group(batch)
+    writer.close()
+    yield sink.drain()
+
+
+class Export(object):
+    """Streams one table in one format.
+
+    Iterate over the export to get the output chunks (str, or bytes for
+    Parquet). Afterwards ``rows``, ``last_id`` and ``last_updated`` describe
+    what was written; pass them back as ``since_id``/``since`` to continue.
+
+    Parameters
+    ----------
+    kind : 'venues', 'artists' or 'shows'
+    fmt : 'csv', 'jsonl' or 'parquet'
+    since : datetime, optional
+        Only rows updated at or after this time, ordered by updated_at.
+    since_id : int, optional
+        Only rows with a greater id.
+    chunk_rows : int
+        Rows fetched per round trip and written per chunk.
+    """
+
+    def __init__(self, kind, fmt='csv', since=None, since_id=None,
+                 chunk_rows=EXPORT_CHUNK_ROWS):
+        if kind not in EXPORT_KINDS:
+            raise ValueError(f'Unknown export {kind!r}')
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f'Unknown format {fmt!r}')
+        if fmt == 'parquet' and pyarrow is None:
+            raise ValueError('Parquet export requires pyarrow')
+        self.kind, self.fmt = kind, fmt
+        self.model = EXPORT_KINDS[kind]
+        self.since, self.since_id = since, since_id
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self.last_id = self.last_updated = None
+
+    @property
+    def mimetype(self):
+        return EXPORT_FORMATS[self.fmt]
+
+    @property
+    def filename(self):
+        return f'{self.kind}.{self.fmt}'
+
+    def query(self):
+        model = self.model
+        query = db.session.query(*export_columns(model))
+        if self.since_id is not None:
+            query = query.filter(model.id > self.since_id)
+        if self.since is not None:
+            query = query.filter(model.updated_at >= self.since) \
+                .order_by(model.updated_at, model.id)
+        else:
+            query = query.order_by(model.id)
+        return query.yield_per(self.chunk_rows)
+
+    def tracked_rows(self):
+        for row in self.query():
+            self.rows += 1
+            if self.last_id is None or row.id > self.last_id:
+                self.last_id = row.id
+            if self.last_updated is None or row.updated_at > self.last_updated:
+                self.last_updated = row.updated_at
+            yield row
+
+    def __iter__(self):
+        columns = export_columns(self.model)
+        if self.fmt == 'parquet':
+            return parquet_chunks(columns, self.tracked_rows(), self.chunk_rows)
+        names = [column.name for column in columns]
+        chunks = csv_chunks if self.fmt == 'csv' else jsonl_chunks
+        return chunks(names, self.tracked_rows(), self.chunk_rows)
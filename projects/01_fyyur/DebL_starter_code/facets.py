@@ -0,0 +1,260 @@
+#----------------------------------------------------------------------------#
+# Faceted browsing of venues and artists (/api/v1/venues/browse and
+# /api/v1/artists/browse).
+#
+# Each worker keeps one bitmap per facet value: a Python int with bit n set
+# when row n has that genre, state, city or seeking flag. Filters are ORed
+# within a facet and ANDed across facets. A facet's counts ignore its own
+# filter, so choosing a genre still shows the counts of the other genres.
+# All of it is bitwise AND and popcount, with no table scan per request.
+#
+# Before each use the index compares its stamp, (highest id, latest
+# updated_at), with the table's; both are index lookups. Rows changed since
+# then are read back through ix_*_updated and patched in. Deletes in this
+# process clear their bits through a mapper event. Deletes in other
+# processes, and edits that commit after a later one (so carry an older
+# updated_at), show up when the index is rebuilt every
+# FACET_REBUILD_SECONDS. Pages are loaded from the table, so only the
+# counts can be that stale.
+#----------------------------------------------------------------------------#
+
+import threading
+import time
+from sqlalchemy import event, func
+from models import db, Venue, Artist
+from genres import GENRE_MEMBERS, genre_member
+
+FACET_REBUILD_SECONDS = 300
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y', 'on'}
+FALSE_VALUES = {'0', 'false', 'f', 'no', 'n', 'off'}
+
+if hasattr(int, 'bit_count'):
+    popcount = int.bit_count
+else:  # Python < 3.10
+    def popcount(bits):
+        return bin(bits).count('1')
+
+
+def bitmap(ids):
+    """An int with the bits of ``ids`` set, built in linear time."""
+
+    ids = list(ids)
+    if not ids:
+        return 0
+    buffer = bytearray(max(ids) // 8 + 1)
+    for i in ids:
+        buffer[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def first_ids(bits, after_id, limit):
+    """The first ``limit`` set bits of ``bits`` above ``after_id``."""
+
+    offset = after_id + 1
+    bits >>= offset
+    ids = []
+    while bits and len(ids) < limit:
+        step = (bits & -bits).bit_length()
+        offset += step
+        ids.append(offset - 1)
+        bits >>= step
+    return ids
+
+
+class FacetIndex(object):
+    """Bitmaps of ids for every facet value of one model.
+
+    Parameters
+    ----------
+    model : Venue or Artist
+    flag : str
+        the model's seeking column, the fourth facet
+    """
+
+    def __init__(self, model, flag):
+        self.model, self.flag = model, flag
+        self.facets = ('genres', 'state', 'city', flag)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.stamp = None
+        self.built = 0           # time.monotonic() of the last build
+        self.rows = 0            # every id
+        self.bitmaps = {facet: {} for facet in self.facets}
+        self.entries = {}        # id -> its (facet, value) pairs
+        self.cities = {}         # state -> cities seen in it
+
+    def table_stamp(self):
+        model = self.model
+        # separate subqueries so that SQLite also answers each from an index
+        return tuple(db.session.query(db.session.query(func.max(model.id)).as_scalar(),
+                                      db.session.query(func.max(model.updated_at)).as_scalar())
+                     .one())
+
+    def query(self):
+        model = self.model
+        return db.session.query(model.id, model.genres, model.state, model.city,
+                                getattr(model, self.flag).label('flag'))
+
+    def facet_values(self, row):
+        for genre in row.genres or ():
+            member = GENRE_MEMBERS.get(genre.lower())
+            if member is not None:
+                yield 'genres', member.name
+        yield 'state', row.state
+        yield 'city', row.city
+        yield self.flag, bool(row.flag)
+
+    def refresh(self):
+        """Bring the bitmaps up to date with the table."""
+
+        stamp = self.table_stamp()
+        with self.lock:
+            if self.stamp is None or self.stamp[1] is None or \
+                    time.monotonic() - self.built > FACET_REBUILD_SECONDS:
+                self.build(stamp)
+                return
+            if stamp == self.stamp:
+                return
+            self.patch(self.query().filter(self.model.updated_at >= self.stamp[1]).all())
+            self.stamp = stamp
+
+    def build(self, stamp):
+        ids = {facet: {} for facet in self.facets}
+        entries, cities = {}, {}
+        for row in self.query().yield_per(10000):
+            entries[row.id] = tuple(self.facet_values(row))
+            for facet, value in entries[row.id]:
+                ids[facet].setdefault(value, []).append(row.id)
+            cities.setdefault(row.state, set()).add(row.city)
+        self.rows = bitmap(entries)
+        self.bitmaps = {facet: {value: bitmap(value_ids) for value, value_ids in values.items()}
+                        for facet, values in ids.items()}
+        self.entries, self.cities = entries, cities
+        self.stamp, self.built = stamp, time.monotonic()
+
+    def patch(self, rows):
+        """Re-index ``rows``, clearing the old bits of those already indexed."""
+
+        ids = {}
+        for row in rows:
+            bit = 1 << row.id
+            for facet, value in self.entries.get(row.id, ()):
+                self.bitmaps[facet][value] &= ~bit
+            self.entries[row.id] = tuple(self.facet_values(row))
+            for facet, value in self.entries[row.id]:
+                ids.setdefault((facet, value), []).append(row.id)
+            self.cities.setdefault(row.state, set()).add(row.city)
+        self.rows |= bitmap(row.id for row in rows)
+        for (facet, value), value_ids in ids.items():
+            values = self.bitmaps[facet]
+            values[value] = values.get(value, 0) | bitmap(value_ids)
+
+    def discard(self, entity_id):
+        with self.lock:
+            bit = 1 << entity_id
+            for facet, value in self.entries.pop(entity_id, ()):
+                self.bitmaps[facet][value] &= ~bit
+            self.rows &= ~bit
+
+    def browse(self, filters, after_id=0, limit=50):
+        """Ids matching ``filters`` and the count of every facet value.
+
+        Parameters
+        ----------
+        filters : dict
+            facet -> list of values, as returned by facet_filters
+        after_id : int
+            the page starts after this id
+        limit : int
+            ids per page
+
+        Returns
+        -------
+        result : dict
+            ``{"count", "ids", "next_after_id", "facets": {facet: [{"value",
+            "count"}]}}``. Cities are counted within the chosen states only;
+            genres also carry their "label".
+        """
+
+        self.refresh()
+        with self.lock:
+            masks = {}
+            for facet, values in filters.items():
+                bitmaps = self.bitmaps[facet]
+                mask = 0
+                for value in values:
+                    mask |= bitmaps.get(value, 0)
+                masks[facet] = mask
+
+            def matching(skip=None):
+                bits = self.rows
+                for facet, mask in masks.items():
+                    if facet != skip:
+                        bits &= mask
+                return bits
+
+            selected = matching()
+            facets = {}
+            for facet in self.facets:
+                base = matching(facet) if facet in masks else selected
+                values = self.bitmaps[facet]
+                chosen = filters.get(facet, ())
+                if facet == 'city':
+                    names = set(chosen)
+                    for state in filters.get('state', ()):
+                        names |= self.cities.get(state, set())
+                else:
+                    names = values
+                counts = []
+                for value in names:
+                    count = popcount(base & values.get(value, 0))
+                    if count or value in chosen:
+                        counts.append({'value': value, 'count': count})
+                counts.sort(key=lambda entry: (-entry['count'], str(entry['value'])))
+                facets[facet] = counts
+            for entry in facets['genres']:
+                entry['label'] = genre_member(entry['value']).value
+
+            ids = first_ids(selected, after_id, limit + 1)
+        return {
+            'count': popcount(selected),
+            'ids': ids[:limit],
+            'next_after_id': ids[limit - 1] if len(ids) > limit else None,
+            'facets': facets,
+        }
+
+
+facet_indexes = {Venue: FacetIndex(Venue, 'seeking_talent'),
+                 Artist: FacetIndex(Artist, 'seeking_venue')}
+
+for _model, _index in facet_indexes.items():
+    event.listen(_model, 'after_delete', lambda mapper, conn, target, index=_index: index.discard(target.id))
+    event.listen(_model.__table__, 'after_create', lambda *args, index=_index, **kw: index.reset())
+
+
+def facet_filters(model, args):
+    """facet -> values from request arguments such as ?genres=Jazz&state=CA.
+
+    Facets may repeat; genres are a Genres name or label and the seeking
+    flag is true or false. Raises ValueError for values that cannot match.
+    """
+
+    index = facet_indexes[model]
+    filters = {}
+    for facet in index.facets:
+        values = [value.strip() for value in args.getlist(facet) if value.strip()]
+        if not values:
+            continue
+        if facet == 'genres':
+            values = [genre_member(value).name for value in values]
+        elif facet == index.flag:
+            flags = []
+            for value in values:
+                if value.lower() not in TRUE_VALUES | FALSE_VALUES:
+                    raise ValueError(f'{facet} must be true or false')
+                flags.append(value.lower() in TRUE_VALUES)
+            values = flags
+        filters[facet] = values
+    return filters
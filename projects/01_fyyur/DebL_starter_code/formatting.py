@@ -0,0 +1,71 @@
+#----------------------------------------------------------------------------#
+# Date formatting.
+#
+# Backs the `datetime` Jinja filter. Babel patterns and locales are parsed
+# once per (format, locale) and reused; datetimes are formatted directly and
+# only strings go through dateutil.
+#----------------------------------------------------------------------------#
+
+from datetime import date
+from functools import lru_cache
+import dateutil.parser
+from babel import Locale
+from babel.dates import get_date_format, get_datetime_format, get_time_format, parse_pattern
+
+DEFAULT_LOCALE = 'en'
+
+# Named formats used by the templates; Babel's own names ('short', 'long')
+# resolve through the locale, and anything else is a Babel pattern.
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+def babel_pattern(format, locale):
+    """The locale's date and time patterns joined as babel.dates.format_datetime does."""
+
+    return get_datetime_format(format, locale) \
+        .replace('{0}', get_time_format(format, locale).pattern) \
+        .replace('{1}', get_date_format(format, locale).pattern)
+
+
+@lru_cache(maxsize=64)
+def compiled_format(format, locale):
+    """Parsed (DateTimePattern, Locale) for a named format or Babel pattern."""
+
+    babel_locale = Locale.parse(locale)
+    if format in FORMATS:
+        pattern = FORMATS[format]
+    elif format in babel_locale.datetime_formats:
+        pattern = babel_pattern(format, babel_locale)
+    else:
+        pattern = format
+    return parse_pattern(pattern), babel_locale
+
+
+def to_datetime(value):
+    if isinstance(value, str):
+        return dateutil.parser.parse(value)
+    if not isinstance(value, date):
+        raise TypeError(f'Cannot format {value!r} as a date')
+    return value
+
+
+@lru_cache(maxsize=4096)
+def format_datetime(value, format='medium', locale=DEFAULT_LOCALE):
+    """Format a datetime (or a date string) with a named format or Babel pattern.
+
+    Results are memoized, since the same show times are rendered on many
+    pages.
+    """
+
+    pattern, babel_locale = compiled_format(format, locale)
+    return pattern.apply(to_datetime(value), babel_locale)
+
+
+def format_datetimes(values, format='medium', locale=DEFAULT_LOCALE):
+    """Format a list of datetimes with one pattern lookup for the whole batch."""
+
+    pattern, babel_locale = compiled_format(format, locale)
+    return [pattern.apply(to_datetime(value), babel_locale) for value in values]
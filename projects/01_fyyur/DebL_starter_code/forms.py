@@ -1,9 +1,10 @@
 from datetime import datetime
 from flask_wtf import Form, FlaskForm
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL, ValidationError, Length
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, ValidationError, Length, NumberRange
 import re
 from enum import Enum
+from models import DEFAULT_SHOW_MINUTES, MAX_SHOW_MINUTES
 
 def validate_phone(form, field):
         rule = re.compile(r"^[0-9]{3}-[0-9]{3}-[0-9]{4}$")
@@ -134,6 +135,11 @@ class ShowForm(Form):
         validators=[DataRequired()],
         default= datetime.today()
     )
+    duration = IntegerField(
+        'duration',
+        validators=[NumberRange(min=1, max=MAX_SHOW_MINUTES)],
+        default=DEFAULT_SHOW_MINUTES
+    )
 
 class VenueForm(Form):
     name = StringField(
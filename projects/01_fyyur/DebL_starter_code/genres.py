@@ -0,0 +1,152 @@
+#----------------------------------------------------------------------------#
+# Genres.
+#
+# Genres are rows of the Genre table, linked to venues and artists by
+# venue_genres and artist_genres, so "venues of a genre" is a range scan
+# of ix_venue_genres_genre. The genres arrays on Venue and Artist remain
+# the copy that pages, search and exports read.
+#
+# The catalogue is the Genres enum in forms.py: genre_cache loads the
+# name -> id map once per process (adding any members the table lacks)
+# and links are written in bulk without looking genres up. Mapper events
+# keep the links in step with the arrays; after Core bulk inserts call
+# relink_genres.
+#----------------------------------------------------------------------------#
+
+import threading
+from sqlalchemy import event, inspect, select
+from forms import Genres
+from models import db, Genre, Venue, Artist, venue_genres, artist_genres
+
+# model -> (association table, its column for the model's id)
+GENRE_LINKS = {
+    Venue: (venue_genres, venue_genres.c.venue_id),
+    Artist: (artist_genres, artist_genres.c.artist_id),
+}
+
+# any spelling, lowercased -> the Genres member
+GENRE_MEMBERS = {}
+for _genre in Genres:
+    GENRE_MEMBERS[_genre.name.lower()] = GENRE_MEMBERS[_genre.value.lower()] = _genre
+
+
+def genre_member(genre):
+    """The Genres member for a name or label in any case; ValueError if unknown."""
+
+    try:
+        return GENRE_MEMBERS[genre.lower()]
+    except KeyError:
+        raise ValueError(f'Unknown genre {genre!r}')
+
+
+class GenreCache(object):
+    """Maps a genre name or label, in any case, to its Genre.id."""
+
+    def __init__(self, app=None):
+        self.ids = None
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['genre_cache'] = self
+        app.before_first_request(self.warm_and_commit)
+
+    def reset(self):
+        self.ids = None
+
+    def warm(self, connection=None):
+        """Load the map, inserting the Genres members missing from the table."""
+
+        connection = connection or db.session.connection()
+        query = select([Genre.name, Genre.id])
+        with self.lock:
+            rows = dict(connection.execute(query).fetchall())
+            missing = [{'name': genre.name, 'label': genre.value}
+                       for genre in Genres if genre.name not in rows]
+            if missing:
+                connection.execute(Genre.__table__.insert(), missing)
+                rows = dict(connection.execute(query).fetchall())
+            ids = {name.lower(): genre_id for name, genre_id in rows.items()}
+            for genre in Genres:
+                ids[genre.value.lower()] = rows[genre.name]
+            self.ids = ids
+        return ids
+
+    def warm_and_commit(self):
+        self.warm()
+        db.session.commit()
+
+    def id(self, genre, connection=None):
+        ids = self.ids if self.ids is not None else self.warm(connection)
+        try:
+            return ids[genre.lower()]
+        except KeyError:
+            raise ValueError(f'Unknown genre {genre!r}')
+
+
+genre_cache = GenreCache()
+
+
+def link_genres(model, rows, connection=None):
+    """Insert the links for ``rows`` of (id, genres) with one executemany.
+
+    Returns the number of links written.
+    """
+
+    table, column = GENRE_LINKS[model]
+    connection = connection or db.session.connection()
+    links = []
+    for entity_id, genres in rows:
+        genre_ids = {genre_cache.id(genre, connection) for genre in genres or ()}
+        links.extend({column.name: entity_id, 'genre_id': genre_id}
+                     for genre_id in sorted(genre_ids))
+    if links:
+        connection.execute(table.insert(), links)
+    return len(links)
+
+
+def unlink_genres(model, ids, connection=None):
+    table, column = GENRE_LINKS[model]
+    connection = connection or db.session.connection()
+    connection.execute(table.delete().where(column.in_(ids)))
+
+
+def relink_genres(model, after_id=0):
+    """Rebuild the links of the rows with an id above ``after_id`` from their arrays."""
+
+    table, column = GENRE_LINKS[model]
+    connection = db.session.connection()
+    connection.execute(table.delete().where(column > after_id))
+    rows = connection.execute(select([model.id, model.genres])
+                              .where(model.id > after_id)).fetchall()
+    return link_genres(model, rows, connection)
+
+
+def genre_filter(model, genre):
+    """Criterion for ``model`` rows linked to ``genre`` (a Genres name or label)."""
+
+    table, column = GENRE_LINKS[model]
+    return model.id.in_(select([column]).where(table.c.genre_id == genre_cache.id(genre)))
+
+
+def _inserted(mapper, connection, target):
+    link_genres(mapper.class_, [(target.id, target.genres)], connection)
+
+
+def _updated(mapper, connection, target):
+    if inspect(target).attrs.genres.history.has_changes():
+        unlink_genres(mapper.class_, [target.id], connection)
+        link_genres(mapper.class_, [(target.id, target.genres)], connection)
+
+
+def _deleted(mapper, connection, target):
+    # Postgres cascades; SQLite does not enforce foreign keys by default
+    unlink_genres(mapper.class_, [target.id], connection)
+
+
+for _model in GENRE_LINKS:
+    event.listen(_model, 'after_insert', _inserted)
+    event.listen(_model, 'after_update', _updated)
+    event.listen(_model, 'after_delete', _deleted)
+event.listen(Genre.__table__, 'after_create', lambda *args, **kw: genre_cache.reset())
@@ -0,0 +1,462 @@
+#----------------------------------------------------------------------------#
+# Bulk import of venues, artists and shows (`flask fyyur import`).
+#
+# Rows are streamed from CSV or JSONL files, validated with the same rules
+# as forms.py and written in batches: COPY on Postgres, executemany
+# elsewhere. Each batch is its own transaction. If a batch fails in the
+# database, its rows are retried one at a time so that only the offending
+# rows are rejected. Imported venues and artists get their genre links
+# (see genres.py) in the same transaction.
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from wtforms.validators import URL, ValidationError
+from sqlalchemy import bindparam, func
+from sqlalchemy.exc import SQLAlchemyError
+from forms import Genres, States, validate_phone
+from models import db, Venue, Artist, Show, DEFAULT_SHOW_MINUTES, MAX_SHOW_MINUTES
+from counters import add_to_counters
+from cache import page_cache
+from search import memory_indexes
+from genres import relink_genres
+from jobs import job_queue
+
+BATCH_SIZE = 5000
+REPORT_SAMPLE = 10
+
+# the forms store genre names; files may use either the name or the label
+GENRE_NAMES = {}
+for _genre in Genres:
+    GENRE_NAMES[_genre.name.lower()] = _genre.name
+    GENRE_NAMES[_genre.value.lower()] = _genre.name
+STATE_NAMES = {state.value for state in States}
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y', 'on'}
+FALSE_VALUES = {'', '0', 'false', 'f', 'no', 'n', 'off'}
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'  # DateTimeField's default format
+
+validate_url = URL()
+
+
+class RowError(ValueError):
+    """Raised when a row fails validation; ``errors`` maps field to message."""
+
+    def __init__(self, errors):
+        super(RowError, self).__init__('; '.join(f'{k}: {v}' for k, v in errors.items()))
+        self.errors = errors
+
+
+class _Value(object):
+    """Just enough of a WTForms field for the forms.py validators."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def gettext(self, string):
+        return string
+
+
+#----------------------------------------------------------------------------#
+# Reading.
+#----------------------------------------------------------------------------#
+
+def read_rows(stream, fmt):
+    """Yield ``(line, row, error)`` for every record in ``stream``.
+
+    Parameters
+    ----------
+    stream : file object opened in text mode
+    fmt : 'csv' or 'jsonl'
+    Returns
+    -------
+    generator of (int, dict, str)
+        ``error`` is None unless the record could not be parsed.
+    """
+
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line, text in enumerate(stream, 1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as e:
+            yield line, None, f'invalid JSON: {e}'
+            continue
+        if not isinstance(row, dict):
+            yield line, None, 'expected a JSON object'
+            continue
+        yield line, row, None
+
+
+def guess_format(path):
+    """Pick 'csv' or 'jsonl' from a file name."""
+
+    if path.lower().endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    return 'csv'
+
+
+#----------------------------------------------------------------------------#
+# Validation.
+#----------------------------------------------------------------------------#
+
+def _text(row, name):
+    value = row.get(name)
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def _check_length(model, name, value, errors):
+    length = model.__table__.c[name].type.length
+    if length and len(value) > length:
+        errors[name] = f'Longer than {length} characters'
+
+
+def _required_text(model, row, name, errors):
+    value = _text(row, name)
+    if not value:
+        errors[name] = 'This field is required.'
+    else:
+        _check_length(model, name, value, errors)
+    return value
+
+
+def _optional_url(model, row, name, errors):
+    value = _text(row, name)
+    if not value:
+        return None
+    try:
+        validate_url(None, _Value(value))
+    except ValidationError as e:
+        errors[name] = str(e)
+    _check_length(model, name, value, errors)
+    return value
+
+
+def _phone(row, errors):
+    value = _text(row, 'phone')
+    try:
+        validate_phone(None, _Value(value))
+    except ValidationError as e:
+        errors['phone'] = str(e)
+    return value
+
+
+def _state(row, errors):
+    value = _text(row, 'state').upper()
+    if value not in STATE_NAMES:
+        errors['state'] = 'Not a valid choice'
+    return value
+
+
+def _genres(row, errors):
+    value = row.get('genres')
+    if isinstance(value, str):
+        value = value.split(',')
+    genres = []
+    for genre in value or ():
+        name = GENRE_NAMES.get(str(genre).strip().lower())
+        if name is None:
+            errors['genres'] = f"'{genre}' is not a valid choice for this field"
+            return genres
+        if name not in genres:
+            genres.append(name)
+    if not genres:
+        errors['genres'] = 'This field is required.'
+    return genres
+
+
+def _boolean(row, name, errors):
+    value = row.get(name)
+    if isinstance(value, bool):
+        return value
+    value = _text(row, name).lower()
+    if value in TRUE_VALUES:
+        return True
+    if value not in FALSE_VALUES:
+        errors[name] = 'Not a boolean'
+    return False
+
+
+def _integer(row, name, errors):
+    try:
+        return int(_text(row, name))
+    except ValueError:
+        errors[name] = 'Not a valid integer value'
+
+
+def _datetime(row, name, errors):
+    value = _text(row, name)
+    for parse in (datetime.fromisoformat, lambda v: datetime.strptime(v, DATETIME_FORMAT)):
+        try:
+            return parse(value)
+        except ValueError:
+            pass
+    errors[name] = 'Not a valid datetime value'
+
+
+def _profile(model, row, errors):
+    """Columns shared by venues and artists, checked like VenueForm/ArtistForm."""
+
+    values = {
+        'name': _required_text(model, row, 'name', errors),
+        'city': _required_text(model, row, 'city', errors),
+        'state': _state(row, errors),
+        'phone': _phone(row, errors),
+        'genres': _genres(row, errors),
+        'image_link': _optional_url(model, row, 'image_link', errors),
+        'facebook_link': _optional_url(model, row, 'facebook_link', errors),
+        'website_link': _optional_url(model, row, 'website_link', errors),
+        'seeking_description': _text(row, 'seeking_description') or None,
+        'upcoming_shows': 0,
+        'past_shows': 0,
+    }
+    if values['seeking_description']:
+        _check_length(model, 'seeking_description', values['seeking_description'], errors)
+    return values
+
+
+def clean_venue(row):
+    """Validate a venue row and return its column values; raises RowError."""
+
+    errors = {}
+    values = _profile(Venue, row, errors)
+    values['address'] = _required_text(Venue, row, 'address', errors)
+    values['seeking_talent'] = _boolean(row, 'seeking_talent', errors)
+    if errors:
+        raise RowError(errors)
+    return values
+
+
+def clean_artist(row):
+    """Validate an artist row and return its column values; raises RowError."""
+
+    errors = {}
+    values = _profile(Artist, row, errors)
+    values['seeking_venue'] = _boolean(row, 'seeking_venue', errors)
+    if errors:
+        raise RowError(errors)
+    return values
+
+
+def clean_show(row):
+    """Validate a show row and return its column values; raises RowError.
+
+    Whether the artist and venue exist is checked per batch.
+    """
+
+    errors = {}
+    values = {
+        'artist_id': _integer(row, 'artist_id', errors),
+        'venue_id': _integer(row, 'venue_id', errors),
+        'start_time': _datetime(row, 'start_time', errors),
+        'duration_minutes': DEFAULT_SHOW_MINUTES,
+    }
+    if _text(row, 'duration_minutes'):
+        values['duration_minutes'] = _integer(row, 'duration_minutes', errors)
+        if not errors.get('duration_minutes') and \
+                not 0 < values['duration_minutes'] <= MAX_SHOW_MINUTES:
+            errors['duration_minutes'] = f'Number must be between 1 and {MAX_SHOW_MINUTES}.'
+    if errors:
+        raise RowError(errors)
+    return values
+
+
+#----------------------------------------------------------------------------#
+# Writing.
+#----------------------------------------------------------------------------#
+
+def _copy_value(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, list):
+        items = (item.replace('\\', '\\\\').replace('"', '\\"') for item in value)
+        return '{' + ','.join(f'"{item}"' for item in items) + '}'
+    if isinstance(value, datetime):
+        return value.isoformat(' ')
+    return value
+
+
+def copy_rows(connection, table, rows):
+    """Write ``rows`` (dicts with the same keys) with Postgres COPY."""
+
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(row[column]) for column in columns])
+    buffer.seek(0)
+    names = ', '.join(f'"{column}"' for column in columns)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f'COPY "{table.name}" ({names}) FROM STDIN WITH (FORMAT csv)', buffer)
+    finally:
+        cursor.close()
+
+
+def insert_rows(table, rows):
+    """Insert ``rows`` into ``table`` inside the current session transaction."""
+
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        copy_rows(connection, table, rows)
+    else:
+        connection.execute(table.insert(), rows)
+
+
+def missing_references(rows):
+    """Return the error dict for each show row whose artist or venue is missing."""
+
+    existing = {}
+    for model, column in ((Artist, 'artist_id'), (Venue, 'venue_id')):
+        # an expanding parameter keeps compilation cost flat for big batches
+        query = db.session.query(model.id).filter(model.id.in_(bindparam('ids', expanding=True)))
+        ids = sorted({row[column] for row in rows})
+        existing[column] = {entity_id for entity_id, in query.params(ids=ids)}
+    problems = []
+    for row in rows:
+        errors = {column: 'No such record' for column in ('artist_id', 'venue_id')
+                  if row[column] not in existing[column]}
+        problems.append(errors)
+    return problems
+
+
+def show_deltas(rows, column, now=None):
+    """Count new upcoming and past shows per ``column`` value."""
+
+    now = now or datetime.utcnow()
+    deltas = {}
+    for row in rows:
+        upcoming, past = deltas.get(row[column], (0, 0))
+        if row['start_time'] >= now:
+            upcoming += 1
+        else:
+            past += 1
+        deltas[row[column]] = (upcoming, past)
+    return deltas
+
+
+class Importer(object):
+    """Validates rows of one kind and writes them in batches.
+
+    Parameters
+    ----------
+    kind : 'venues', 'artists' or 'shows'
+    batch_size : int
+        Rows per INSERT/COPY and per transaction.
+    rejects : file object, optional
+        Receives one JSON line per rejected row.
+    """
+
+    kinds = {
+        'venues': (Venue, clean_venue),
+        'artists': (Artist, clean_artist),
+        'shows': (Show, clean_show),
+    }
+
+    def __init__(self, kind, batch_size=BATCH_SIZE, rejects=None):
+        self.kind = kind
+        self.model, self.clean = self.kinds[kind]
+        self.batch_size = batch_size
+        self.rejects = rejects
+        self.read = self.inserted = self.rejected = 0
+        self.sample = []
+
+    def reject(self, line, row, errors):
+        self.rejected += 1
+        if len(self.sample) < REPORT_SAMPLE:
+            self.sample.append({'line': line, 'errors': errors})
+        if self.rejects is not None:
+            self.rejects.write(json.dumps({'line': line, 'errors': errors, 'row': row},
+                                          default=str) + '\n')
+
+    def run(self, records):
+        """Import ``records`` as yielded by read_rows and return the report."""
+
+        started, since = time.perf_counter(), datetime.utcnow()
+        batch = []
+        for line, row, error in records:
+            self.read += 1
+            if error:
+                self.reject(line, row, {'row': error})
+                continue
+            try:
+                batch.append((line, row, self.clean(row)))
+            except RowError as e:
+                self.reject(line, row, e.errors)
+                continue
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        if batch:
+            self.flush(batch)
+        if self.model in memory_indexes:
+            memory_indexes[self.model].reset()
+        if self.inserted:
+            # rows written since ``since`` are rescored by a background job
+            job_queue.enqueue('refresh_recommendations', {'since': since.isoformat()})
+            db.session.commit()
+        page_cache.clear()
+        return self.report(time.perf_counter() - started)
+
+    def flush(self, batch):
+        if self.model is Show:
+            problems = missing_references([values for _, _, values in batch])
+            valid = []
+            for entry, errors in zip(batch, problems):
+                if errors:
+                    self.reject(entry[0], entry[1], errors)
+                else:
+                    valid.append(entry)
+            batch = valid
+        if not batch:
+            return
+        try:
+            self.write([values for _, _, values in batch])
+        except (SQLAlchemyError, db.session.bind.dialect.dbapi.Error):
+            db.session.rollback()
+            for line, row, values in batch:
+                try:
+                    self.write([values])
+                except (SQLAlchemyError, db.session.bind.dialect.dbapi.Error) as e:
+                    db.session.rollback()
+                    message = str(getattr(e, 'orig', e)).strip().splitlines()[0]
+                    self.reject(line, row, {'database': message})
+
+    def write(self, rows):
+        # COPY does not apply Python-side column defaults
+        stamp = datetime.utcnow()
+        for row in rows:
+            row['updated_at'] = stamp
+        if self.model is Show:
+            insert_rows(self.model.__table__, rows)
+            add_to_counters(Venue, show_deltas(rows, 'venue_id'))
+            add_to_counters(Artist, show_deltas(rows, 'artist_id'))
+        else:
+            # the batch gets the ids above the current highest one
+            after_id = db.session.query(func.max(self.model.id)).scalar() or 0
+            insert_rows(self.model.__table__, rows)
+            relink_genres(self.model, after_id)
+        db.session.commit()
+        self.inserted += len(rows)
+
+    def report(self, seconds):
+        return {
+            'kind': self.kind,
+            'read': self.read,
+            'inserted': self.inserted,
+            'rejected': self.rejected,
+            'seconds': seconds,
+            'rows_per_second': self.inserted / seconds if seconds else 0,
+            'sample': self.sample,
+        }
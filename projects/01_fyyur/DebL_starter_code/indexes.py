@@ -0,0 +1,44 @@
+#----------------------------------------------------------------------------#
+# Database-managed indexes.
+#
+# Postgres cannot index "start_time >= now()", so upcoming shows are covered
+# by a partial index with a fixed cutoff. It stays usable for any query
+# asking for shows after the cutoff, but grows as the cutoff ages; `flask
+# fyyur refresh-upcoming-index` rebuilds it with today's date (without
+# locking writes on Postgres).
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+from models import db
+
+UPCOMING_INDEX = 'ix_show_upcoming'
+
+
+def upcoming_index_sql(name, cutoff, concurrently=False):
+    return (f'CREATE INDEX {"CONCURRENTLY " if concurrently else ""}{name} '
+            f'ON "Show" (start_time, id) '
+            f"WHERE start_time >= '{cutoff:%Y-%m-%d}'")
+
+
+def refresh_upcoming_index(cutoff=None, engine=None):
+    """Rebuild the partial upcoming-shows index with a new cutoff date."""
+
+    cutoff = cutoff or datetime.utcnow()
+    engine = engine or db.engine
+    if engine.dialect.name == 'postgresql':
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {UPCOMING_INDEX}_new')
+            conn.execute(upcoming_index_sql(f'{UPCOMING_INDEX}_new', cutoff, concurrently=True))
+            conn.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {UPCOMING_INDEX}')
+            conn.execute(f'ALTER INDEX {UPCOMING_INDEX}_new RENAME TO {UPCOMING_INDEX}')
+    else:
+        with engine.begin() as conn:
+            conn.execute(f'DROP INDEX IF EXISTS {UPCOMING_INDEX}')
+            conn.execute(upcoming_index_sql(UPCOMING_INDEX, cutoff))
+    return cutoff
+
+
+def drop_upcoming_index(engine=None):
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        conn.execute(f'DROP INDEX IF EXISTS {UPCOMING_INDEX}')
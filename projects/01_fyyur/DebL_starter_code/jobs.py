@@ -0,0 +1,250 @@
+#----------------------------------------------------------------------------#
+# Background jobs.
+#
+# Jobs are rows in the app's own database (the Job model), so they commit
+# atomically with the request that enqueued them and no broker is needed.
+# They are run by a thread inside the web process (JOB_QUEUE_THREAD) or
+# by `flask fyyur worker`. Failed jobs are retried with exponential
+# backoff up to max_attempts. Jobs enqueued with an idempotency key that
+# already exists are not queued again, so keys must not be built from ids
+# the database may reuse. Done and failed jobs are deleted after
+# JOB_RETENTION_DAYS. /api/v1/jobs reports their status.
+#
+# Tasks must be idempotent: a job whose worker died mid-run is picked up
+# again once its lease expires.
+#----------------------------------------------------------------------------#
+
+import random
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from flask import current_app
+from models import db, Job, Venue, Artist
+from counters import refresh_counters
+from recommendations import refresh_recommendations, changed_since
+from cache import page_cache
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+class JobQueue(object):
+    """Flask extension that enqueues and runs Job rows."""
+
+    def __init__(self, app=None):
+        self.tasks = {}
+        self.apps = {}           # app -> (thread, wake event)
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOB_QUEUE_THREAD', True)
+        app.config.setdefault('JOB_MAX_ATTEMPTS', 5)
+        app.config.setdefault('JOB_BACKOFF_SECONDS', 2)
+        app.config.setdefault('JOB_BACKOFF_MAX_SECONDS', 600)
+        app.config.setdefault('JOB_LEASE_SECONDS', 600)
+        app.config.setdefault('JOB_POLL_SECONDS', 5)
+        app.config.setdefault('JOB_RETENTION_DAYS', 30)
+        app.extensions['job_queue'] = self
+
+    def task(self, name):
+        """Register the decorated function as the task called ``name``."""
+
+        def decorator(function):
+            self.tasks[name] = function
+            return function
+        return decorator
+
+    def enqueue(self, name, payload=None, key=None, delay=None, max_attempts=None):
+        """Add a job to the current session; the caller commits.
+
+        Parameters
+        ----------
+        name : str
+            registered task name
+        payload : dict
+            keyword arguments for the task, JSON serializable
+        key : str, optional
+            idempotency key; if a job with this key exists it is returned
+            instead of queueing another
+        delay : timedelta, optional
+            run no earlier than this from now
+        Returns
+        -------
+        job : Job
+        """
+
+        if name not in self.tasks:
+            raise ValueError(f'Unknown task {name!r}')
+        if key is not None:
+            existing = Job.query.filter_by(idempotency_key=key).one_or_none()
+            if existing is not None:
+                return existing
+        job = Job(name=name, payload=payload or {}, idempotency_key=key,
+                  run_at=datetime.utcnow() + (delay or timedelta()),
+                  max_attempts=max_attempts or current_app.config['JOB_MAX_ATTEMPTS'])
+        db.session.add(job)
+        return job
+
+    def notify(self):
+        """Wake this process's worker thread (started on first use) after a commit."""
+
+        app = current_app._get_current_object()
+        if not app.config['JOB_QUEUE_THREAD']:
+            return
+        with self.lock:
+            if app not in self.apps:
+                wake = threading.Event()
+                thread = threading.Thread(target=self.work, args=(app, wake),
+                                          name='fyyur-jobs', daemon=True)
+                self.apps[app] = (thread, wake)
+                thread.start()
+        self.apps[app][1].set()
+
+    def work(self, app, wake=None, once=False, retention_days=None):
+        """Run due jobs until stopped; waits for ``wake`` or the poll interval.
+
+        Finished jobs older than ``retention_days`` (JOB_RETENTION_DAYS by
+        default; 0 keeps them) are pruned on start and then hourly.
+        """
+
+        wake = wake or threading.Event()
+        if retention_days is None:
+            retention_days = app.config['JOB_RETENTION_DAYS']
+        pruned_at = None
+        with app.app_context():
+            while True:
+                try:
+                    if retention_days and (pruned_at is None or
+                                           time.monotonic() - pruned_at > PRUNE_INTERVAL_SECONDS):
+                        self.prune(timedelta(days=retention_days))
+                        pruned_at = time.monotonic()
+                    while self.run_pending():
+                        pass
+                except Exception:
+                    app.logger.exception('Job queue error')
+                finally:
+                    db.session.remove()
+                if once:
+                    return
+                wake.wait(app.config['JOB_POLL_SECONDS'])
+                wake.clear()
+
+    def backoff(self, attempts):
+        """Delay before retry number ``attempts``: doubling, capped, with 10% jitter."""
+
+        config = current_app.config
+        seconds = min(config['JOB_BACKOFF_SECONDS'] * 2 ** (attempts - 1),
+                      config['JOB_BACKOFF_MAX_SECONDS'])
+        return timedelta(seconds=seconds * random.uniform(1, 1.1))
+
+    def run_pending(self, limit=100, now=None):
+        """Run up to ``limit`` due jobs; returns how many were run."""
+
+        now = now or datetime.utcnow()
+        lease = timedelta(seconds=current_app.config['JOB_LEASE_SECONDS'])
+        Job.query.filter(Job.status == RUNNING, Job.locked_at < now - lease) \
+            .update({Job.status: QUEUED}, synchronize_session=False)
+        db.session.commit()
+
+        due = [job_id for job_id, in db.session.query(Job.id)
+               .filter(Job.status == QUEUED, Job.run_at <= now)
+               .order_by(Job.run_at, Job.id).limit(limit)]
+        ran = 0
+        for job_id in due:
+            if self.claim(job_id, now):
+                self.run(Job.query.get(job_id))
+                ran += 1
+        return ran
+
+    def prune(self, older_than, now=None):
+        """Delete done and failed jobs that finished more than ``older_than`` ago."""
+
+        cutoff = (now or datetime.utcnow()) - older_than
+        deleted = Job.query.filter(Job.status.in_([DONE, FAILED]), Job.finished_at < cutoff) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    def claim(self, job_id, now):
+        """Mark a queued job as running; False if another worker got it first."""
+
+        claimed = Job.query.filter(Job.id == job_id, Job.status == QUEUED) \
+            .update({Job.status: RUNNING, Job.attempts: Job.attempts + 1,
+                     Job.locked_at: now}, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    def run(self, job):
+        job_id, attempts = job.id, job.attempts
+        try:
+            self.tasks[job.name](**job.payload)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            job = Job.query.get(job_id)
+            job.last_error = traceback.format_exc(limit=5)
+            if attempts >= job.max_attempts:
+                job.status, job.finished_at = FAILED, datetime.utcnow()
+            else:
+                job.status, job.run_at = QUEUED, datetime.utcnow() + self.backoff(attempts)
+            db.session.commit()
+            return
+        job = Job.query.get(job_id)
+        job.status, job.finished_at, job.last_error = DONE, datetime.utcnow(), None
+        db.session.commit()
+
+
+job_queue = JobQueue()
+
+
+def job_status(job):
+    return {
+        'id': job.id,
+        'name': job.name,
+        'key': job.idempotency_key,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'run_at': job.run_at,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+        'last_error': job.last_error,
+    }
+
+
+#----------------------------------------------------------------------------#
+# Tasks.
+#----------------------------------------------------------------------------#
+
+@job_queue.task('refresh_counters')
+def refresh_counters_task(venue_ids=(), artist_ids=()):
+    """Recompute show counters after shows were added or removed."""
+
+    refresh_counters(Venue, venue_ids)
+    refresh_counters(Artist, artist_ids)
+    db.session.commit()
+    # the listings show the counters
+    page_cache.invalidate('venues', 'artists')
+
+
+@job_queue.task('refresh_recommendations')
+def refresh_recommendations_task(venue_ids=(), artist_ids=(), since=None):
+    """Rescore changed venues and artists; ``since`` adds everything edited after it."""
+
+    if since is not None:
+        changed_venues, changed_artists = changed_since(datetime.fromisoformat(since))
+        venue_ids = sorted(set(venue_ids) | set(changed_venues))
+        artist_ids = sorted(set(artist_ids) | set(changed_artists))
+    keys = []
+    for venue_id in venue_ids:
+        keys.append(f'venue:{venue_id}')
+        keys += [f'artist:{i}' for i in refresh_recommendations(Venue, venue_id)]
+    for artist_id in artist_ids:
+        keys.append(f'artist:{artist_id}')
+        keys += [f'venue:{i}' for i in refresh_recommendations(Artist, artist_id)]
+    db.session.commit()
+    # the detail pages list the recommendations
+    page_cache.invalidate(*keys)
@@ -25,6 +25,14 @@ config.set_main_option(
     str(current_app.extensions['migrate'].db.engine.url).replace('%', '%%'))
 target_metadata = current_app.extensions['migrate'].db.metadata
 
+# indexes created by raw SQL (trigram, partial) that the models do not
+# declare; keep autogenerate from dropping them
+DATABASE_MANAGED_INDEXES = ('ix_venue_name_trgm', 'ix_artist_name_trgm', 'ix_show_upcoming')
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    return not (type_ == 'index' and name in DATABASE_MANAGED_INDEXES)
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -45,7 +53,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=target_metadata, literal_binds=True
+        url=url, target_metadata=target_metadata, literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -77,6 +86,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
+            include_object=include_object,
             **current_app.extensions['migrate'].configure_args
         )
 
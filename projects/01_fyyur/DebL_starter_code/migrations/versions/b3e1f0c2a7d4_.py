@@ -0,0 +1,40 @@
+"""show counters on Venue and Artist
+
+Revision ID: b3e1f0c2a7d4
+Revises: 59c605bca13a
+Create Date: 2026-10-18 09:12:41.503218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e1f0c2a7d4'
+down_revision = '59c605bca13a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('past_shows', sa.Integer(), nullable=True))
+    op.add_column('Artist', sa.Column('upcoming_shows', sa.Integer(), nullable=True))
+    op.add_column('Artist', sa.Column('past_shows', sa.Integer(), nullable=True))
+
+    # backfill from the Show table; `flask fyyur check-counters` does the same
+    for table, fk in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.execute(f'''
+            UPDATE "{table}" SET
+              upcoming_shows = (SELECT count(*) FROM "Show"
+                                WHERE "Show".{fk} = "{table}".id
+                                  AND "Show".start_time >= now() at time zone 'utc'),
+              past_shows = (SELECT count(*) FROM "Show"
+                            WHERE "Show".{fk} = "{table}".id
+                              AND "Show".start_time < now() at time zone 'utc')
+        ''')
+
+
+def downgrade():
+    op.drop_column('Artist', 'past_shows')
+    op.drop_column('Artist', 'upcoming_shows')
+    op.drop_column('Venue', 'past_shows')
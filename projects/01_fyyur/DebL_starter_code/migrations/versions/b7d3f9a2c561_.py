@@ -0,0 +1,80 @@
+"""Genre table with venue and artist links, filled from the genres arrays
+
+Revision ID: b7d3f9a2c561
+Revises: c6e2b8f4d017
+Create Date: 2026-10-18 21:34:08.517294
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d3f9a2c561'
+down_revision = 'c6e2b8f4d017'
+branch_labels = None
+depends_on = None
+
+# forms.Genres at this revision: (name, label)
+GENRES = [
+    ('Alternative', 'Alternative'), ('Blues', 'Blues'), ('Classical', 'Classical'),
+    ('Country', 'Country'), ('Electronic', 'Electronic'), ('Folk', 'Folk'),
+    ('Funk', 'Funk'), ('HipHop', 'Hip-Hop'), ('Heavy_Metal', 'Heavy Metal'),
+    ('Instrumental', 'Instrumental'), ('Jazz', 'Jazz'),
+    ('Musical_Theatre', 'Musical Theatre'), ('Pop', 'Pop'), ('Punk', 'Punk'),
+    ('RnB', 'R&B'), ('Reggae', 'Reggae'), ('Rock_n_Roll', 'Rock n Roll'),
+    ('Soul', 'Soul'), ('Swing', 'Swing'), ('Other', 'Other'),
+]
+
+# arrays hold enum names (the forms and importer) or labels (rows written
+# by hand); anything else is not linked
+MOVE_LINKS = '''
+    INSERT INTO {links} ({column}, genre_id)
+    SELECT DISTINCT entity.id, "Genre".id
+    FROM "{table}" AS entity
+    CROSS JOIN LATERAL unnest(entity.genres) AS item(genre)
+    JOIN "Genre" ON lower(item.genre) IN (lower("Genre".name), lower("Genre".label))
+'''
+
+
+def upgrade():
+    genre = op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('label', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.bulk_insert(genre, [{'name': name, 'label': label} for name, label in GENRES])
+    op.create_table('venue_genres',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id', 'genre_id')
+    )
+    op.create_table('artist_genres',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+    sa.PrimaryKeyConstraint('artist_id', 'genre_id')
+    )
+    op.execute(MOVE_LINKS.format(links='venue_genres', column='venue_id', table='Venue'))
+    op.execute(MOVE_LINKS.format(links='artist_genres', column='artist_id', table='Artist'))
+    # built after the copy, which is faster than maintaining them row by row
+    op.create_index('ix_venue_genres_genre', 'venue_genres', ['genre_id', 'venue_id'])
+    op.create_index('ix_artist_genres_genre', 'artist_genres', ['genre_id', 'artist_id'])
+    # genre filters use the links now
+    op.drop_index('ix_artist_genres', table_name='Artist')
+    op.drop_index('ix_venue_genres', table_name='Venue')
+
+
+def downgrade():
+    op.create_index('ix_venue_genres', 'Venue', ['genres'], postgresql_using='gin')
+    op.create_index('ix_artist_genres', 'Artist', ['genres'], postgresql_using='gin')
+    op.drop_index('ix_artist_genres_genre', table_name='artist_genres')
+    op.drop_index('ix_venue_genres_genre', table_name='venue_genres')
+    op.drop_table('artist_genres')
+    op.drop_table('venue_genres')
+    op.drop_table('Genre')
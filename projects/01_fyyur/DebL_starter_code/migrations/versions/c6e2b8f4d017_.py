@@ -0,0 +1,30 @@
+"""duration_minutes on Show for booking-conflict checks
+
+Revision ID: c6e2b8f4d017
+Revises: a93d5e71c0f2
+Create Date: 2026-10-18 20:11:36.402175
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6e2b8f4d017'
+down_revision = 'a93d5e71c0f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing shows get the default length; the app sets it afterwards
+    op.add_column('Show', sa.Column('duration_minutes', sa.Integer(), nullable=False,
+                                    server_default='120'))
+    op.alter_column('Show', 'duration_minutes', server_default=None)
+
+
+def downgrade():
+    # `flask fyyur audit-bookings --enforce` may have added these
+    op.execute('ALTER TABLE "Show" DROP CONSTRAINT IF EXISTS ex_show_venue_booking')
+    op.execute('ALTER TABLE "Show" DROP CONSTRAINT IF EXISTS ex_show_artist_booking')
+    op.drop_column('Show', 'duration_minutes')
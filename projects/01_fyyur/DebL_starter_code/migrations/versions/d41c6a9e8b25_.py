@@ -0,0 +1,57 @@
+"""search vectors and trigram indexes for Venue and Artist
+
+Revision ID: d41c6a9e8b25
+Revises: b3e1f0c2a7d4
+Create Date: 2026-10-18 11:40:07.118532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41c6a9e8b25'
+down_revision = 'b3e1f0c2a7d4'
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR = '''
+    setweight(to_tsvector('simple', coalesce({row}name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(array_to_string({row}genres, ' '), '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce({row}city, '') || ' ' || coalesce({row}state, '')), 'C')
+'''
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute(f'''
+        CREATE FUNCTION fyyur_search_vector() RETURNS trigger AS $$
+        BEGIN
+          NEW.search_vector := {SEARCH_VECTOR.format(row='NEW.')};
+          RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+    for table in ('Venue', 'Artist'):
+        lower = table.lower()
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        op.execute(f'UPDATE "{table}" SET search_vector = {SEARCH_VECTOR.format(row="")}')
+        op.execute(f'''
+            CREATE TRIGGER {lower}_search_vector
+            BEFORE INSERT OR UPDATE OF name, city, state, genres ON "{table}"
+            FOR EACH ROW EXECUTE PROCEDURE fyyur_search_vector()
+        ''')
+        op.create_index(f'ix_{lower}_search_vector', table, ['search_vector'],
+                        postgresql_using='gin')
+        op.execute(f'CREATE INDEX ix_{lower}_name_trgm ON "{table}" USING gin (name gin_trgm_ops)')
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        lower = table.lower()
+        op.drop_index(f'ix_{lower}_name_trgm', table_name=table)
+        op.drop_index(f'ix_{lower}_search_vector', table_name=table)
+        op.execute(f'DROP TRIGGER {lower}_search_vector ON "{table}"')
+        op.drop_column(table, 'search_vector')
+    op.execute('DROP FUNCTION fyyur_search_vector()')
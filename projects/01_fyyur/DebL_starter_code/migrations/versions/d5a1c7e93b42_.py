@@ -0,0 +1,41 @@
+"""Recommendation table of scored artist/venue matches
+
+Revision ID: d5a1c7e93b42
+Revises: b7d3f9a2c561
+Create Date: 2026-10-18 22:47:19.063812
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a1c7e93b42'
+down_revision = 'b7d3f9a2c561'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # left empty: `flask fyyur refresh-recommendations` fills it
+    op.create_table('Recommendation',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('shared_genres', sa.Integer(), nullable=False),
+    sa.Column('past_shows', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('artist_id', 'venue_id')
+    )
+    op.create_index('ix_recommendation_artist', 'Recommendation', ['artist_id', 'score', 'venue_id'], unique=False)
+    op.create_index('ix_recommendation_venue', 'Recommendation', ['venue_id', 'score', 'artist_id'], unique=False)
+    op.create_index('ix_artist_state_city', 'Artist', ['state', 'city'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_artist_state_city', table_name='Artist')
+    op.drop_index('ix_recommendation_venue', table_name='Recommendation')
+    op.drop_index('ix_recommendation_artist', table_name='Recommendation')
+    op.drop_table('Recommendation')
@@ -0,0 +1,40 @@
+"""indexes for Show, Venue and Artist access paths
+
+Revision ID: e7a9c3d1f460
+Revises: d41c6a9e8b25
+Create Date: 2026-10-18 14:05:52.730914
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a9c3d1f460'
+down_revision = 'd41c6a9e8b25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_show_venue_start', 'Show', ['venue_id', 'start_time'])
+    op.create_index('ix_show_artist_start', 'Show', ['artist_id', 'start_time'])
+    op.create_index('ix_show_start', 'Show', ['start_time', 'id'])
+    # partial index for upcoming shows; `flask fyyur refresh-upcoming-index`
+    # moves its cutoff forward
+    op.execute('CREATE INDEX ix_show_upcoming ON "Show" (start_time, id) '
+               f"WHERE start_time >= '{datetime.utcnow():%Y-%m-%d}'")
+    op.create_index('ix_venue_state_city', 'Venue', ['state', 'city'])
+    op.create_index('ix_venue_genres', 'Venue', ['genres'], postgresql_using='gin')
+    op.create_index('ix_artist_genres', 'Artist', ['genres'], postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_artist_genres', table_name='Artist')
+    op.drop_index('ix_venue_genres', table_name='Venue')
+    op.drop_index('ix_venue_state_city', table_name='Venue')
+    op.execute('DROP INDEX ix_show_upcoming')
+    op.drop_index('ix_show_start', table_name='Show')
+    op.drop_index('ix_show_artist_start', table_name='Show')
+    op.drop_index('ix_show_venue_start', table_name='Show')
@@ -0,0 +1,34 @@
+"""updated_at on Venue, Artist and Show for incremental exports
+
+Revision ID: f2c8d4a6b913
+Revises: e7a9c3d1f460
+Create Date: 2026-10-18 16:40:18.204577
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c8d4a6b913'
+down_revision = 'e7a9c3d1f460'
+branch_labels = None
+depends_on = None
+
+TABLES = (('Venue', 'ix_venue_updated'), ('Artist', 'ix_artist_updated'),
+          ('Show', 'ix_show_updated'))
+
+
+def upgrade():
+    for table, index in TABLES:
+        # existing rows count as updated now; the app sets the value afterwards
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                       server_default=sa.text("(now() at time zone 'utc')")))
+        op.alter_column(table, 'updated_at', server_default=None)
+        op.create_index(index, table, ['updated_at', 'id'])
+
+
+def downgrade():
+    for table, index in TABLES:
+        op.drop_index(index, table_name=table)
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,202 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from pool import pool_options
+
+
+class FyyurSQLAlchemy(SQLAlchemy):
+    """Applies the configured pool settings to Postgres engines."""
+
+    def create_engine(self, sa_url, engine_opts):
+        if sa_url.get_backend_name() == 'postgresql':
+            # explicit SQLALCHEMY_ENGINE_OPTIONS still take precedence
+            engine_opts = dict(pool_options(self.get_app().config), **engine_opts)
+        return super(FyyurSQLAlchemy, self).create_engine(sa_url, engine_opts)
+
+
+db = FyyurSQLAlchemy()
+
+# Genres are a Postgres ARRAY; SQLite (benchmarks and tests) stores them as JSON.
+GenreList = db.ARRAY(db.String).with_variant(db.JSON(), 'sqlite')
+
+# Filled in by a database trigger (see search.py); never written by the app.
+SearchVector = TSVECTOR().with_variant(db.Text(), 'sqlite')
+
+# Show lengths; the cap bounds the booking-conflict range scan (see bookings.py).
+DEFAULT_SHOW_MINUTES = 120
+MAX_SHOW_MINUTES = 12 * 60
+
+#----------------------------------------------------------------------------#
+# Models.
+#----------------------------------------------------------------------------#
+
+
+class Venue(db.Model):
+    __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_venue_state_city', 'state', 'city'),
+        db.Index('ix_venue_updated', 'updated_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(), nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    address = db.Column(db.String(240), nullable=False)
+    phone = db.Column(db.String(120), nullable=False)
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    website_link = db.Column(db.String(250))
+    # display copy; filters use venue_genres (see genres.py)
+    genres = db.Column(GenreList, nullable=False)
+    seeking_talent = db.Column(db.Boolean, default=True)
+    seeking_description = db.Column(db.String(250))
+    upcoming_shows = db.Column(db.Integer, default=0)
+    past_shows = db.Column(db.Integer, default=0)
+    search_vector = db.deferred(db.Column(SearchVector))
+    updated_at = db.Column(db.DateTime(), nullable=False,
+        default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Venue {self.id} name: {self.name}>'
+
+
+class Artist(db.Model):
+    __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_artist_state_city', 'state', 'city'),
+        db.Index('ix_artist_updated', 'updated_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    phone = db.Column(db.String(120), nullable=False)
+    # display copy; filters use artist_genres (see genres.py)
+    genres = db.Column(GenreList, nullable=False)
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    website_link = db.Column(db.String(120))
+    seeking_venue = db.Column(db.Boolean, default=True)
+    seeking_description = db.Column(db.String(250))
+    upcoming_shows = db.Column(db.Integer, default=0)
+    past_shows = db.Column(db.Integer, default=0)
+    search_vector = db.deferred(db.Column(SearchVector))
+    updated_at = db.Column(db.DateTime(), nullable=False,
+        default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Artist {self.id} name: {self.name}>'
+
+
+class Genre(db.Model):
+    """One of the forms.Genres; ``name`` is the enum name, ``label`` its value."""
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+    label = db.Column(db.String(120), nullable=False)
+
+    def __repr__(self):
+        return f'<Genre {self.id} {self.name}>'
+
+
+# the primary keys answer "genres of a venue"; the genre_id indexes answer
+# "venues of a genre"
+venue_genres = db.Table(
+    'venue_genres',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'),
+              primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
+    db.Index('ix_venue_genres_genre', 'genre_id', 'venue_id'),
+)
+
+artist_genres = db.Table(
+    'artist_genres',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'),
+              primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
+    db.Index('ix_artist_genres_genre', 'genre_id', 'artist_id'),
+)
+
+
+class Show(db.Model):
+    __tablename__ = 'Show'
+    # the partial upcoming-shows index is managed by indexes.py
+    __table_args__ = (
+        db.Index('ix_show_venue_start', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_start', 'artist_id', 'start_time'),
+        db.Index('ix_show_start', 'start_time', 'id'),
+        db.Index('ix_show_updated', 'updated_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    start_time = db.Column(db.DateTime(), nullable=False,
+        default=datetime.utcnow)
+    duration_minutes = db.Column(db.Integer, nullable=False,
+        default=DEFAULT_SHOW_MINUTES)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'),
+        nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'),
+        nullable=False)
+    artist = db.relationship(Artist,
+        backref=db.backref('shows', cascade='all, delete'))
+    updated_at = db.Column(db.DateTime(), nullable=False,
+        default=datetime.utcnow, onupdate=datetime.utcnow)
+    venue = db.relationship(Venue,
+        backref=db.backref('shows', cascade='all, delete'))
+
+    def __repr__(self):
+        return f'<Show {self.id}, Artist {self.artist_id}, Venue {self.venue_id}>'
+
+
+class Recommendation(db.Model):
+    """A scored artist/venue match, materialized by recommendations.py."""
+    __tablename__ = 'Recommendation'
+    # each side's best matches, read in score order by one index range scan
+    __table_args__ = (
+        db.Index('ix_recommendation_artist', 'artist_id', 'score', 'venue_id'),
+        db.Index('ix_recommendation_venue', 'venue_id', 'score', 'artist_id'),
+    )
+
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'),
+        primary_key=True)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'),
+        primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    shared_genres = db.Column(db.Integer, nullable=False)
+    past_shows = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime(), nullable=False,
+        default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Recommendation Artist {self.artist_id}, Venue {self.venue_id}: {self.score:.2f}>'
+
+
+class Job(db.Model):
+    """A unit of background work; see jobs.py."""
+    __tablename__ = 'Job'
+    __table_args__ = (
+        db.Index('ix_job_due', 'status', 'run_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    idempotency_key = db.Column(db.String(250), unique=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime(), nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime())
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime(), nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime())
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.name}: {self.status}>'
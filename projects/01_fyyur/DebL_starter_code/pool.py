@@ -0,0 +1,134 @@
+#----------------------------------------------------------------------------#
+# Database connection pool.
+#
+# Builds the Postgres pool options from config (size, overflow, pre-ping,
+# recycle, statement timeout and a per-worker share of DB_MAX_CONNECTIONS)
+# and records checkout wait times so /health can report them.
+#----------------------------------------------------------------------------#
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+# upper bounds (ms) of the checkout wait histogram buckets; the last is +Inf
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+def pool_options(config):
+    """create_engine() keyword arguments for a Postgres pool.
+
+    When DB_MAX_CONNECTIONS is set, each of the WEB_CONCURRENCY workers gets
+    an equal share of it, and its pool size plus overflow never exceeds that
+    share.
+    """
+
+    size = config['DB_POOL_SIZE']
+    overflow = config['DB_MAX_OVERFLOW']
+    budget = config.get('DB_MAX_CONNECTIONS')
+    if budget:
+        share = max(1, budget // max(1, config['WEB_CONCURRENCY']))
+        size = min(size, share)
+        overflow = max(0, min(overflow, share - size))
+
+    options = f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': size,
+        'max_overflow': overflow,
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'connect_args': {
+            'options': options,
+            'application_name': f'fyyur-{os.getpid()}',
+        },
+    }
+
+
+class PoolStats(object):
+    """Checkout counters and a wait-time histogram for one pool."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def record_wait(self, seconds, timed_out=False):
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self.buckets[bisect_left(WAIT_BUCKETS_MS, seconds * 1000)] += 1
+
+    def record_connect(self):
+        with self.lock:
+            self.connects += 1
+
+    def snapshot(self):
+        with self.lock:
+            labels = [f'le_{bound}ms' for bound in WAIT_BUCKETS_MS] + ['inf']
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'connects': self.connects,
+                'wait_ms_avg': round(1000 * self.wait_total / self.checkouts, 3)
+                               if self.checkouts else 0.0,
+                'wait_ms_max': round(1000 * self.wait_max, 3),
+                'wait_ms_histogram': dict(zip(labels, self.buckets)),
+            }
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that times how long each checkout waits for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super(TimedQueuePool, self).__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def recreate(self):
+        pool = super(TimedQueuePool, self).recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super(TimedQueuePool, self)._do_get()
+        except exc.TimeoutError:
+            self.stats.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record_wait(time.perf_counter() - start)
+        return conn
+
+    def _create_connection(self):
+        self.stats.record_connect()
+        return super(TimedQueuePool, self)._create_connection()
+
+
+def pool_status(engine):
+    """Current occupancy and checkout statistics of ``engine``'s pool."""
+
+    pool = engine.pool
+    status = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'in_use': pool.checkedout(),
+            'overflow': max(0, pool.overflow()),
+            'max_overflow': pool._max_overflow,
+        })
+    stats = getattr(pool, 'stats', None)
+    if stats is not None:
+        status.update(stats.snapshot())
+    return status
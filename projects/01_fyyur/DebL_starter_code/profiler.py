@@ -0,0 +1,167 @@
+#----------------------------------------------------------------------------#
+# Per-request SQL profiler.
+#
+# Records every statement a request sends to the database with its timing,
+# flags statements repeated with different parameters (N+1 patterns), adds a
+# Server-Timing header, and can append a debug panel to HTML pages
+# (SQL_PROFILER_PANEL, or ?sql_profile=1 where SQL_PROFILER_PANEL_PARAM
+# allows it, as in debug mode). Per-route totals feed
+# `flask fyyur profile-routes`, which writes a JSON report for CI to diff.
+#----------------------------------------------------------------------------#
+
+import re
+import threading
+import time
+from flask import current_app, g, has_request_context, request
+from markupsafe import escape
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PLACEHOLDER = re.compile(r'%\(\w+\)s|\?|(?<![:\w]):\w+')
+PLACEHOLDER_LIST = re.compile(r'\?(?:\s*,\s*\?)+')
+
+
+def normalize(statement):
+    """The statement with its parameters and IN lists collapsed to '?'."""
+
+    statement = PLACEHOLDER.sub('?', ' '.join(statement.split()))
+    return PLACEHOLDER_LIST.sub('?', statement)
+
+
+class RequestProfile(object):
+    """The statements issued during one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = []   # (sql, seconds)
+
+    @property
+    def db_time(self):
+        return sum(seconds for sql, seconds in self.statements)
+
+    def repeated(self, threshold):
+        """Statements issued at least ``threshold`` times, most repeated first."""
+
+        groups = {}
+        for sql, seconds in self.statements:
+            group = groups.setdefault(normalize(sql), [0, 0.0])
+            group[0] += 1
+            group[1] += seconds
+        return sorted(({'statement': sql, 'count': count, 'ms': round(seconds * 1000, 3)}
+                       for sql, (count, seconds) in groups.items() if count >= threshold),
+                      key=lambda group: -group['count'])
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_profile' in g:
+        conn.info.setdefault('sql_profile_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('sql_profile_start')
+    if starts and has_request_context() and 'sql_profile' in g:
+        g.sql_profile.statements.append((statement, time.perf_counter() - starts.pop()))
+
+
+class SQLProfiler(object):
+    """Flask extension wiring the profiler into the request cycle."""
+
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.routes = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SQL_PROFILER', False)
+        app.config.setdefault('SQL_PROFILER_PANEL', False)
+        app.config.setdefault('SQL_PROFILER_PANEL_PARAM', app.debug)
+        app.config.setdefault('SQL_PROFILER_N_PLUS_ONE', 3)
+        app.extensions['sql_profiler'] = self
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+
+    def start_request(self):
+        if current_app.config['SQL_PROFILER']:
+            g.sql_profile = RequestProfile()
+
+    def finish_request(self, response):
+        profile = g.pop('sql_profile', None)
+        if profile is None:
+            return response
+        threshold = current_app.config['SQL_PROFILER_N_PLUS_ONE']
+        repeated = profile.repeated(threshold)
+        total = time.perf_counter() - profile.started
+        response.headers.add('Server-Timing',
+                             f'db;dur={profile.db_time * 1000:.2f};desc="{len(profile.statements)} queries"')
+        response.headers.add('Server-Timing', f'app;dur={total * 1000:.2f}')
+        self.record(profile, repeated)
+
+        # the panel shows raw SQL: ?sql_profile=1 only where allowed
+        config = current_app.config
+        show_panel = config['SQL_PROFILER_PANEL'] or (
+            config['SQL_PROFILER_PANEL_PARAM'] and request.args.get('sql_profile'))
+        if show_panel and response.mimetype == 'text/html' and not response.direct_passthrough:
+            html = response.get_data(as_text=True)
+            if '</body>' in html:
+                response.set_data(html.replace('</body>', panel(profile, repeated) + '</body>', 1))
+        return response
+
+    def record(self, profile, repeated):
+        rule = request.url_rule.rule if request.url_rule else request.path
+        key = f'{request.method} {rule}'
+        with self.lock:
+            route = self.routes.setdefault(key, {
+                'requests': 0, 'queries': 0, 'max_queries': 0, 'db_ms': 0.0,
+                'n_plus_one': {}})
+            route['requests'] += 1
+            route['queries'] += len(profile.statements)
+            route['max_queries'] = max(route['max_queries'], len(profile.statements))
+            route['db_ms'] += profile.db_time * 1000
+            for group in repeated:
+                seen = route['n_plus_one'].get(group['statement'], 0)
+                route['n_plus_one'][group['statement']] = max(seen, group['count'])
+
+    def report(self, top=20, timings=False):
+        """Routes ordered by their worst query count, then their worst repeat."""
+
+        with self.lock:
+            routes = []
+            for key, route in self.routes.items():
+                entry = {
+                    'route': key,
+                    'requests': route['requests'],
+                    'max_queries': route['max_queries'],
+                    'n_plus_one': [{'statement': sql, 'count': count}
+                                   for sql, count in sorted(route['n_plus_one'].items(),
+                                                            key=lambda item: (-item[1], item[0]))],
+                }
+                if timings:
+                    entry['db_ms_avg'] = round(route['db_ms'] / route['requests'], 3)
+                routes.append(entry)
+        routes.sort(key=lambda entry: (-entry['max_queries'],
+                                       -max([group['count'] for group in entry['n_plus_one']] or [0]),
+                                       entry['route']))
+        return routes[:top]
+
+    def reset(self):
+        with self.lock:
+            self.routes.clear()
+
+
+def panel(profile, repeated):
+    """Fixed-position HTML panel listing the request's statements."""
+
+    flagged = {group['statement'] for group in repeated}
+    rows = ''.join(
+        f'<tr style="color:{"#c00" if normalize(sql) in flagged else "inherit"}">'
+        f'<td>{seconds * 1000:.2f}ms</td><td><code>{escape(sql)}</code></td></tr>'
+        for sql, seconds in profile.statements)
+    return (
+        '<div id="sql-profiler" style="position:fixed;bottom:0;left:0;right:0;max-height:40%;'
+        'overflow:auto;background:#fff;border-top:2px solid #333;padding:8px;z-index:9999;font-size:12px">'
+        f'<strong>{len(profile.statements)} queries, {profile.db_time * 1000:.2f}ms</strong>'
+        f'{" &mdash; possible N+1 (red)" if repeated else ""}'
+        f'<table class="table table-condensed">{rows}</table></div>')
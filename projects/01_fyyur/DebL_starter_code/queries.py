@@ -0,0 +1,283 @@
+#----------------------------------------------------------------------------#
+# Read-side queries.
+#
+# Each function here answers one page's worth of data with a bounded number
+# of SQL statements, instead of looping over rows and querying per row.
+#----------------------------------------------------------------------------#
+
+import base64
+from datetime import datetime
+from itertools import groupby
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.orm import selectinload
+from models import db, Venue, Artist, Show
+from recommendations import recommended
+
+SHOWS_PER_PAGE = 30
+
+
+def upcoming_count(now):
+    """COUNT of shows starting at or after ``now``; use with an outer join to Show."""
+    return func.count(case([(Show.start_time >= now, Show.id)]))
+
+
+def show_column(model):
+    """The Show foreign key pointing at ``model`` (Venue or Artist)."""
+
+    return Show.venue_id if model is Venue else Show.artist_id
+
+
+def counterpart_ids(model, entity_id):
+    """Ids of the artists a venue has shows with, or the venues an artist has."""
+
+    column = Show.artist_id if model is Venue else Show.venue_id
+    return [row[0] for row in db.session.query(column)
+            .filter(show_column(model) == entity_id).distinct()]
+
+
+def show_counts(model, ids=None, now=None):
+    """Upcoming and past show counts for many venues or artists at once.
+
+    One GROUP BY over the Show table, whatever the number of ids. Ids with
+    no shows are reported as (0, 0).
+
+    Parameters
+    ----------
+    model : Venue or Artist
+    ids : iterable (int)
+        entity ids to count; None counts every entity that has shows
+
+    Returns
+    -------
+    counts : dict
+        ``{id: (upcoming, past)}``
+    """
+
+    now = now or datetime.utcnow()
+    fk = show_column(model)
+    query = db.session.query(fk, upcoming_count(now), func.count(Show.id)).group_by(fk)
+    counts = {}
+    if ids is not None:
+        ids = set(ids)
+        if not ids:
+            return counts
+        query = query.filter(fk.in_(ids))
+        counts = dict.fromkeys(ids, (0, 0))
+    for entity_id, upcoming, total in query:
+        counts[entity_id] = (upcoming, total - upcoming)
+    return counts
+
+
+def venue_areas():
+    """Venues grouped by city/state for the /venues directory.
+
+    One statement returns every venue with its upcoming show counter (see
+    counters.py), ordered so that each city/state area is a contiguous run
+    of rows.
+
+    Returns
+    -------
+    areas : list (dict)
+        ``[{"city", "state", "venues": [{"id", "name", "num_upcoming_shows"}]}]``
+    """
+
+    rows = db.session.query(
+            Venue.state, Venue.city, Venue.id, Venue.name,
+            func.coalesce(Venue.upcoming_shows, 0).label('num_upcoming_shows')) \
+        .order_by(Venue.state, Venue.city, Venue.name, Venue.id) \
+        .all()
+
+    areas = []
+    for (state, city), venues in groupby(rows, key=lambda row: (row.state, row.city)):
+        areas.append({
+            "city": city,
+            "state": state,
+            "venues": [{
+                "id": venue.id,
+                "name": venue.name,
+                "num_upcoming_shows": venue.num_upcoming_shows
+            } for venue in venues]
+        })
+    return areas
+
+
+def split_shows(shows, now, describe):
+    """Split ``shows`` into (upcoming, past) lists of ``describe(show)`` dicts.
+
+    Both lists are ordered by start time; ``now`` is captured once by the
+    caller so every show is compared against the same instant.
+    """
+
+    upcoming, past = [], []
+    for show in sorted(shows, key=lambda show: show.start_time):
+        (upcoming if show.start_time >= now else past).append(describe(show))
+    return upcoming, past
+
+
+def venue_detail(venue_id, now=None):
+    """Data for the venue detail page, or None if the venue does not exist.
+
+    Loads the venue, its shows and each show's artist in two statements,
+    and its recommended artists in a third.
+    """
+
+    now = now or datetime.utcnow()
+    venue = Venue.query \
+        .options(selectinload(Venue.shows).joinedload(Show.artist)) \
+        .filter(Venue.id == venue_id) \
+        .one_or_none()
+    if venue is None:
+        return None
+
+    upcoming, past = split_shows(venue.shows, now, lambda show: {
+        "artist_id": show.artist.id,
+        "artist_name": show.artist.name,
+        "artist_image_link": show.artist.image_link,
+        "start_time": show.start_time
+    })
+    return {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": venue.genres,
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website": venue.website_link,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+        "upcoming_shows": upcoming,
+        "upcoming_shows_count": len(upcoming),
+        "past_shows": past,
+        "past_shows_count": len(past),
+        "recommended_artists": recommended(Venue, venue.id),
+    }
+
+
+def artist_detail(artist_id, now=None):
+    """Data for the artist detail page, or None if the artist does not exist.
+
+    Loads the artist, their shows and each show's venue in two statements,
+    and their recommended venues in a third.
+    """
+
+    now = now or datetime.utcnow()
+    artist = Artist.query \
+        .options(selectinload(Artist.shows).joinedload(Show.venue)) \
+        .filter(Artist.id == artist_id) \
+        .one_or_none()
+    if artist is None:
+        return None
+
+    upcoming, past = split_shows(artist.shows, now, lambda show: {
+        "venue_id": show.venue.id,
+        "venue_name": show.venue.name,
+        "venue_image_link": show.venue.image_link,
+        "start_time": show.start_time
+    })
+    return {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": artist.genres,
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "facebook_link": artist.facebook_link,
+        "website_link": artist.website_link,
+        "image_link": artist.image_link,
+        "seeking_venue": artist.seeking_venue,
+        "seeking_description": artist.seeking_description,
+        "upcoming_shows": upcoming,
+        "upcoming_shows_count": len(upcoming),
+        "past_shows": past,
+        "past_shows_count": len(past),
+        "recommended_venues": recommended(Artist, artist.id),
+    }
+
+
+def encode_cursor(start_time, show_id):
+    """Opaque token for the position just after the show (start_time, id)."""
+
+    raw = f'{start_time.isoformat()}|{show_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverse of ``encode_cursor``; raises ValueError for a malformed token."""
+
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        start_time, show_id = raw.split('|')
+        return datetime.fromisoformat(start_time), int(show_id)
+    except ValueError:
+        raise ValueError(f'Invalid cursor {token!r}')
+
+
+def shows_page(when='all', start=None, end=None, cursor=None,
+               per_page=SHOWS_PER_PAGE, now=None):
+    """One page of the /shows listing in (start_time, id) order.
+
+    Uses keyset pagination: ``cursor`` is the ``next_cursor`` of the previous
+    page, and the page is read with a single joined query that seeks past it,
+    so every page costs the same however deep the listing goes.
+
+    Parameters
+    ----------
+    when : str
+        'upcoming', 'past' or 'all'
+    start, end : datetime
+        optional inclusive lower / exclusive upper bound on start_time
+    cursor : str
+        token returned as ``next_cursor`` by the previous page
+
+    Returns
+    -------
+    page : dict
+        ``{"shows": [...], "next_cursor": str or None}``
+    """
+
+    if when not in ('all', 'upcoming', 'past'):
+        raise ValueError(f'Unknown show filter {when!r}')
+    now = now or datetime.utcnow()
+    query = db.session.query(
+            Show.id, Show.start_time,
+            Venue.id.label('venue_id'), Venue.name.label('venue_name'),
+            Artist.id.label('artist_id'), Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link')) \
+        .join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id)
+
+    if when == 'upcoming':
+        query = query.filter(Show.start_time >= now)
+    elif when == 'past':
+        query = query.filter(Show.start_time < now)
+    if start is not None:
+        query = query.filter(Show.start_time >= start)
+    if end is not None:
+        query = query.filter(Show.start_time < end)
+    if cursor:
+        after_time, after_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Show.start_time > after_time,
+            and_(Show.start_time == after_time, Show.id > after_id)))
+
+    rows = query.order_by(Show.start_time, Show.id).limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1].start_time, rows[-1].id)
+
+    return {
+        "shows": [{
+            "id": row.id,
+            "venue_id": row.venue_id,
+            "venue_name": row.venue_name,
+            "artist_id": row.artist_id,
+            "artist_name": row.artist_name,
+            "artist_image_link": row.artist_image_link,
+            "start_time": row.start_time
+        } for row in rows],
+        "next_cursor": next_cursor
+    }
@@ -0,0 +1,205 @@
+#----------------------------------------------------------------------------#
+# Artist <-> venue recommendations.
+#
+# An artist seeking venues and a venue seeking talent are scored on how
+# much their genres overlap (Jaccard), where they are (same city, else same
+# state) and how often the artist has played the venue before. Candidates
+# are the counterparts in the same state plus those already played with,
+# so scoring one artist or venue reads a bounded slice of the other table.
+#
+# The Recommendation table keeps each artist's RECOMMENDATIONS_KEPT best
+# venues and each venue's best artists, and the detail pages read their
+# list with one range scan of ix_recommendation_artist or _venue. The
+# refresh_recommendations job rescores an artist or venue when it is
+# created, edited, imported or deleted, and an artist when one of their
+# shows starts (`flask fyyur roll-forward`). A rescored row also enters
+# the other side's lists where it now ranks, but a list it drops out of is
+# only refilled when that list's owner is rescored. `flask fyyur
+# refresh-recommendations` rebuilds the table.
+#----------------------------------------------------------------------------#
+
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import bindparam, func
+from models import db, Venue, Artist, Show, Recommendation
+from genres import GENRE_MEMBERS
+
+GENRE_WEIGHT, PLACE_WEIGHT, HISTORY_WEIGHT = 0.6, 0.25, 0.15
+SAME_STATE = 0.5        # share of PLACE_WEIGHT for the same state, another city
+HISTORY_SHOWS = 3       # past shows together that earn the full history score
+RECOMMENDATIONS_KEPT = 10
+RECOMMENDATIONS_SHOWN = 6
+
+Side = namedtuple('Side', 'other flag column show_column')
+SIDES = {
+    Artist: Side(Venue, 'seeking_venue', Recommendation.artist_id, Show.artist_id),
+    Venue: Side(Artist, 'seeking_talent', Recommendation.venue_id, Show.venue_id),
+}
+
+
+def genre_set(genres):
+    """Genres names in ``genres``, whichever spelling they are stored in."""
+
+    return {GENRE_MEMBERS[genre.lower()].name for genre in genres or ()
+            if genre.lower() in GENRE_MEMBERS}
+
+
+def match_score(genres, other_genres, same_city, same_state, past_shows):
+    """Score in [0, 1] for one artist/venue pair."""
+
+    union = genres | other_genres
+    overlap = len(genres & other_genres) / len(union) if union else 0
+    place = 1 if same_city else SAME_STATE if same_state else 0
+    history = min(past_shows, HISTORY_SHOWS) / HISTORY_SHOWS
+    return GENRE_WEIGHT * overlap + PLACE_WEIGHT * place + HISTORY_WEIGHT * history
+
+
+def score_candidates(model, entity, now=None):
+    """{counterpart id: (score, shared genres, past shows)} for a seeking ``entity``."""
+
+    side = SIDES[model]
+    other_model, other = side.other, SIDES[side.other]
+    now = now or datetime.utcnow()
+    history = dict(db.session.query(other.show_column, func.count())
+                   .filter(side.show_column == entity.id, Show.start_time < now)
+                   .group_by(other.show_column))
+    seeking = getattr(other_model, other.flag).is_(True)
+    columns = (other_model.id, other_model.city, other_model.state, other_model.genres)
+    rows = db.session.query(*columns).filter(other_model.state == entity.state, seeking).all()
+    nearby = {row.id for row in rows}
+    far = sorted(set(history) - nearby)
+    if far:
+        rows += db.session.query(*columns) \
+            .filter(other_model.id.in_(bindparam('ids', expanding=True)), seeking) \
+            .params(ids=far).all()
+
+    genres = genre_set(entity.genres)
+    scores = {}
+    for row in rows:
+        other_genres = genre_set(row.genres)
+        same_state = row.state == entity.state
+        score = match_score(genres, other_genres, same_state and row.city == entity.city,
+                            same_state, history.get(row.id, 0))
+        if score > 0:
+            scores[row.id] = (score, len(genres & other_genres), history.get(row.id, 0))
+    return scores
+
+
+def kept_thresholds(model, ids):
+    """Lowest kept score of each full list among ``model`` rows ``ids``."""
+
+    column = SIDES[model].column
+    rank = func.row_number().over(partition_by=column,
+                                  order_by=Recommendation.score.desc()).label('rank')
+    ranked = db.session.query(column.label('id'), Recommendation.score.label('score'), rank) \
+        .filter(column.in_(bindparam('ids', expanding=True))) \
+        .subquery()
+    query = db.session.query(ranked.c.id, ranked.c.score) \
+        .filter(ranked.c.rank == RECOMMENDATIONS_KEPT)
+    return dict(query.params(ids=list(ids))) if ids else {}
+
+
+def refresh_recommendations(model, entity_id, now=None):
+    """Rescore one artist or venue and rewrite its Recommendation rows.
+
+    Returns
+    -------
+    counterpart_ids : set (int)
+        the other side's rows whose lists gained or lost this one
+    """
+
+    side = SIDES[model]
+    other = SIDES[side.other]
+    entity = db.session.query(model.id, model.city, model.state, model.genres,
+                              getattr(model, side.flag).label('seeking')) \
+        .filter(model.id == entity_id).one_or_none()
+    previous = {other_id for other_id, in db.session.query(other.column)
+                .filter(side.column == entity_id)}
+    Recommendation.query.filter(side.column == entity_id).delete(synchronize_session=False)
+    if entity is None or not entity.seeking:
+        return previous
+
+    scores = score_candidates(model, entity, now)
+    ranked = sorted(scores, key=lambda other_id: (-scores[other_id][0], other_id))
+    kept = set(ranked[:RECOMMENDATIONS_KEPT])
+    # this one also enters the lists it beats the last kept match of
+    thresholds = kept_thresholds(side.other, ranked[RECOMMENDATIONS_KEPT:])
+    kept.update(other_id for other_id in ranked[RECOMMENDATIONS_KEPT:]
+                if scores[other_id][0] > thresholds.get(other_id, 0))
+
+    stamp = datetime.utcnow()
+    rows = [{
+        side.column.name: entity_id,
+        other.column.name: other_id,
+        'score': scores[other_id][0],
+        'shared_genres': scores[other_id][1],
+        'past_shows': scores[other_id][2],
+        'updated_at': stamp,
+    } for other_id in sorted(kept)]
+    if rows:
+        db.session.execute(Recommendation.__table__.insert(), rows)
+    return previous | kept
+
+
+def changed_since(since):
+    """(venue ids, artist ids) edited since ``since``, artists of new shows included."""
+
+    venue_ids = [i for i, in db.session.query(Venue.id).filter(Venue.updated_at >= since)]
+    artist_ids = {i for i, in db.session.query(Artist.id).filter(Artist.updated_at >= since)}
+    artist_ids.update(i for i, in db.session.query(Show.artist_id)
+                      .filter(Show.updated_at >= since).distinct())
+    return venue_ids, sorted(artist_ids)
+
+
+def artists_starting(start, end):
+    """Artists with a show starting in [start, end): their history changed."""
+
+    return [i for i, in db.session.query(Show.artist_id)
+            .filter(Show.start_time >= start, Show.start_time < end).distinct()]
+
+
+def rebuild_recommendations(batch_size=500):
+    """Recompute the whole table; returns the number of artists scored.
+
+    Scoring every seeking artist fills the venues' lists as well, since a
+    venue's best artists each beat its last kept match when scored.
+    """
+
+    Recommendation.query.delete(synchronize_session=False)
+    ids = [i for i, in db.session.query(Artist.id)
+           .filter(Artist.seeking_venue.is_(True)).order_by(Artist.id)]
+    for count, artist_id in enumerate(ids, 1):
+        refresh_recommendations(Artist, artist_id)
+        if count % batch_size == 0:
+            db.session.commit()
+    db.session.commit()
+    return len(ids)
+
+
+def recommended(model, entity_id, limit=RECOMMENDATIONS_SHOWN):
+    """Best matches for an artist (venues) or a venue (artists).
+
+    One range scan of the Recommendation index plus primary key lookups.
+
+    Returns
+    -------
+    matches : list (dict)
+        ``{"id", "name", "city", "state", "image_link", "score"}``
+    """
+
+    side = SIDES[model]
+    other_model, other = side.other, SIDES[side.other]
+    rows = db.session.query(other_model.id, other_model.name, other_model.city,
+                            other_model.state, other_model.image_link, Recommendation.score) \
+        .join(Recommendation, other.column == other_model.id) \
+        .filter(side.column == entity_id) \
+        .order_by(Recommendation.score.desc(), other.column.desc()) \
+        .limit(limit)
+    return [{
+        "id": row.id,
+        "name": row.name,
+        "city": row.city,
+        "state": row.state,
+        "image_link": row.image_link,
+        "score": row.score
+    } for row in rows]
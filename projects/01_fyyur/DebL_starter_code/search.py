@@ -0,0 +1,182 @@
+#----------------------------------------------------------------------------#
+# Venue and artist search.
+#
+# On Postgres, searches use the trigger-maintained `search_vector` tsvector
+# (name, genres, city and state; GIN indexed) plus a trigram index on name
+# for infix matches, and rank, page and count in one statement. Other
+# databases (SQLite in tests) use an in-process inverted index that is kept
+# current by mapper events.
+#----------------------------------------------------------------------------#
+
+import re
+from bisect import bisect_left
+from sqlalchemy import event, func, or_
+from models import db, Venue, Artist
+
+SEARCH_RESULTS_PER_PAGE = 20
+
+# ts_rank's default weights for the A (name), B (genres) and C (city/state) labels
+NAME_WEIGHT, GENRE_WEIGHT, PLACE_WEIGHT = 1.0, 0.4, 0.2
+
+
+def tokenize(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+def search(model, term, page=1, per_page=SEARCH_RESULTS_PER_PAGE):
+    """Ranked page of venues or artists matching ``term``.
+
+    Every word of ``term`` must prefix-match a word of the name, genres,
+    city or state, or ``term`` must appear within the name. An empty term
+    lists everything by name.
+
+    Returns
+    -------
+    results : dict
+        ``{"count", "page", "has_next", "data": [{"id", "name", "num_upcoming_shows"}]}``
+    """
+
+    page = max(page, 1)
+    offset = (page - 1) * per_page
+    if db.engine.dialect.name == 'postgresql':
+        count, data = search_postgres(model, term, offset, per_page)
+    else:
+        count, data = memory_indexes[model].search(term, offset, per_page)
+    return {
+        "count": count,
+        "page": page,
+        "has_next": offset + len(data) < count,
+        "data": data
+    }
+
+
+def search_postgres(model, term, offset, limit):
+    tokens = tokenize(term)
+    query = db.session.query(
+        model.id, model.name,
+        func.coalesce(model.upcoming_shows, 0).label('num_upcoming_shows'),
+        func.count().over().label('total'))
+    if tokens:
+        tsquery = func.to_tsquery('simple', ' & '.join(f'{token}:*' for token in tokens))
+        query = query \
+            .filter(or_(model.search_vector.op('@@')(tsquery),
+                        model.name.ilike(f'%{escape_like(term)}%', escape='\\'))) \
+            .order_by((func.ts_rank(model.search_vector, tsquery)
+                       + func.similarity(model.name, term)).desc())
+    rows = query.order_by(model.name, model.id).offset(offset).limit(limit).all()
+    count = rows[0].total if rows else 0
+    return count, [{
+        "id": row.id,
+        "name": row.name,
+        "num_upcoming_shows": row.num_upcoming_shows
+    } for row in rows]
+
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class MemoryIndex(object):
+    """In-process inverted index over one model's searchable columns.
+
+    Built from the table on first use, then updated row by row from the
+    after_insert/after_update/after_delete mapper events. Rows written with
+    Core bulk inserts bypass those events; call ``reset()`` afterwards.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.reset()
+
+    def reset(self):
+        self.names = None        # id -> name
+        self.tokens = {}         # id -> tokens indexed for it
+        self.postings = {}       # token -> {id: weight}
+        self.vocabulary = []     # sorted tokens, rebuilt lazily
+
+    def build(self):
+        self.names, self.tokens, self.postings = {}, {}, {}
+        rows = db.session.query(self.model.id, self.model.name, self.model.city,
+                                self.model.state, self.model.genres)
+        for row in rows:
+            self.add_row(*row)
+        self.vocabulary = sorted(self.postings)
+
+    def add_row(self, entity_id, name, city, state, genres):
+        self.names[entity_id] = name
+        self.tokens[entity_id] = set()
+        weighted = ((name, NAME_WEIGHT), (' '.join(genres or []), GENRE_WEIGHT),
+                    (f'{city} {state}', PLACE_WEIGHT))
+        for text, weight in weighted:
+            for token in tokenize(text):
+                ids = self.postings.setdefault(token, {})
+                ids[entity_id] = max(ids.get(entity_id, 0), weight)
+                self.tokens[entity_id].add(token)
+        self.vocabulary = None
+
+    def remove_row(self, entity_id):
+        if self.names is None or self.names.pop(entity_id, None) is None:
+            return
+        for token in self.tokens.pop(entity_id):
+            del self.postings[token][entity_id]
+            if not self.postings[token]:
+                del self.postings[token]
+        self.vocabulary = None
+
+    def sync(self, entity):
+        """Re-index ``entity`` after it was inserted or updated."""
+        if self.names is None:
+            return
+        self.remove_row(entity.id)
+        self.add_row(entity.id, entity.name, entity.city, entity.state, entity.genres)
+
+    def prefix_matches(self, token):
+        """{id: weight} for every indexed token starting with ``token``."""
+        matches = {}
+        i = bisect_left(self.vocabulary, token)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(token):
+            for entity_id, weight in self.postings[self.vocabulary[i]].items():
+                matches[entity_id] = max(matches.get(entity_id, 0), weight)
+            i += 1
+        return matches
+
+    def search(self, term, offset, limit):
+        if self.names is None:
+            self.build()
+        if self.vocabulary is None:
+            self.vocabulary = sorted(self.postings)
+
+        tokens = tokenize(term)
+        if tokens:
+            scores = None
+            for token in tokens:
+                matches = self.prefix_matches(token)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {i: scores[i] + w for i, w in matches.items() if i in scores}
+            needle = term.lower()
+            for entity_id, name in self.names.items():
+                if needle in name.lower():
+                    scores[entity_id] = scores.get(entity_id, 0) + NAME_WEIGHT
+        else:
+            scores = dict.fromkeys(self.names, 0)
+
+        ranked = sorted(scores, key=lambda i: (-scores[i], self.names[i], i))
+        page_ids = ranked[offset:offset + limit]
+        counts = dict(db.session.query(self.model.id, self.model.upcoming_shows)
+                      .filter(self.model.id.in_(page_ids))) if page_ids else {}
+        return len(ranked), [{
+            "id": entity_id,
+            "name": self.names[entity_id],
+            "num_upcoming_shows": counts.get(entity_id) or 0
+        } for entity_id in page_ids]
+
+
+memory_indexes = {Venue: MemoryIndex(Venue), Artist: MemoryIndex(Artist)}
+
+for _model, _index in memory_indexes.items():
+    event.listen(_model, 'after_insert', lambda mapper, conn, target, index=_index: index.sync(target))
+    event.listen(_model, 'after_update', lambda mapper, conn, target, index=_index: index.sync(target))
+    event.listen(_model, 'after_delete', lambda mapper, conn, target, index=_index: index.remove_row(target.id))
+    event.listen(_model.__table__, 'after_create', lambda *args, index=_index, **kw: index.reset())
@@ -0,0 +1,127 @@
+#----------------------------------------------------------------------------#
+# Show calendar: what's playing where, day by day.
+#
+# A calendar query is a range scan on Show.start_time. With a city/state it
+# goes through ix_venue_state_city and ix_show_venue_start; a genre goes
+# through the artist_genres links (see genres.py). Results
+# are capped per page, keyset-paged with the /shows cursor, and grouped
+# into UTC days.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+import dateutil.parser
+from sqlalchemy import and_, or_
+from models import db, Venue, Artist, Show
+from genres import genre_filter
+from queries import encode_cursor, decode_cursor
+
+CALENDAR_PAGE_SIZE = 100
+CALENDAR_MAX_PAGE_SIZE = 500
+CALENDAR_MAX_DAYS = 92
+CALENDAR_DEFAULT_DAYS = 7
+
+
+def parse_range(start=None, end=None, now=None):
+    """(start, end) datetimes from ?from= and ?to= values.
+
+    ``start`` defaults to today and ``end`` to CALENDAR_DEFAULT_DAYS later.
+    A bare date as ``end`` includes that whole day.
+    """
+
+    today = datetime.combine((now or datetime.utcnow()).date(), datetime.min.time())
+    start = utc(dateutil.parser.parse(start)) if start else today
+    if not end:
+        return start, start + timedelta(days=CALENDAR_DEFAULT_DAYS)
+    parsed = utc(dateutil.parser.parse(end))
+    if len(end.strip()) <= len('YYYY-MM-DD'):
+        parsed += timedelta(days=1)
+    return start, parsed
+
+
+def utc(value):
+    """Naive UTC, as Show.start_time is stored."""
+
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def calendar_query(start, end, city=None, state=None, genre=None, cursor=None):
+    """The calendar's shows in (start_time, id) order, without a limit."""
+
+    query = db.session.query(
+            Show.id, Show.start_time,
+            Venue.id.label('venue_id'), Venue.name.label('venue_name'),
+            Venue.city, Venue.state,
+            Artist.id.label('artist_id'), Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link')) \
+        .join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id) \
+        .filter(Show.start_time >= start, Show.start_time < end)
+    if state:
+        query = query.filter(Venue.state == state)
+    if city:
+        query = query.filter(Venue.city == city)
+    if genre:
+        query = query.filter(genre_filter(Artist, genre))
+    if cursor:
+        after_time, after_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Show.start_time > after_time,
+            and_(Show.start_time == after_time, Show.id > after_id)))
+    return query.order_by(Show.start_time, Show.id)
+
+
+def show_calendar(start, end, city=None, state=None, genre=None, cursor=None,
+                  per_page=CALENDAR_PAGE_SIZE):
+    """One page of shows starting in [start, end), grouped by day.
+
+    Parameters
+    ----------
+    start, end : datetime
+        UTC bounds of the calendar; at most CALENDAR_MAX_DAYS apart
+    city, state : str, optional
+        venue location, matched exactly
+    genre : str, optional
+        a Genres name or label, matched against the artist's genres
+    cursor : str, optional
+        ``next_cursor`` of the previous page
+
+    Returns
+    -------
+    page : dict
+        ``{"days": [{"date", "shows": [...]}], "next_cursor": str or None}``.
+        A day can continue on the next page.
+    """
+
+    if end <= start:
+        raise ValueError('The calendar must end after it starts')
+    if end - start > timedelta(days=CALENDAR_MAX_DAYS):
+        raise ValueError(f'The calendar can span at most {CALENDAR_MAX_DAYS} days')
+    if not 0 < per_page <= CALENDAR_MAX_PAGE_SIZE:
+        raise ValueError(f'per_page must be between 1 and {CALENDAR_MAX_PAGE_SIZE}')
+
+    rows = calendar_query(start, end, city, state, genre, cursor).limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1].start_time, rows[-1].id)
+
+    days = []
+    for day, shows in groupby(rows, key=lambda row: row.start_time.date()):
+        days.append({
+            "date": day,
+            "shows": [{
+                "id": row.id,
+                "venue_id": row.venue_id,
+                "venue_name": row.venue_name,
+                "city": row.city,
+                "state": row.state,
+                "artist_id": row.artist_id,
+                "artist_name": row.artist_name,
+                "artist_image_link": row.artist_image_link,
+                "start_time": row.start_time
+            } for row in shows]
+        })
+    return {"days": days, "next_cursor": next_cursor}
@@ -0,0 +1,763 @@
+import io
+import os
+import tempfile
+import unittest
+import json
+from datetime import datetime, timedelta
+
+import babel.dates
+from sqlalchemy import create_engine, event
+
+from app import app
+from models import db, Venue, Artist, Show
+from queries import shows_page, show_counts, venue_areas
+import counters
+from search import search
+from cache import page_cache, LRUCache
+from pool import TimedQueuePool, pool_options, pool_status
+from profiler import RequestProfile
+from importer import Importer, read_rows
+from jobs import job_queue
+from bookings import find_conflicts, audit_bookings
+from models import Job, venue_genres
+from genres import genre_cache, genre_filter
+from recommendations import recommended
+
+
+class QueryCounter(object):
+    """Counts the SQL statements issued while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+class FyyurTestCase(unittest.TestCase):
+    """This class represents the Fyyur test case"""
+
+    def setUp(self):
+        """Define test variables and initialize app."""
+        app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+            'FYYUR_TEST_DATABASE_URL', 'sqlite://')
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        app.config['JOB_QUEUE_THREAD'] = False
+        self.client = app.test_client
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.drop_all()
+        db.create_all()
+        page_cache.clear()
+
+        self.venue = Venue(name='The Musical Hop', city='San Francisco', state='CA',
+                           address='1015 Folsom Street', phone='123-123-1234',
+                           genres=['Jazz', 'Reggae'])
+        self.artist = Artist(name='Guns N Petals', city='San Francisco', state='CA',
+                             phone='326-123-5000', genres=['Rock n Roll'])
+        db.session.add_all([self.venue, self.artist])
+        db.session.commit()
+        self.venue_id, self.artist_id = self.venue.id, self.artist.id
+
+    def tearDown(self):
+        """Executed after reach test"""
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def add_shows(self, upcoming, past):
+        now = datetime.utcnow()
+        for i in range(upcoming):
+            db.session.add(Show(venue_id=self.venue.id, artist_id=self.artist.id,
+                                start_time=now + timedelta(days=i + 1)))
+        for i in range(past):
+            db.session.add(Show(venue_id=self.venue.id, artist_id=self.artist.id,
+                                start_time=now - timedelta(days=i + 1)))
+        db.session.commit()
+
+    def get_counting_queries(self, url):
+        with QueryCounter(db.engine) as counter:
+            res = self.client().get(url)
+        return res, counter.count
+
+    def test_venues_grouped_by_area_in_one_query(self):
+        seattle = Venue(name='Park Square', city='Seattle', state='WA', address='1 Pike St',
+                        phone='206-555-0100', genres=['Jazz'])
+        db.session.add(seattle)
+        db.session.commit()
+        self.add_shows(upcoming=2, past=1)
+        now = datetime.utcnow()
+        db.session.add_all([
+            Show(venue_id=seattle.id, artist_id=self.artist_id, start_time=now + timedelta(days=4)),
+            Show(venue_id=seattle.id, artist_id=self.artist_id, start_time=now - timedelta(days=4))])
+        db.session.commit()
+        counters.check_counters(fix=True)
+        genre_cache.warm()
+
+        with QueryCounter(db.engine) as counter:
+            areas = venue_areas()
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(areas, [
+            {'city': 'San Francisco', 'state': 'CA', 'venues': [
+                {'id': self.venue_id, 'name': 'The Musical Hop', 'num_upcoming_shows': 2}]},
+            {'city': 'Seattle', 'state': 'WA', 'venues': [
+                {'id': seattle.id, 'name': 'Park Square', 'num_upcoming_shows': 1}]}])
+
+        res, queries = self.get_counting_queries('/venues')
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'Seattle, WA', res.data)
+        self.assertIn(b'The Musical Hop', res.data)
+        self.assertEqual(queries, 1)
+
+    def test_show_venue(self):
+        self.add_shows(upcoming=2, past=3)
+        res, queries = self.get_counting_queries(f'/venues/{self.venue.id}')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'2 Upcoming Shows', res.data)
+        self.assertIn(b'3 Past Shows', res.data)
+        self.assertLessEqual(queries, 3)
+
+    def test_show_venue_query_count_does_not_grow_with_shows(self):
+        self.add_shows(upcoming=50, past=50)
+        for i in range(20):
+            other = Artist(name=f'Artist {i}', city='Oakland', state='CA',
+                           phone='326-123-5000', genres=['Jazz'])
+            db.session.add(other)
+            db.session.flush()
+            db.session.add(Show(venue_id=self.venue.id, artist_id=other.id,
+                                start_time=datetime.utcnow() + timedelta(days=i + 1)))
+        db.session.commit()
+        res, queries = self.get_counting_queries(f'/venues/{self.venue.id}')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'70 Upcoming Shows', res.data)
+        self.assertLessEqual(queries, 3)
+
+    def test_show_artist(self):
+        self.add_shows(upcoming=1, past=4)
+        res, queries = self.get_counting_queries(f'/artists/{self.artist.id}')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'1 Upcoming Show', res.data)
+        self.assertIn(b'4 Past Shows', res.data)
+        self.assertLessEqual(queries, 3)
+
+    def test_shows_pages_with_cursor(self):
+        self.add_shows(upcoming=40, past=25)
+        seen = []
+        page = shows_page(per_page=30)
+        seen.extend(page['shows'])
+        while page['next_cursor']:
+            with QueryCounter(db.engine) as counter:
+                page = shows_page(per_page=30, cursor=page['next_cursor'])
+            self.assertEqual(counter.count, 1)
+            seen.extend(page['shows'])
+
+        start_times = [show['start_time'] for show in seen]
+        self.assertEqual(len(seen), 65)
+        self.assertEqual(start_times, sorted(start_times))
+
+    def test_shows_filters_upcoming(self):
+        self.add_shows(upcoming=3, past=5)
+        page = shows_page(when='upcoming')
+
+        self.assertEqual(len(page['shows']), 3)
+        self.assertIsNone(page['next_cursor'])
+
+    def test_shows_next_link(self):
+        self.add_shows(upcoming=35, past=0)
+        res = self.client().get('/shows?when=upcoming')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'cursor=', res.data)
+        self.assertIn(b'when=upcoming', res.data)
+
+    def test_400_shows_bad_cursor(self):
+        res = self.client().get('/shows?cursor=not-a-cursor')
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_show_counts_in_one_query(self):
+        self.add_shows(upcoming=2, past=3)
+        with QueryCounter(db.engine) as counter:
+            counts = show_counts(Venue, [self.venue_id, 999])
+
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(counts, {self.venue_id: (2, 3), 999: (0, 0)})
+        self.assertEqual(show_counts(Artist), {self.artist_id: (2, 3)})
+
+    def test_create_show_updates_counters(self):
+        res = self.client().post('/shows/create', data={
+            'artist_id': self.artist_id, 'venue_id': self.venue_id,
+            'start_time': (datetime.utcnow() + timedelta(days=3)).strftime('%Y-%m-%d %H:%M:%S')})
+
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(job_queue.run_pending(), 1)
+        venue, artist = Venue.query.get(self.venue_id), Artist.query.get(self.artist_id)
+        self.assertEqual((venue.upcoming_shows, venue.past_shows), (1, 0))
+        self.assertEqual((artist.upcoming_shows, artist.past_shows), (1, 0))
+
+    def test_delete_venue_refreshes_artist_counters(self):
+        self.add_shows(upcoming=2, past=1)
+        counters.check_counters(fix=True)
+        res = self.client().post(f'/venues/{self.venue_id}')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(job_queue.run_pending(), 2)
+        artist = Artist.query.get(self.artist_id)
+        self.assertEqual((artist.upcoming_shows, artist.past_shows), (0, 0))
+
+    def test_roll_forward_moves_started_shows_to_past(self):
+        self.add_shows(upcoming=2, past=0)
+        counters.check_counters(fix=True)
+        later = datetime.utcnow() + timedelta(days=1, minutes=30)
+        counters.roll_forward(now=later)
+
+        venue = Venue.query.get(self.venue.id)
+        self.assertEqual((venue.upcoming_shows, venue.past_shows), (1, 1))
+        self.assertEqual(counters.check_counters(now=later),
+                         {'venues': [], 'artists': []})
+
+    def test_check_counters_reports_and_fixes_drift(self):
+        self.add_shows(upcoming=2, past=3)
+        report = counters.check_counters(fix=True)
+
+        self.assertEqual([row['id'] for row in report['venues']], [self.venue.id])
+        self.assertEqual(report['venues'][0]['expected_upcoming'], 2)
+        self.assertEqual(report['venues'][0]['expected_past'], 3)
+        self.assertEqual(counters.check_counters(), {'venues': [], 'artists': []})
+
+    def test_counter_commands_invalidate_listings(self):
+        self.client().get('/venues')
+        self.add_shows(upcoming=1, past=0)
+        self.assertEqual(self.get_counting_queries('/venues')[1], 0)
+
+        runner = app.test_cli_runner()
+        self.assertEqual(runner.invoke(args=['fyyur', 'check-counters', '--fix']).exit_code, 0)
+        self.assertEqual(self.get_counting_queries('/venues')[1], 1)
+
+        db.session.add(Show(venue_id=self.venue_id, artist_id=self.artist_id,
+                            start_time=datetime.utcnow() - timedelta(minutes=5)))
+        db.session.commit()
+        self.assertEqual(self.get_counting_queries('/venues')[1], 0)
+        res = runner.invoke(args=['fyyur', 'roll-forward'])
+        self.assertIn('Refreshed 1 venues', res.output)
+        self.assertEqual(self.get_counting_queries('/venues')[1], 1)
+
+    def test_search_venues_by_name_city_and_genre(self):
+        for term in ('hop', 'usical', 'san fran', 'jazz', 'musical hop'):
+            results = search(Venue, term)
+            self.assertEqual([venue['id'] for venue in results['data']], [self.venue_id], term)
+        self.assertEqual(search(Venue, 'blues')['count'], 0)
+
+    def test_search_ranks_name_matches_first(self):
+        db.session.add(Venue(name='Park Square', city='Hop Town', state='CA',
+                             address='1 Park Sq', phone='123-123-1234', genres=['Folk']))
+        db.session.commit()
+        results = search(Venue, 'hop')
+
+        self.assertEqual(results['count'], 2)
+        self.assertEqual(results['data'][0]['name'], 'The Musical Hop')
+
+    def test_search_index_follows_updates(self):
+        self.venue.name = 'The Dueling Pianos Bar'
+        db.session.commit()
+
+        self.assertEqual(search(Venue, 'hop')['count'], 0)
+        self.assertEqual(search(Venue, 'dueling')['count'], 1)
+
+    def test_search_pages_results(self):
+        for i in range(25):
+            db.session.add(Artist(name=f'Petals {i}', city='Oakland', state='CA',
+                                  phone='326-123-5000', genres=['Jazz']))
+        db.session.commit()
+        first, second = search(Artist, 'petals'), search(Artist, 'petals', page=2)
+
+        self.assertEqual(first['count'], 26)
+        self.assertTrue(first['has_next'])
+        self.assertEqual(len(second['data']), 6)
+        self.assertFalse(second['has_next'])
+
+    def test_search_artists_view(self):
+        res = self.client().post('/artists/search', data={'search_term': 'petals'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(f'/artists/{self.artist_id}'.encode(), res.data)
+
+    def test_venue_page_is_cached_until_edited(self):
+        self.add_shows(upcoming=1, past=0)
+        self.client().get(f'/venues/{self.venue_id}')
+        res, queries = self.get_counting_queries(f'/venues/{self.venue_id}')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(queries, 0)
+
+        self.client().post(f'/venues/{self.venue_id}/edit', data={
+            'name': 'The Dueling Pianos Bar', 'city': 'New York', 'state': 'NY',
+            'address': '335 Delancey Street', 'phone': '914-003-1132',
+            'genres': ['Classical'], 'image_link': '', 'facebook_link': '',
+            'website_link': ''})
+        res = self.client().get(f'/venues/{self.venue_id}')
+
+        self.assertIn(b'The Dueling Pianos Bar', res.data)
+
+    def test_genre_links_follow_edits(self):
+        self.client().get('/')
+        genre_cache.warm()
+        jazz = Venue.query.filter(genre_filter(Venue, 'jazz'))
+        self.assertEqual([venue.id for venue in jazz], [self.venue_id])
+
+        def edit_genres(genres):
+            with QueryCounter(db.engine) as counter:
+                self.client().post(f'/venues/{self.venue_id}/edit', data={
+                    'name': 'The Musical Hop', 'city': 'San Francisco', 'state': 'CA',
+                    'address': '1015 Folsom Street', 'phone': '123-123-1234',
+                    'genres': genres, 'image_link': '', 'facebook_link': '',
+                    'website_link': ''})
+            return counter.count
+
+        one = edit_genres(['Blues'])
+        five = edit_genres(['Classical', 'HipHop', 'Soul', 'Funk', 'Swing'])
+        links = db.session.query(venue_genres).filter_by(venue_id=self.venue_id)
+
+        # the links are rewritten in a fixed number of statements, with no
+        # lookup per genre
+        self.assertEqual(one, five)
+        self.assertEqual(links.count(), 5)
+        edit_genres(['Classical', 'HipHop', 'Soul'])
+        self.assertEqual(links.count(), 3)
+        self.assertEqual(jazz.count(), 0)
+        self.assertEqual(Venue.query.filter(genre_filter(Venue, 'Hip-Hop')).count(), 1)
+        with self.assertRaises(ValueError):
+            genre_filter(Venue, 'Polka')
+
+    def test_new_show_invalidates_artist_page(self):
+        self.client().get(f'/artists/{self.artist_id}')
+        self.client().post('/shows/create', data={
+            'artist_id': self.artist_id, 'venue_id': self.venue_id,
+            'start_time': (datetime.utcnow() + timedelta(days=3)).strftime('%Y-%m-%d %H:%M:%S')})
+        res = self.client().get(f'/artists/{self.artist_id}')
+
+        self.assertIn(b'1 Upcoming Show', res.data)
+
+    def test_lru_cache_evicts_and_expires(self):
+        cache = LRUCache(max_entries=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        cache.ttl = 0
+        cache.set('d', 4)
+        self.assertIsNone(cache.get('d'))
+        self.assertEqual(cache.stats(), {'hits': 2, 'misses': 2, 'evictions': 2,
+                                         'expirations': 1, 'entries': 1})
+
+    def test_datetime_filter_named_formats(self):
+        start = datetime(2019, 5, 21, 21, 30)
+        render = app.jinja_env.from_string("{{ start|datetime(format) }}").render
+
+        self.assertEqual(render(start=start, format='medium'), 'Tue 05, 21, 2019 9:30PM')
+        self.assertEqual(render(start='2019-05-21T21:30:00.000Z', format='full'),
+                         'Tuesday May, 21, 2019 at 9:30PM')
+        self.assertEqual(render(start=start, format='short'),
+                         babel.dates.format_datetime(start, 'short', locale='en'))
+        self.assertEqual(render(start=start, format='long'),
+                         babel.dates.format_datetime(start, 'long', locale='en'))
+        self.assertEqual(render(start=start, format='yyyy-MM-dd'), '2019-05-21')
+
+    def test_pool_options_share_connection_budget(self):
+        config = dict(app.config, DB_POOL_SIZE=10, DB_MAX_OVERFLOW=10,
+                      DB_MAX_CONNECTIONS=60, WEB_CONCURRENCY=8)
+        options = pool_options(config)
+
+        self.assertEqual((options['pool_size'], options['max_overflow']), (7, 0))
+        self.assertIn('statement_timeout', options['connect_args']['options'])
+
+    def test_pool_status_reports_checkouts(self):
+        engine = create_engine('sqlite://', poolclass=TimedQueuePool, pool_size=2)
+        with engine.connect() as conn:
+            conn.execute('select 1')
+            status = pool_status(engine)
+
+        self.assertEqual(status['in_use'], 1)
+        self.assertEqual(status['checkouts'], 1)
+        self.assertEqual(sum(status['wait_ms_histogram'].values()), 1)
+
+    def test_health(self):
+        self.client().get('/artists')
+        res = self.client().get('/health')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('pool', data['database'])
+        self.assertIn('misses', data['page_cache'])
+
+    def set_config(self, **settings):
+        for name, value in settings.items():
+            self.addCleanup(app.config.__setitem__, name, app.config[name])
+            app.config[name] = value
+
+    def test_profiler_adds_server_timing_and_flags_repeats(self):
+        self.set_config(SQL_PROFILER=True, SQL_PROFILER_PANEL_PARAM=False)
+        res = self.client().get('/venues?sql_profile=1')
+
+        self.assertIn('db;dur=', res.headers['Server-Timing'])
+        self.assertNotIn(b'id="sql-profiler"', res.data)
+        app.config['SQL_PROFILER_PANEL_PARAM'] = True
+        page_cache.clear()
+        res = self.client().get('/venues?sql_profile=1')
+        self.assertIn(b'id="sql-profiler"', res.data)
+        profile = RequestProfile()
+        profile.statements = [('SELECT * FROM "Show" WHERE venue_id = %(id)s', 0.001)] * 4
+        self.assertEqual(profile.repeated(3)[0]['count'], 4)
+        self.assertEqual(profile.repeated(5), [])
+
+    def test_profile_routes_report(self):
+        self.add_shows(upcoming=1, past=1)
+        self.set_config(SQL_PROFILER=False)
+        res = app.test_cli_runner().invoke(args=['fyyur', 'profile-routes'])
+        routes = {route['route']: route for route in json.loads(res.output)['routes']}
+        self.assertFalse(app.config['SQL_PROFILER'])
+
+        self.assertEqual(routes['GET /venues/<int:venue_id>']['max_queries'], 3)
+        self.assertEqual(routes['GET /venues']['n_plus_one'], [])
+
+    def test_import_venues_csv_reports_rejected_rows(self):
+        rows = ('name,city,state,address,phone,genres,seeking_talent\n'
+                'Park Square,Seattle,WA,1 Pike St,206-555-0100,"Jazz,Hip-Hop",yes\n'
+                'No Phone,Seattle,WA,2 Pike St,555,Jazz,no\n'
+                'Nowhere,Seattle,XX,3 Pike St,206-555-0101,Polka,no\n')
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(rows)
+        self.addCleanup(os.remove, f.name)
+        res = app.test_cli_runner().invoke(
+            args=['fyyur', 'import', 'venues', f.name])
+
+        self.assertEqual(res.exit_code, 0, res.output)
+        self.assertIn('Imported 1 of 3 venues', res.output)
+        self.assertIn('line 3: phone: Phone number not valid', res.output)
+        self.assertIn('line 4: state: Not a valid choice', res.output)
+        venue = Venue.query.filter_by(name='Park Square').one()
+        self.assertEqual(venue.genres, ['Jazz', 'HipHop'])
+        self.assertEqual(Venue.query.filter(genre_filter(Venue, 'Hip-Hop')).all(), [venue])
+        self.assertTrue(venue.seeking_talent)
+        self.assertEqual(search(Venue, 'park')['count'], 1)
+
+    def test_import_shows_jsonl_updates_counters(self):
+        tomorrow = (datetime.utcnow() + timedelta(days=1)).isoformat()
+        lines = [
+            json.dumps({'venue_id': self.venue_id, 'artist_id': self.artist_id,
+                        'start_time': tomorrow}),
+            json.dumps({'venue_id': 1000, 'artist_id': self.artist_id,
+                        'start_time': tomorrow}),
+            'not json',
+        ]
+        rejects = io.StringIO()
+        report = Importer('shows', batch_size=2, rejects=rejects).run(
+            read_rows(io.StringIO('\n'.join(lines)), 'jsonl'))
+
+        self.assertEqual((report['inserted'], report['rejected']), (1, 2))
+        self.assertAlmostEqual(report['rows_per_second'] * report['seconds'], 1)
+        self.assertEqual(Venue.query.get(self.venue_id).upcoming_shows, 1)
+        self.assertEqual(Artist.query.get(self.artist_id).upcoming_shows, 1)
+        rejected = [json.loads(line) for line in rejects.getvalue().splitlines()]
+        self.assertEqual(rejected[0]['errors'], {'venue_id': 'No such record'})
+        self.assertEqual(rejected[1]['line'], 3)
+
+    def test_export_streams_jsonl_since_id(self):
+        second = Venue(name='Park Square', city='Seattle', state='WA', address='1 Pike St',
+                       phone='206-555-0100', genres=['Jazz'])
+        db.session.add(second)
+        db.session.commit()
+        res = self.client().get(f'/export/venues?format=jsonl&since_id={self.venue_id}')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.is_streamed)
+        rows = [json.loads(line) for line in res.data.decode().splitlines()]
+        self.assertEqual([row['name'] for row in rows], ['Park Square'])
+        self.assertEqual(rows[0]['genres'], ['Jazz'])
+        self.assertNotIn('search_vector', rows[0])
+
+    def test_export_csv_since_timestamp(self):
+        self.add_shows(upcoming=2, past=0)
+        since = datetime.utcnow() + timedelta(minutes=1)
+        Venue.query.get(self.venue_id).name = 'The Musical Hop II'
+        db.session.commit()
+        res = self.client().get('/export/venues?since=' + since.isoformat())
+        self.assertEqual(res.data.decode().count('\n'), 1)
+
+        res = self.client().get('/export/shows')
+        lines = res.data.decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['id', 'start_time'])
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(self.client().get('/export/shows?format=xml').status_code, 400)
+        self.assertEqual(self.client().get('/export/venues?since=yesterday-ish').status_code, 400)
+        self.assertEqual(self.client().get('/export/venues?since_id=abc').status_code, 400)
+        self.assertEqual(self.client().get('/export/users').status_code, 404)
+
+    def test_api_venue_sparse_fields_in_one_query(self):
+        self.add_shows(upcoming=2, past=1)
+        counters.check_counters(fix=True)
+        res, count = self.get_counting_queries(
+            f'/api/v1/venues/{self.venue_id}?fields=id,name,num_upcoming_shows')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.get_json()['data'], {
+            'id': self.venue_id, 'name': 'The Musical Hop', 'num_upcoming_shows': 2})
+        self.assertEqual(count, 1)
+
+        res = self.client().get(f'/api/v1/artists/{self.artist_id}?fields=name,past_shows')
+        data = res.get_json()['data']
+        self.assertEqual(set(data), {'name', 'past_shows'})
+        self.assertEqual(data['past_shows'][0]['venue_id'], self.venue_id)
+        self.assertEqual(self.client().get('/api/v1/venues/1?fields=password').status_code, 400)
+        self.assertEqual(self.client().get('/api/v1/venues/1000').get_json()['error']['code'], 404)
+
+    def test_api_etag_answers_304_until_changed(self):
+        url = f'/api/v1/venues/{self.venue_id}'
+        res = self.client().get(url)
+        etag = res.headers['ETag']
+        self.assertFalse(etag.startswith('W/'))
+
+        res = self.client().get(url, headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+
+        Venue.query.get(self.venue_id).name = 'The Musical Hop II'
+        db.session.commit()
+        res = self.client().get(url, headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+
+    def test_api_listings_page(self):
+        self.add_shows(upcoming=3, past=0)
+        db.session.add(Venue(name='Park Square', city='Seattle', state='WA',
+                             address='1 Pike St', phone='206-555-0100', genres=['Jazz']))
+        db.session.commit()
+        data = self.client().get('/api/v1/venues?limit=1&fields=id').get_json()
+        self.assertEqual(data['data'], [{'id': self.venue_id}])
+
+        data = self.client().get(f"/api/v1/venues?after_id={data['next_after_id']}").get_json()
+        self.assertEqual([venue['name'] for venue in data['data']], ['Park Square'])
+        self.assertIsNone(data['next_after_id'])
+
+        data = self.client().get('/api/v1/shows?when=upcoming&limit=2').get_json()
+        self.assertEqual(len(data['data']), 2)
+        data = self.client().get(f"/api/v1/shows?cursor={data['next_cursor']}&fields=id").get_json()
+        show_id = data['data'][0]['id']
+        show = self.client().get(f'/api/v1/shows/{show_id}').get_json()['data']
+        self.assertEqual(show['venue_name'], 'The Musical Hop')
+
+    def test_browse_counts_facets_and_follows_changes(self):
+        db.session.add_all([
+            Venue(name='Park Square', city='Seattle', state='WA', address='1 Pike St',
+                  phone='206-555-0100', genres=['Jazz', 'Folk'], seeking_talent=False),
+            Venue(name='Pier 70', city='San Francisco', state='CA', address='70 Pier',
+                  phone='415-555-0100', genres=['Folk'], seeking_talent=True)])
+        db.session.commit()
+        data = self.client().get('/api/v1/venues/browse?genres=Jazz&state=CA&fields=id,name').get_json()
+
+        self.assertEqual(data['data'], [{'id': self.venue_id, 'name': 'The Musical Hop'}])
+        self.assertEqual(data['count'], 1)
+        # a facet's counts ignore its own filter
+        self.assertEqual(data['facets']['genres'][:2], [
+            {'value': 'Folk', 'label': 'Folk', 'count': 1},
+            {'value': 'Jazz', 'label': 'Jazz', 'count': 1}])
+        self.assertEqual(data['facets']['state'], [{'value': 'CA', 'count': 1},
+                                                   {'value': 'WA', 'count': 1}])
+        self.assertEqual(data['facets']['city'], [{'value': 'San Francisco', 'count': 1}])
+
+        Venue.query.filter_by(name='Pier 70').one().genres = ['Jazz']
+        db.session.delete(Venue.query.filter_by(name='Park Square').one())
+        db.session.commit()
+        data = self.client().get('/api/v1/venues/browse?genres=jazz&seeking_talent=yes&limit=1').get_json()
+
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([venue['id'] for venue in data['data']], [self.venue_id])
+        self.assertEqual(data['next_after_id'], self.venue_id)
+        self.assertEqual(data['facets']['genres'][0], {'value': 'Jazz', 'label': 'Jazz', 'count': 2})
+        self.assertEqual(self.client().get('/api/v1/venues/browse?genres=Polka').status_code, 400)
+        self.assertEqual(self.client().get('/api/v1/artists/browse?seeking_venue=maybe').status_code, 400)
+
+    def test_recommendations_match_seeking_artists_and_venues(self):
+        cellar = Venue(name='Rock Cellar', city='San Francisco', state='CA', address='1 Market St',
+                       phone='415-555-0100', genres=['Rock n Roll'])
+        db.session.add_all([cellar,
+            Venue(name='Closed Doors', city='San Francisco', state='CA', address='2 Market St',
+                  phone='415-555-0101', genres=['Rock n Roll'], seeking_talent=False),
+            Venue(name='Far Away', city='Seattle', state='WA', address='1 Pike St',
+                  phone='206-555-0100', genres=['Rock n Roll'])])
+        db.session.commit()
+        job_queue.enqueue('refresh_recommendations', {'artist_ids': [self.artist_id]})
+        db.session.commit()
+        job_queue.run_pending()
+
+        # genres and city beat city alone; other states and venues not seeking are left out
+        self.assertEqual([venue['name'] for venue in recommended(Artist, self.artist_id)],
+                         ['Rock Cellar', 'The Musical Hop'])
+        self.assertEqual([artist['id'] for artist in recommended(Venue, cellar.id)],
+                         [self.artist_id])
+        self.assertIn(b'Recommended Venues', self.client().get(f'/artists/{self.artist_id}').data)
+
+        Artist.query.get(self.artist_id).seeking_venue = False
+        job_queue.enqueue('refresh_recommendations', {'artist_ids': [self.artist_id]})
+        db.session.commit()
+        job_queue.run_pending()
+        self.assertEqual(recommended(Venue, cellar.id), [])
+        self.assertNotIn(b'Recommended Venues', self.client().get(f'/artists/{self.artist_id}').data)
+
+    def test_job_retries_with_backoff_then_fails(self):
+        calls = []
+
+        @job_queue.task('flaky')
+        def flaky(fail_times):
+            calls.append(1)
+            if len(calls) <= fail_times:
+                raise RuntimeError('boom')
+
+        job = job_queue.enqueue('flaky', {'fail_times': 1}, key='flaky-1', max_attempts=2)
+        db.session.commit()
+        self.assertIs(job_queue.enqueue('flaky', {'fail_times': 1}, key='flaky-1'), job)
+        job_id = job.id
+
+        self.assertEqual(job_queue.run_pending(), 1)
+        job = Job.query.get(job_id)
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('boom', job.last_error)
+        self.assertGreater(job.run_at, datetime.utcnow())
+        self.assertEqual(job_queue.run_pending(), 0)
+
+        self.assertEqual(job_queue.run_pending(now=job.run_at + timedelta(seconds=1)), 1)
+        status = self.client().get(f'/api/v1/jobs/{job_id}').get_json()['data']
+        self.assertEqual((status['status'], status['attempts']), ('done', 2))
+        self.assertEqual(self.client().get('/api/v1/jobs').get_json()['data'], {'done': 1})
+
+        job = job_queue.enqueue('flaky', {'fail_times': 5}, max_attempts=1)
+        db.session.commit()
+        job_queue.run_pending()
+        self.assertEqual(Job.query.get(job.id).status, 'failed')
+
+    def test_recreated_venue_is_queued_again_and_old_jobs_pruned(self):
+        def create_venue(name):
+            self.client().post('/venues/create', data={
+                'name': name, 'city': 'Seattle', 'state': 'WA', 'address': '1 Pike St',
+                'phone': '206-555-0100', 'genres': ['Jazz'], 'facebook_link': ''})
+            return Venue.query.filter_by(name=name).one().id
+
+        first_id = create_venue('Park Square')
+        self.client().post(f'/venues/{first_id}')
+        self.assertEqual(job_queue.run_pending(), 3)
+        # SQLite may hand the deleted venue's id to the next one
+        second_id = create_venue('Corner Club')
+
+        queued = Job.query.filter_by(status='queued').one()
+        self.assertEqual(queued.payload, {'venue_ids': [second_id]})
+        later = datetime.utcnow() + timedelta(days=31)
+        self.assertEqual(job_queue.prune(timedelta(days=30), now=later), 3)
+        self.assertEqual(Job.query.all(), [queued])
+
+    def test_calendar_buckets_shows_by_day(self):
+        other = Venue(name='Park Square', city='Seattle', state='WA', address='1 Pike St',
+                      phone='206-555-0100', genres=['Jazz'])
+        db.session.add(other)
+        db.session.flush()
+        day = datetime.combine(datetime.utcnow().date(), datetime.min.time()) + timedelta(days=2)
+        for venue_id, hours in ((self.venue_id, 20), (self.venue_id, 44),
+                                (self.venue_id, 46), (other.id, 21)):
+            db.session.add(Show(venue_id=venue_id, artist_id=self.artist_id,
+                                start_time=day + timedelta(hours=hours)))
+        db.session.commit()
+        url = (f'/api/v1/calendar?from={day:%Y-%m-%d}&to={day + timedelta(days=1):%Y-%m-%d}'
+               '&city=San Francisco&state=CA&genre=Rock n Roll')
+        data = self.client().get(url).get_json()
+
+        self.assertEqual([(bucket['date'], len(bucket['shows'])) for bucket in data['data']],
+                         [((day + timedelta(days=0)).date().isoformat(), 1),
+                          ((day + timedelta(days=1)).date().isoformat(), 2)])
+        self.assertIsNone(data['next_cursor'])
+
+        data = self.client().get(url + '&limit=2').get_json()
+        self.assertEqual(sum(len(bucket['shows']) for bucket in data['data']), 2)
+        data = self.client().get(url + f"&limit=2&cursor={data['next_cursor']}").get_json()
+        self.assertEqual(data['data'][0]['shows'][0]['start_time'],
+                         (day + timedelta(hours=46)).isoformat())
+        self.assertEqual(self.client().get(url.replace('Rock n Roll', 'Jazz')).get_json()['data'], [])
+
+    def test_calendar_page(self):
+        self.add_shows(upcoming=2, past=0)
+        res = self.client().get('/shows/calendar?state=CA')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'Guns N Petals', res.data)
+        self.assertEqual(self.client().get('/shows/calendar?from=2020-01-01&to=2021-01-01').status_code, 400)
+        self.assertEqual(self.client().get('/shows/calendar?genre=Polka').status_code, 400)
+
+    def test_create_show_rejects_double_booking(self):
+        start = datetime.utcnow().replace(microsecond=0) + timedelta(days=3)
+        db.session.add(Show(venue_id=self.venue_id, artist_id=self.artist_id,
+                            start_time=start, duration_minutes=120))
+        db.session.commit()
+        res = self.client().post('/shows/create', data={
+            'artist_id': self.artist_id, 'venue_id': self.venue_id, 'duration': 60,
+            'start_time': (start + timedelta(minutes=90)).strftime('%Y-%m-%d %H:%M:%S')})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'Venue and artist already booked: Guns N Petals at The Musical Hop', res.data)
+        self.assertEqual(Show.query.count(), 1)
+
+        res = self.client().post('/shows/create', data={
+            'artist_id': self.artist_id, 'venue_id': self.venue_id, 'duration': 60,
+            'start_time': (start + timedelta(minutes=120)).strftime('%Y-%m-%d %H:%M:%S')})
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(Show.query.count(), 2)
+
+    def test_audit_bookings_finds_overlaps(self):
+        other = Venue(name='Park Square', city='Seattle', state='WA', address='1 Pike St',
+                      phone='206-555-0100', genres=['Jazz'])
+        db.session.add(other)
+        db.session.flush()
+        start = datetime(2030, 1, 1, 20)
+        shows = [Show(venue_id=self.venue_id, artist_id=self.artist_id, start_time=start,
+                      duration_minutes=240),
+                 Show(venue_id=self.venue_id, artist_id=self.artist_id,
+                      start_time=start + timedelta(hours=1), duration_minutes=30),
+                 Show(venue_id=other.id, artist_id=self.artist_id,
+                      start_time=start + timedelta(hours=3), duration_minutes=60)]
+        db.session.add_all(shows)
+        db.session.commit()
+        ids = [show.id for show in shows]
+
+        report = audit_bookings()
+        self.assertEqual(report['venues'], [{'id': self.venue_id, 'shows': ids[:2]}])
+        self.assertEqual([overlap['shows'] for overlap in report['artists']],
+                         [[ids[0], ids[1]], [ids[0], ids[2]]])
+        conflicts = find_conflicts(other.id, 999, start + timedelta(hours=3, minutes=30), 30)
+        self.assertEqual([(c['id'], c['booked']) for c in conflicts], [(ids[2], ['venue'])])
+
+    def test_404_show_missing_venue(self):
+        res = self.client().get('/venues/1000')
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_404_show_missing_artist(self):
+        res = self.client().get('/artists/1000')
+
+        self.assertEqual(res.status_code, 404)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""Benchmark bulk question import.
+
+Writes a JSONL file of synthetic questions (with some duplicate and
+invalid rows) into an already filled bank, then times `flask trivia
+import`'s importer on it and reports the throughput.
+
+    python benchmarks/bench_import.py --rows 200000 --bank 100000
+    python benchmarks/bench_import.py --database-url postgresql://localhost/trivia_bench
+
+The tables are dropped and recreated, so point --database-url at a scratch
+database.
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from common import DEFAULT_DATABASE_URL, CATEGORIES, db, seed_questions, setup_app, question_text
+from flaskr.ingest import QuestionImporter, read_records
+
+
+def write_rows(path, n_rows, rng):
+  previous = None
+  with open(path, 'w') as out:
+    for i in range(n_rows):
+      row = {
+        'question': f'{question_text(rng)} ({i})',
+        'answer': f'Answer {i}',
+        'category': rng.choice(CATEGORIES) if rng.random() < 0.5 else rng.randint(1, len(CATEGORIES)),
+        'difficulty': rng.randint(1, 5),
+      }
+      roll = rng.random()
+      if roll < 0.02:
+        row['difficulty'] = 7
+      elif roll < 0.05 and previous:
+        # the same question in other case and punctuation
+        row['question'] = previous.upper().rstrip('?')
+      previous = row['question']
+      out.write(json.dumps(row) + '\n')
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+  parser.add_argument('--rows', type=int, default=200000)
+  parser.add_argument('--bank', type=int, default=100000)
+  parser.add_argument('--batch-size', type=int, default=5000)
+  args = parser.parse_args()
+
+  ctx = setup_app(args.database_url)
+  seed_questions(args.bank)
+  path = os.path.join(tempfile.gettempdir(), 'trivia_import_bench.jsonl')
+  write_rows(path, args.rows, random.Random(3))
+
+  start = time.perf_counter()
+  with open(path) as lines:
+    report = QuestionImporter(args.batch_size).run(read_records(lines, 'jsonl'))
+  elapsed = time.perf_counter() - start
+  print(f"{report['accepted']} accepted, {report['duplicates']} duplicates, "
+        f"{report['rejected']} rejected into a bank of {args.bank}")
+  print(f'import: {elapsed:.2f} s, {args.rows / elapsed:.0f} rows/s')
+  os.remove(path)
+  db.session.remove()
+  ctx.pop()
+
+
+if __name__ == '__main__':
+  main()
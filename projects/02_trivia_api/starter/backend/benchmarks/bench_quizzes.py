@@ -0,0 +1,88 @@
+"""Benchmark random quiz questions over a large synthetic bank.
+
+Fills the questions table, builds the quiz index, then times draws from
+server-side sessions (short quizzes and one long one) against the naive
+alternatives: ORDER BY random() with NOT IN (previous_questions), and
+loading the category's ids to choose from in Python.
+
+    python benchmarks/bench_quizzes.py --questions 1000000
+    python benchmarks/bench_quizzes.py --database-url postgresql://localhost/trivia_bench
+
+The tables are dropped and recreated, so point --database-url at a scratch
+database.
+"""
+
+import argparse
+import random
+import time
+
+from sqlalchemy import func
+
+from common import DEFAULT_DATABASE_URL, CATEGORIES, db, report, seed_questions, setup_app, Question
+from flaskr.quiz import quiz_index, quiz_sessions, category_key
+
+
+def order_by_random(category, previous):
+  query = Question.query.filter(Question.category == category)
+  if previous:
+    query = query.filter(~Question.id.in_(previous))
+  return query.order_by(func.random()).first()
+
+
+def load_and_filter(category, previous):
+  previous = set(previous)
+  ids = [i for i, in db.session.query(Question.id).filter(Question.category == category)
+         if i not in previous]
+  return Question.query.get(random.choice(ids)) if ids else None
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+  parser.add_argument('--questions', type=int, default=1000000)
+  parser.add_argument('--quizzes', type=int, default=200)
+  parser.add_argument('--long-quiz', type=int, default=5000)
+  parser.add_argument('--naive-draws', type=int, default=20)
+  args = parser.parse_args()
+
+  ctx = setup_app(args.database_url)
+  start = time.perf_counter()
+  seed_questions(args.questions)
+  print(f'seed: {time.perf_counter() - start:.1f} s for {args.questions} questions')
+
+  start = time.perf_counter()
+  quiz_index.refresh()
+  print(f'index build: {(time.perf_counter() - start) * 1000:.0f} ms')
+
+  samples = []
+  for _ in range(args.quizzes):
+    session = quiz_sessions.start(category_key(random.randint(0, len(CATEGORIES))))
+    for _ in range(5):
+      start = time.perf_counter()
+      quiz_index.next_question(session)
+      samples.append(time.perf_counter() - start)
+    db.session.expunge_all()
+  report('session, 5-question quizzes', samples)
+
+  samples, session = [], quiz_sessions.start(category_key(1))
+  for _ in range(args.long_quiz):
+    start = time.perf_counter()
+    quiz_index.next_question(session)
+    samples.append(time.perf_counter() - start)
+  db.session.expunge_all()
+  report(f'session, one {args.long_quiz}-question quiz', samples)
+  previous = sorted(session.seen)
+
+  for label, draw in (('ORDER BY random()', order_by_random), ('load ids and filter', load_and_filter)):
+    samples = []
+    for _ in range(args.naive_draws):
+      start = time.perf_counter()
+      draw('1', previous)
+      samples.append(time.perf_counter() - start)
+    report(f'{label}, {len(previous)} previous questions', samples)
+  db.session.remove()
+  ctx.pop()
+
+
+if __name__ == '__main__':
+  main()
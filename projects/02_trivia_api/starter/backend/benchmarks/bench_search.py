@@ -0,0 +1,85 @@
+"""Benchmark question search against ILIKE across bank sizes.
+
+For each bank size, fills the questions table, then times the first page
+and total of search_questions (the in-process index on SQLite, tsvector +
+GIN on Postgres) and of the ILIKE scan it replaces: one ILIKE '%word%' per
+search word, ordered by id, with a count(*) for the total.
+
+    python benchmarks/bench_search.py --sizes 10000,100000,1000000
+    python benchmarks/bench_search.py --database-url postgresql://localhost/trivia_bench
+
+The tables (and, on Postgres, ix_questions_search) are dropped and
+recreated, so point --database-url at a scratch database.
+"""
+
+import argparse
+import random
+import time
+
+from sqlalchemy import and_, func
+
+from common import DEFAULT_DATABASE_URL, db, report, seed_questions, setup_app, Question, \
+  common_word, rare_word
+from flaskr.search import search_questions, memory_index
+
+
+def search_terms(rng, n):
+  # a common word and a rarer one, the second cut to a prefix half the time
+  terms = []
+  for _ in range(n):
+    rare = rare_word(rng)
+    if rng.random() < 0.5:
+      rare = rare[:max(3, len(rare) - 2)]
+    terms.append(f'{common_word(rng)} {rare}')
+  return terms
+
+
+def ilike_search(term, per_page=10):
+  condition = and_(*[Question.question.ilike(f'%{word}%') for word in term.split()])
+  questions = Question.query.filter(condition).order_by(Question.id).limit(per_page).all()
+  total = db.session.query(func.count(Question.id)).filter(condition).scalar()
+  return questions, total
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+  parser.add_argument('--sizes', default='10000,100000,1000000')
+  parser.add_argument('--searches', type=int, default=200)
+  parser.add_argument('--ilike-searches', type=int, default=20)
+  args = parser.parse_args()
+
+  ctx = setup_app(args.database_url)
+  for size in map(int, args.sizes.split(',')):
+    seed_questions(size)
+    # the Core bulk insert bypassed the mapper events
+    memory_index.reset()
+    rng = random.Random(size)
+    print(f'{size} questions')
+
+    start = time.perf_counter()
+    search_questions('warm up')
+    print(f'  first search (builds the in-process index off Postgres): '
+          f'{(time.perf_counter() - start) * 1000:.0f} ms')
+
+    samples = []
+    for term in search_terms(rng, args.searches):
+      start = time.perf_counter()
+      search_questions(term)
+      samples.append(time.perf_counter() - start)
+      db.session.expunge_all()
+    report('  search_questions', samples, 'searches')
+
+    samples = []
+    for term in search_terms(rng, args.ilike_searches):
+      start = time.perf_counter()
+      ilike_search(term)
+      samples.append(time.perf_counter() - start)
+      db.session.expunge_all()
+    report('  ILIKE', samples, 'searches')
+  db.session.remove()
+  ctx.pop()
+
+
+if __name__ == '__main__':
+  main()
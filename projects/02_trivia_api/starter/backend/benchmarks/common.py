@@ -0,0 +1,87 @@
+"""Shared helpers for the trivia benchmarks.
+
+The benchmarks run against ``TRIVIA_BENCH_DATABASE_URL`` (or
+``--database-url``) and default to a SQLite file in the temp directory.
+Point them at a scratch Postgres database to get numbers that match
+production; the tables are dropped and recreated on every run.
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+
+from models import db, setup_db, Question, Category  # noqa: E402
+
+CATEGORIES = ['Science', 'Art', 'Geography', 'History', 'Entertainment', 'Sports']
+DEFAULT_DATABASE_URL = os.environ.get(
+  'TRIVIA_BENCH_DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'trivia_bench.db'))
+
+
+def vocabulary(n, seed=11):
+  rng = random.Random(seed)
+  words = set()
+  while len(words) < n:
+    words.add(''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(4, 10))))
+  return sorted(words)
+
+
+# question text is drawn from a few common words and many rarer ones
+WORDS = ['what', 'which', 'who', 'the', 'of', 'in', 'is', 'was', 'first', 'largest'] + vocabulary(50000)
+
+
+def setup_app(database_url=DEFAULT_DATABASE_URL):
+  """A pushed app context bound to ``database_url``; pop it when done."""
+
+  app = Flask(__name__)
+  setup_db(app, database_url)
+  ctx = app.app_context()
+  ctx.push()
+  return ctx
+
+
+def common_word(rng):
+  return rng.choice(WORDS[:10])
+
+
+def rare_word(rng):
+  # log-uniform rank: a Zipf-like spread from frequent to once-in-the-bank words
+  return WORDS[9 + int((len(WORDS) - 10) ** rng.random())]
+
+
+def question_text(rng):
+  words = [common_word(rng) for _ in range(3)] + [rare_word(rng) for _ in range(rng.randint(3, 9))]
+  rng.shuffle(words)
+  return ' '.join(words).capitalize() + '?'
+
+
+def seed_questions(n_questions, batch_size=50000, seed=7):
+  """Recreate the tables and bulk insert ``n_questions`` synthetic questions."""
+
+  db.drop_all()
+  db.create_all()
+  db.session.execute(Category.__table__.insert(), [{'type': name} for name in CATEGORIES])
+  rng = random.Random(seed)
+  for start in range(0, n_questions, batch_size):
+    db.session.execute(Question.__table__.insert(), [{
+      'question': question_text(rng),
+      'answer': f'Answer {i}',
+      'category': str(rng.randint(1, len(CATEGORIES))),
+      'difficulty': rng.randint(1, 5),
+    } for i in range(start, min(n_questions, start + batch_size))])
+  db.session.commit()
+
+
+def percentile(samples, fraction):
+  samples = sorted(samples)
+  return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def report(label, samples, unit='draws'):
+  print(f'{label}: p50 {statistics.median(samples) * 1000:.3f} ms, '
+        f'p95 {percentile(samples, 0.95) * 1000:.3f} ms over {len(samples)} {unit}')
@@ -5,6 +5,11 @@ from flask_cors import CORS
 import random
 
 from models import setup_db, Question, Category
+from .listing import question_listing, category_map, decode_cursor, CATEGORIES_MAX_AGE
+from .quiz import quiz_index, quiz_sessions, category_key, QuizSession
+from .search import search_questions
+from .ingest import QuestionImporter, read_records, decode_lines, import_format, IMPORT_FORMATS
+from .commands import trivia_cli
 
 QUESTIONS_PER_PAGE = 10
 
@@ -12,6 +17,7 @@ def create_app(test_config=None):
   # create and configure the app
   app = Flask(__name__)
   setup_db(app)
+  app.cli.add_command(trivia_cli)
   
   '''
   @TODO: Set up CORS. Allow '*' for origins. Delete the sample route after completing the TODOs
@@ -22,24 +28,58 @@ def create_app(test_config=None):
   '''
 
   '''
-  @TODO: 
-  Create an endpoint to handle GET requests 
-  for all available categories.
-  '''
-
-
-  '''
-  @TODO: 
-  Create an endpoint to handle GET requests for questions, 
-  including pagination (every 10 questions). 
-  This endpoint should return a list of questions, 
-  number of total questions, current category, categories. 
-
-  TEST: At this point, when you start the application
-  you should see questions and categories generated,
-  ten questions per page and pagination at the bottom of the screen for three pages.
-  Clicking on the page numbers should update the questions. 
-  '''
+  GET /categories
+      {id: type} of every category. The map rarely changes, so it carries an
+      ETag and may be cached for CATEGORIES_MAX_AGE seconds.
+  '''
+  @app.route('/categories')
+  def get_categories():
+    response = jsonify({
+      'success': True,
+      'categories': category_map.get()
+    })
+    response.set_etag(category_map.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = CATEGORIES_MAX_AGE
+    return response.make_conditional(request)
+
+  '''
+  GET /questions?page=N or /questions?cursor=C
+      QUESTIONS_PER_PAGE questions in id order, the total count and
+      next_cursor, the cursor of the following page (null on the last one).
+      Page-number requests also include the categories map; cursor clients
+      fetch it once from /categories. See listing.py for how either is read
+      without OFFSET.
+  '''
+  @app.route('/questions')
+  def get_questions():
+    page = None
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+      try:
+        after_id = decode_cursor(cursor)
+      except ValueError:
+        abort(400)
+    else:
+      page = request.args.get('page', 1, type=int)
+      if page < 1:
+        abort(400)
+      after_id = question_listing.page_after_id(page, QUESTIONS_PER_PAGE)
+      if after_id is None:
+        abort(404)
+
+    questions, next_cursor = question_listing.page(after_id, QUESTIONS_PER_PAGE, page)
+    body = {
+      'success': True,
+      'questions': [question.format() for question in questions],
+      'total_questions': question_listing.total(),
+      'current_category': None,
+      'next_cursor': next_cursor
+    }
+    if page is not None:
+      body['page'] = page
+      body['categories'] = category_map.get()
+    return jsonify(body)
 
   '''
   @TODO: 
@@ -61,15 +101,52 @@ def create_app(test_config=None):
   '''
 
   '''
-  @TODO: 
-  Create a POST endpoint to get questions based on a search term. 
-  It should return any questions for whom the search term 
-  is a substring of the question. 
-
-  TEST: Search by any phrase. The questions list will update to include 
-  only question that include that string within their question. 
-  Try using the word "title" to start. 
-  '''
+  POST /questions {"searchTerm": ..., "category": <id>, "page": N}
+      A page of the questions whose words start with every word of
+      searchTerm, best match first, optionally within one category.
+      See search.py.
+  '''
+  @app.route('/questions', methods=['POST'])
+  def search():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or 'searchTerm' not in body:
+      abort(400)
+    term, category, page = body['searchTerm'], body.get('category'), body.get('page', 1)
+    if not isinstance(term, str) or type(page) is not int or page < 1 or \
+        not isinstance(category, (int, str, type(None))):
+      abort(422)
+
+    category = None if category in (None, '', 0, '0') else str(category)
+    results = search_questions(term, category, page, QUESTIONS_PER_PAGE)
+    return jsonify({
+      'success': True,
+      'questions': [question.format() for question in results['questions']],
+      'total_questions': results['total'],
+      'current_category': category,
+      'page': page
+    })
+
+  '''
+  POST /questions/import?format=jsonl|csv
+      Bulk import: the request body, or an uploaded "file", holds one
+      question per JSONL line or CSV row (question, answer, category,
+      difficulty). Returns the counts of accepted, duplicate and rejected
+      rows and the first rejections. See ingest.py.
+  '''
+  @app.route('/questions/import', methods=['POST'])
+  def import_questions():
+    upload = request.files.get('file')
+    file_format = request.args.get('format') or import_format(upload and upload.filename)
+    if file_format not in IMPORT_FORMATS:
+      abort(422)
+    lines = decode_lines(upload.stream if upload else request.stream)
+    try:
+      report = QuestionImporter().run(read_records(lines, file_format))
+    except ValueError:
+      # a CSV header without the fields, or a body that is not UTF-8
+      abort(422)
+
+    return jsonify(dict(report, success=True))
 
   '''
   @TODO: 
@@ -82,23 +159,81 @@ def create_app(test_config=None):
 
 
   '''
-  @TODO: 
-  Create a POST endpoint to get questions to play the quiz. 
-  This endpoint should take category and previous question parameters 
-  and return a random questions within the given category, 
-  if provided, and that is not one of the previous questions. 
-
-  TEST: In the "Play" tab, after a user selects "All" or a category,
-  one question at a time is displayed, the user is allowed to answer
-  and shown whether they were correct or not. 
-  '''
+  POST /quizzes
+      {"quiz_category": {"id": <category id, 0 for all>, "type": ...},
+       "previous_questions": [<question id>, ...], "quiz_token": <token>}
+      A random question of the category that this quiz has not asked yet
+      (null once none is left). The first request of a quiz, without
+      previous_questions, starts a session holding a shuffled deck of the
+      category's questions and returns its quiz_token; later requests send
+      the token and get the next question of the deck. Requests with
+      previous_questions and no token are answered statelessly, as before
+      sessions, and so are requests whose token this process does not know
+      (another worker's, evicted or expired) if they still carry
+      quiz_category or previous_questions; their quiz_token is null. A
+      bare unknown token is a 404. See quiz.py.
+  '''
+  @app.route('/quizzes', methods=['POST'])
+  def play_quiz():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+      abort(400)
+    quiz_category = body.get('quiz_category') or {}
+    previous_questions = body.get('previous_questions') or []
+    token = body.get('quiz_token')
+    if not isinstance(quiz_category, dict) or not isinstance(previous_questions, list) or \
+        not all(type(question_id) is int for question_id in previous_questions):
+      abort(422)
+
+    category = category_key(quiz_category.get('id'))
+    session = quiz_sessions.get(token) if token is not None else None
+    if session is None and (token is not None or previous_questions):
+      # no session here to continue: answer from what the request carries
+      if not previous_questions and 'quiz_category' not in body:
+        abort(404)
+      session, token = QuizSession(category, previous_questions, deck_size=1), None
+    elif session is None:
+      session = quiz_sessions.start(category)
+      token = session.token
+
+    question = quiz_index.next_question(session)
+    return jsonify({
+      'success': True,
+      'question': question.format() if question else None,
+      'quiz_token': token
+    })
+
+  '''
+  Errors are returned as JSON:
+      {"success": false, "error": <status code>, "message": <reason>}
+  '''
+  def error_response(error, message):
+    return jsonify({
+      'success': False,
+      'error': error,
+      'message': message
+    }), error
+
+  @app.errorhandler(400)
+  def bad_request(error):
+    return error_response(400, 'bad request')
+
+  @app.errorhandler(404)
+  def not_found(error):
+    return error_response(404, 'resource not found')
+
+  @app.errorhandler(405)
+  def method_not_allowed(error):
+    return error_response(405, 'method not allowed')
+
+  @app.errorhandler(422)
+  def unprocessable(error):
+    return error_response(422, 'unprocessable')
+
+  @app.errorhandler(500)
+  def server_error(error):
+    return error_response(500, 'internal server error')
 
-  '''
-  @TODO: 
-  Create error handlers for all expected errors 
-  including 404 and 422. 
-  '''
-  
   return app
 
     
\ No newline at end of file
@@ -0,0 +1,40 @@
+'''
+`flask trivia ...` maintenance commands (FLASK_APP=flaskr).
+'''
+
+import json
+
+import click
+from flask.cli import AppGroup
+
+from .ingest import QuestionImporter, read_records, import_format, IMPORT_FORMATS, IMPORT_BATCH_SIZE
+
+trivia_cli = AppGroup('trivia', help='Trivia question bank maintenance.')
+
+
+@trivia_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(IMPORT_FORMATS),
+              help='Defaults to csv for .csv files and jsonl otherwise.')
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True,
+              help='Rows per transaction.')
+@click.option('--rejects', type=click.File('w'),
+              help='Write the rejected records, with the reason, to this JSONL file.')
+def import_questions(path, file_format, batch_size, rejects):
+  '''Import questions from a JSONL or CSV file.'''
+
+  def on_reject(number, record, reason):
+    rejects.write(json.dumps({'line': number, 'reason': reason, 'record': record}) + '\n')
+
+  importer = QuestionImporter(batch_size, on_reject=on_reject if rejects else None)
+  with open(path, encoding='utf-8', newline='') as lines:
+    try:
+      report = importer.run(read_records(lines, file_format or import_format(path)))
+    except ValueError as e:
+      raise click.ClickException(str(e))
+
+  for reject in report['rejects'][:10]:
+    click.echo(f"line {reject['line']}: {reject['reason']}", err=True)
+  rate = report['accepted'] / report['seconds'] if report['seconds'] else 0
+  click.echo(f"{report['accepted']} accepted, {report['duplicates']} duplicates, "
+             f"{report['rejected']} rejected in {report['seconds']:.1f}s ({rate:.0f} questions/s)")
@@ -0,0 +1,191 @@
+'''
+Bulk question import from JSONL or CSV (POST /questions/import and
+`flask trivia import`).
+
+Each record needs question, answer, category (an id or its type, such as
+"Science") and difficulty (1 to 5). Valid rows whose normalized text (the
+lowercased words, without punctuation) is already in the bank or earlier
+in the file are counted as duplicates; the bank's texts are read once per
+import for that. The rest are written IMPORT_BATCH_SIZE rows per
+transaction, with multi-row INSERTs of ROWS_PER_STATEMENT rows, so a
+failure keeps the batches already committed.
+
+Core inserts bypass the Question mapper events, so the listing count and
+the in-process search index are reset afterwards; the quiz pools pick the
+new ids up from max(id).
+'''
+
+import codecs
+import csv
+import hashlib
+import json
+import os
+import time
+
+from models import db, Question, Category
+from .listing import question_listing
+from .search import memory_index, tokenize
+
+IMPORT_FORMATS = ('jsonl', 'csv')
+IMPORT_BATCH_SIZE = 5000
+ROWS_PER_STATEMENT = 200
+REPORTED_REJECTS = 100
+DIFFICULTIES = range(1, 6)
+FIELDS = ('question', 'answer', 'category', 'difficulty')
+
+
+def import_format(filename):
+  '''
+  import_format(filename)
+      'csv' for .csv files, 'jsonl' otherwise
+  '''
+  return 'csv' if os.path.splitext(filename or '')[1].lower() == '.csv' else 'jsonl'
+
+
+def text_key(text):
+  normalized = ' '.join(tokenize(text))
+  return hashlib.blake2b(normalized.encode(), digest_size=16).digest()
+
+
+def read_records(lines, file_format):
+  '''
+  read_records(lines, file_format)
+      (line number, record, parse error) for each record of an iterable of
+      text lines; raises ValueError if a CSV header lacks a field
+  '''
+  if file_format == 'csv':
+    reader = csv.DictReader(lines)
+    missing = set(FIELDS) - set(reader.fieldnames or ())
+    if missing:
+      raise ValueError('CSV header lacks ' + ', '.join(sorted(missing)))
+    for record in reader:
+      yield reader.line_num, record, None
+    return
+
+  for number, line in enumerate(lines, 1):
+    if not line.strip():
+      continue
+    try:
+      record = json.loads(line)
+    except ValueError:
+      yield number, None, 'invalid JSON'
+      continue
+    if isinstance(record, dict):
+      yield number, record, None
+    else:
+      yield number, None, 'not a JSON object'
+
+
+def decode_lines(stream):
+  '''
+  decode_lines(stream)
+      the UTF-8 text lines of a binary stream, such as an upload
+  '''
+  return codecs.iterdecode(stream, 'utf-8')
+
+
+class QuestionImporter(object):
+  '''
+  Validates, deduplicates and writes question records; see run().
+
+  on_reject, if given, is called with (line number, record, reason) for
+  every rejected record.
+  '''
+
+  def __init__(self, batch_size=IMPORT_BATCH_SIZE, on_reject=None):
+    self.batch_size = batch_size
+    self.on_reject = on_reject
+    self.categories = {}
+    self.accepted, self.duplicates, self.rejected = 0, 0, 0
+    self.rejects = []
+
+  def load_categories(self):
+    for category in Category.query:
+      self.categories[str(category.id)] = str(category.id)
+      if category.type:
+        self.categories[category.type.strip().lower()] = str(category.id)
+
+  def clean(self, record):
+    '''
+    clean(record)
+        the row to insert; raises ValueError with the reason if invalid
+    '''
+    row = {}
+    for field in ('question', 'answer'):
+      value = record.get(field)
+      if not isinstance(value, str) or not value.strip():
+        raise ValueError(f'{field} is required')
+      row[field] = value.strip()
+
+    category = record.get('category')
+    if isinstance(category, bool) or not isinstance(category, (int, str)):
+      raise ValueError('category must be a category id or type')
+    row['category'] = self.categories.get(str(category).strip().lower())
+    if row['category'] is None:
+      raise ValueError(f'unknown category {category!r}')
+
+    difficulty = record.get('difficulty')
+    if isinstance(difficulty, str) and difficulty.strip().isdigit():
+      difficulty = int(difficulty)
+    if type(difficulty) is not int or difficulty not in DIFFICULTIES:
+      raise ValueError(f'difficulty must be {DIFFICULTIES.start} to {DIFFICULTIES.stop - 1}')
+    row['difficulty'] = difficulty
+    return row
+
+  def reject(self, number, record, reason):
+    self.rejected += 1
+    if len(self.rejects) < REPORTED_REJECTS:
+      self.rejects.append({'line': number, 'reason': reason})
+    if self.on_reject is not None:
+      self.on_reject(number, record, reason)
+
+  def write(self, batch):
+    for start in range(0, len(batch), ROWS_PER_STATEMENT):
+      db.session.execute(Question.__table__.insert().values(batch[start:start + ROWS_PER_STATEMENT]))
+    db.session.commit()
+    self.accepted += len(batch)
+
+  def run(self, records):
+    '''
+    run(records)
+        import the records of read_records(); returns the report
+        {"accepted", "duplicates", "rejected", "rejects": [{"line",
+        "reason"}] (the first REPORTED_REJECTS), "seconds"}
+    '''
+    started = time.perf_counter()
+    self.load_categories()
+    seen = {text_key(text) for text, in db.session.query(Question.question).yield_per(10000)}
+    batch = []
+    try:
+      for number, record, error in records:
+        if error is not None:
+          self.reject(number, record, error)
+          continue
+        try:
+          row = self.clean(record)
+        except ValueError as e:
+          self.reject(number, record, str(e))
+          continue
+        key = text_key(row['question'])
+        if key in seen:
+          self.duplicates += 1
+          continue
+        seen.add(key)
+        batch.append(row)
+        if len(batch) >= self.batch_size:
+          self.write(batch)
+          batch = []
+      if batch:
+        self.write(batch)
+    finally:
+      db.session.rollback()
+      question_listing.reset()
+      memory_index.reset()
+
+    return {
+      'accepted': self.accepted,
+      'duplicates': self.duplicates,
+      'rejected': self.rejected,
+      'rejects': self.rejects,
+      'seconds': round(time.perf_counter() - started, 3)
+    }
@@ -0,0 +1,164 @@
+'''
+Question listing by page number or keyset cursor.
+
+OFFSET n makes the database walk n rows, so deep pages get slower as the
+bank grows. Every page here is read with WHERE id > :after_id ORDER BY id
+LIMIT n instead. A cursor carries that after_id. A page number is turned
+into one through the anchors, the id at each row position found so far:
+the next page's anchor comes free with every page, and any other page is
+reached from the nearest anchor (or from the end of the table), so only
+the rows between them are skipped.
+
+The anchors and the question count are kept per process. Inserts and
+deletes made here patch them; they are reloaded every LISTING_TTL_SECONDS
+so that other workers' writes show up.
+'''
+
+import base64
+import binascii
+import hashlib
+import json
+import threading
+import time
+
+from sqlalchemy import event, func
+
+from models import db, Question, Category
+
+LISTING_TTL_SECONDS = 30
+CATEGORIES_MAX_AGE = 3600
+
+
+def encode_cursor(after_id):
+  payload = json.dumps({'after': after_id}, separators=(',', ':')).encode()
+  return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+  '''
+  decode_cursor(cursor)
+      the after_id of a cursor made by encode_cursor; ValueError otherwise
+  '''
+  try:
+    payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    after_id = json.loads(payload.decode())['after']
+  except (binascii.Error, ValueError, KeyError, TypeError):
+    raise ValueError('invalid cursor')
+  if type(after_id) is not int or after_id < 0:
+    raise ValueError('invalid cursor')
+  return after_id
+
+
+class QuestionListing(object):
+
+  def __init__(self):
+    # flushes (and so the mapper events below) can run inside a query
+    self.lock = threading.RLock()
+    self.reset()
+
+  def reset(self):
+    with self.lock:
+      self.count = None
+      self.anchors = {}        # row position (from 0) -> Question.id there
+      self.loaded = 0
+
+  def refresh(self):
+    if self.count is None or time.monotonic() - self.loaded > LISTING_TTL_SECONDS:
+      self.count = db.session.query(func.count(Question.id)).scalar()
+      self.anchors = {}
+      self.loaded = time.monotonic()
+
+  def total(self):
+    with self.lock:
+      self.refresh()
+      return self.count
+
+  def page_after_id(self, page, per_page):
+    '''
+    page_after_id(page, per_page)
+        the id that page ``page`` starts after, None past the last page
+    '''
+    position = (page - 1) * per_page - 1
+    with self.lock:
+      self.refresh()
+      if position < 0:
+        return 0
+      if position >= self.count - 1:
+        return None
+      if position not in self.anchors:
+        after_id = self.seek(position)
+        if after_id is None:
+          return None
+        self.anchors[position] = after_id
+      return self.anchors[position]
+
+  def seek(self, position):
+    # forwards from the anchor below, backwards from the one above or the end
+    below = max((p for p in self.anchors if p < position), default=-1)
+    above = min((p for p in self.anchors if p > position), default=None)
+    query = db.session.query(Question.id)
+    if above is not None and above - position < position - below:
+      query = query.filter(Question.id < self.anchors[above]) \
+        .order_by(Question.id.desc()).offset(above - position - 1)
+    elif self.count - 1 - position < position - below:
+      query = query.order_by(Question.id.desc()).offset(self.count - 1 - position)
+    else:
+      query = query.filter(Question.id > self.anchors.get(below, 0)) \
+        .order_by(Question.id).offset(position - below - 1)
+    return query.limit(1).scalar()
+
+  def page(self, after_id, per_page, page=None):
+    '''
+    page(after_id, per_page, page=None)
+        the questions after ``after_id`` and the cursor of the next page
+        (None on the last one); a page number records the next page's anchor
+    '''
+    questions = Question.query.filter(Question.id > after_id) \
+      .order_by(Question.id).limit(per_page + 1).all()
+    if len(questions) <= per_page:
+      return questions, None
+    last_id = questions[per_page - 1].id
+    if page is not None:
+      with self.lock:
+        self.anchors[page * per_page - 1] = last_id
+    return questions[:per_page], encode_cursor(last_id)
+
+  def changed(self, question_id, delta):
+    # anchors at or past the row moved by one position
+    with self.lock:
+      if self.count is not None:
+        self.count += delta
+      self.anchors = {p: i for p, i in self.anchors.items() if i < question_id}
+
+
+class CategoryMap(object):
+  '''
+  {id: type} of every category, with an ETag so that clients can keep it
+  for the whole session
+  '''
+
+  def __init__(self):
+    self.reset()
+
+  def reset(self):
+    self.types, self.etag, self.loaded = None, None, 0
+
+  def get(self):
+    if self.types is None or time.monotonic() - self.loaded > LISTING_TTL_SECONDS:
+      types = {str(category.id): category.type
+               for category in Category.query.order_by(Category.id)}
+      encoded = json.dumps(types, sort_keys=True).encode()
+      self.types, self.etag = types, hashlib.sha1(encoded).hexdigest()
+      self.loaded = time.monotonic()
+    return self.types
+
+
+question_listing = QuestionListing()
+category_map = CategoryMap()
+
+event.listen(Question, 'after_insert', lambda mapper, conn, target: question_listing.changed(target.id, 1))
+event.listen(Question, 'after_delete', lambda mapper, conn, target: question_listing.changed(target.id, -1))
+event.listen(Question.__table__, 'after_create', lambda *args, **kw: question_listing.reset())
+for _event in ('after_insert', 'after_update', 'after_delete'):
+  event.listen(Category, _event, lambda *args: category_map.reset())
+event.listen(Category.__table__, 'after_create', lambda *args, **kw: category_map.reset())
@@ -0,0 +1,263 @@
+'''
+Random quiz questions without replacement.
+
+Each process keeps the question ids of every category (and of all of
+them) in an IdPool: an array of ids plus the set of those since deleted.
+A quiz session draws from its pool with a lazy Fisher-Yates shuffle: it
+remembers how many positions it has drawn and the few it swapped, so each
+draw is a randrange and a couple of dict lookups, whatever the size of
+the bank or the length of the quiz. Deleted ids are skipped (the pool is
+compacted once half of it is dead) and new ids join the undrawn part.
+
+Question inserts, deletes and category changes made in this process patch
+the pools through mapper events. Rows added by other processes are read in
+when max(id) moves; rows they deleted or moved are found when drawn, and
+everything is rebuilt every QUIZ_REBUILD_SECONDS.
+
+A session deals itself a deck of QUIZ_DECK_SIZE ids from that shuffle
+when the quiz starts and whenever the deck runs out, so most requests just
+pop the next id without touching the pools. Dealing in decks rather than
+shuffling the whole category keeps starting a quiz, and each session's
+memory, independent of the size of the bank. Sessions are kept in an LRU
+store of at most QUIZ_SESSIONS_MAX, each for QUIZ_SESSION_SECONDS after
+its last question, and are found by their token.
+'''
+
+import random
+import secrets
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from sqlalchemy import event, func, inspect, select
+
+from models import db, Question
+
+QUIZ_REBUILD_SECONDS = 900
+QUIZ_SESSION_SECONDS = 3600
+QUIZ_SESSIONS_MAX = 10000
+QUIZ_DECK_SIZE = 10
+ALL_CATEGORIES = None
+
+
+def category_key(category):
+  '''
+  category_key(category)
+      the pool key of a quiz_category id; 0, '0' and None mean all categories
+  '''
+  if category in (None, '', 0, '0'):
+    return ALL_CATEGORIES
+  return str(category)
+
+
+class IdPool(object):
+
+  def __init__(self, ids=()):
+    self.ids = ids if isinstance(ids, array) else array('q', ids)
+    self.dead = set()
+    # bumped whenever positions change, so that sessions reshuffle
+    self.version = 0
+
+  def __len__(self):
+    return len(self.ids) - len(self.dead)
+
+  def add(self, question_id):
+    # a revived id keeps its position, so sessions already past it skip it
+    if question_id in self.dead:
+      self.dead.discard(question_id)
+    else:
+      self.ids.append(question_id)
+
+  def discard(self, question_id):
+    self.dead.add(question_id)
+    if len(self.dead) * 2 > len(self.ids):
+      self.ids = array('q', (i for i in self.ids if i not in self.dead))
+      self.dead = set()
+      self.version += 1
+
+
+class QuizSession(object):
+
+  def __init__(self, category, seen=(), deck_size=QUIZ_DECK_SIZE):
+    self.token = secrets.token_urlsafe(16)
+    self.category = category
+    self.seen = set(seen)
+    self.deck = []           # dealt ids, next one last
+    self.deck_size = deck_size
+    self.version = None
+    self.drawn = 0           # positions [0, drawn) are used up
+    self.swaps = {}          # position -> position it now holds
+    self.last_used = time.monotonic()
+
+  def draw(self, pool):
+    '''
+    draw(pool)
+        a random id of ``pool`` not drawn before, None once all are
+    '''
+    if self.version != pool.version:
+      # positions moved: start the shuffle over and skip what was seen
+      self.version, self.drawn, self.swaps = pool.version, 0, {}
+    ids, swaps = pool.ids, self.swaps
+    while self.drawn < len(ids):
+      j = random.randrange(self.drawn, len(ids))
+      picked = swaps.get(j, j)
+      swaps[j] = swaps.pop(self.drawn, self.drawn)
+      self.drawn += 1
+      question_id = ids[picked]
+      if question_id not in pool.dead and question_id not in self.seen:
+        self.seen.add(question_id)
+        return question_id
+    return None
+
+  def deal(self, pool):
+    for _ in range(self.deck_size):
+      question_id = self.draw(pool)
+      if question_id is None:
+        break
+      self.deck.append(question_id)
+    self.deck.reverse()
+
+
+class QuizIndex(object):
+
+  def __init__(self):
+    self.lock = threading.RLock()
+    self.reset()
+
+  def reset(self):
+    with self.lock:
+      self.pools = None
+      self.max_id = 0
+      self.built = 0
+
+  def refresh(self):
+    if self.pools is None or time.monotonic() - self.built > QUIZ_REBUILD_SECONDS:
+      self.build()
+      return
+    max_id = db.session.query(func.max(Question.id)).scalar() or 0
+    if max_id > self.max_id:
+      rows = db.session.query(Question.id, Question.category) \
+        .filter(Question.id > self.max_id).order_by(Question.id)
+      for question_id, category in rows:
+        self.add(question_id, category)
+
+  def build(self):
+    versions = {key: pool.version for key, pool in (self.pools or {}).items()}
+    ids, keys = {ALL_CATEGORIES: array('q')}, {}
+    every = ids[ALL_CATEGORIES]
+    rows = db.session.execute(select([Question.id, Question.category]).order_by(Question.id))
+    for question_id, category in rows:
+      key = keys.get(category)
+      if key is None:
+        key = keys[category] = category_key(category)
+        ids.setdefault(key, array('q'))
+      every.append(question_id)
+      ids[key].append(question_id)
+    self.pools = {key: IdPool(key_ids) for key, key_ids in ids.items()}
+    for key, pool in self.pools.items():
+      pool.version = versions.get(key, -1) + 1
+    self.max_id = every[-1] if every else 0
+    self.built = time.monotonic()
+
+  def add(self, question_id, category):
+    with self.lock:
+      every = self.pools and self.pools[ALL_CATEGORIES]
+      # ids at or below max_id are already in, unless deleted and reused (SQLite)
+      if every is None or question_id <= self.max_id and question_id not in every.dead:
+        return
+      every.add(question_id)
+      self.pools.setdefault(category_key(category), IdPool()).add(question_id)
+      self.max_id = max(self.max_id, question_id)
+
+  def discard(self, question_id, category):
+    with self.lock:
+      if self.pools is None:
+        return
+      for key in {ALL_CATEGORIES, category_key(category)}:
+        if key in self.pools:
+          self.pools[key].discard(question_id)
+
+  def move(self, question_id, old_category, category):
+    with self.lock:
+      if self.pools is None or category_key(old_category) == category_key(category):
+        return
+      if category_key(old_category) in self.pools:
+        self.pools[category_key(old_category)].discard(question_id)
+      self.pools.setdefault(category_key(category), IdPool()).add(question_id)
+
+  def next_question(self, session):
+    '''
+    next_question(session)
+        the next Question of the session's deck, dealing a new deck when
+        it is empty; None when its category is used up
+    '''
+    while True:
+      if not session.deck:
+        with self.lock:
+          self.refresh()
+          session.deal(self.pools.get(session.category) or IdPool())
+        if not session.deck:
+          return None
+      question_id = session.deck.pop()
+      question = Question.query.get(question_id)
+      # deleted or moved by another process since it was dealt
+      if question is None:
+        self.discard(question_id, session.category)
+      elif session.category not in (ALL_CATEGORIES, category_key(question.category)):
+        self.move(question_id, session.category, question.category)
+      else:
+        return question
+
+
+class QuizSessions(object):
+  '''
+  token -> QuizSession, least recently used first
+  '''
+
+  def __init__(self, max_sessions=QUIZ_SESSIONS_MAX):
+    self.lock = threading.Lock()
+    self.sessions = OrderedDict()
+    self.max_sessions = max_sessions
+
+  def start(self, category):
+    session = QuizSession(category)
+    with self.lock:
+      self.expire()
+      self.sessions[session.token] = session
+      while len(self.sessions) > self.max_sessions:
+        self.sessions.popitem(last=False)
+    return session
+
+  def get(self, token):
+    with self.lock:
+      self.expire()
+      session = self.sessions.get(token)
+      if session is not None:
+        session.last_used = time.monotonic()
+        self.sessions.move_to_end(token)
+      return session
+
+  def expire(self):
+    cutoff = time.monotonic() - QUIZ_SESSION_SECONDS
+    while self.sessions:
+      token, session = next(iter(self.sessions.items()))
+      if session.last_used >= cutoff:
+        break
+      del self.sessions[token]
+
+
+quiz_index = QuizIndex()
+quiz_sessions = QuizSessions()
+
+
+def question_updated(mapper, connection, target):
+  history = inspect(target).attrs.category.history
+  if history.deleted:
+    quiz_index.move(target.id, history.deleted[0], target.category)
+
+
+event.listen(Question, 'after_insert', lambda mapper, conn, target: quiz_index.add(target.id, target.category))
+event.listen(Question, 'after_update', question_updated)
+event.listen(Question, 'after_delete', lambda mapper, conn, target: quiz_index.discard(target.id, target.category))
+event.listen(Question.__table__, 'after_create', lambda *args, **kw: quiz_index.reset())
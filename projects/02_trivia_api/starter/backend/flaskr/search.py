@@ -0,0 +1,172 @@
+'''
+Ranked question search.
+
+Every word of the search term must prefix-match a word of the question.
+Matches are ranked by how often, and how rarely across the bank, the
+words occur, optionally restricted to one category, and paged.
+
+On Postgres the matching reads ix_questions_search, a GIN index on
+to_tsvector('simple', question) (migrations/001_question_search.sql), which
+Postgres keeps current on every insert, update and delete; ts_rank ranks
+and a window count gives the total in the same statement. Other databases
+(SQLite in tests and benchmarks) use an in-process inverted index, built on
+first use and kept current by the Question mapper events.
+'''
+
+import heapq
+import math
+import re
+from bisect import bisect_left
+
+from sqlalchemy import DDL, event, func, inspect, literal_column
+
+from models import db, Question
+
+# literals rather than parameters, so that the planner matches the index expression
+SEARCH_CONFIG = literal_column("'simple'")
+SEARCH_VECTOR = func.to_tsvector(SEARCH_CONFIG, func.coalesce(Question.question, literal_column("''")))
+
+# the same index as the migration, for databases made by create_all
+event.listen(Question.__table__, 'after_create', DDL(
+  "CREATE INDEX IF NOT EXISTS ix_questions_search ON questions "
+  "USING gin (to_tsvector('simple', coalesce(question, '')))").execute_if(dialect='postgresql'))
+
+
+def tokenize(text):
+  return re.findall(r'\w+', (text or '').lower())
+
+
+def search_questions(term, category=None, page=1, per_page=10):
+  '''
+  search_questions(term, category=None, page=1, per_page=10)
+      {"questions": [Question], "total": count} for one page of matches,
+      best first; an empty term matches nothing
+  '''
+  tokens = tokenize(term)
+  offset = (page - 1) * per_page
+  if not tokens:
+    return {'questions': [], 'total': 0}
+  if db.engine.dialect.name == 'postgresql':
+    return search_postgres(tokens, category, offset, per_page)
+  return memory_index.search(tokens, category, offset, per_page)
+
+
+def search_postgres(tokens, category, offset, limit):
+  tsquery = func.to_tsquery(SEARCH_CONFIG, ' & '.join(f'{token}:*' for token in tokens))
+  query = db.session.query(Question, func.count().over().label('total')) \
+    .filter(SEARCH_VECTOR.op('@@')(tsquery))
+  if category is not None:
+    query = query.filter(Question.category == category)
+  rows = query.order_by(func.ts_rank(SEARCH_VECTOR, tsquery).desc(), Question.id) \
+    .offset(offset).limit(limit).all()
+  return {
+    'questions': [question for question, total in rows],
+    'total': rows[0].total if rows else 0
+  }
+
+
+class MemoryIndex(object):
+  '''
+  In-process inverted index of Question.question: token -> {id: count}.
+  Rows written with Core bulk inserts bypass the mapper events; call
+  reset() afterwards.
+  '''
+
+  def __init__(self):
+    self.reset()
+
+  def reset(self):
+    self.categories = None   # id -> category
+    self.tokens = {}         # id -> its tokens
+    self.postings = {}       # token -> {id: occurrences}
+    self.vocabulary = []     # sorted tokens, rebuilt lazily
+
+  def build(self):
+    self.categories, self.tokens, self.postings = {}, {}, {}
+    rows = db.session.query(Question.id, Question.question, Question.category)
+    for question_id, text, category in rows.yield_per(10000):
+      self.add(question_id, text, category)
+    self.vocabulary = sorted(self.postings)
+
+  def add(self, question_id, text, category):
+    self.categories[question_id] = str(category)
+    tokens = tokenize(text)
+    self.tokens[question_id] = set(tokens)
+    for token in tokens:
+      ids = self.postings.setdefault(token, {})
+      ids[question_id] = ids.get(question_id, 0) + 1
+    self.vocabulary = None
+
+  def remove(self, question_id):
+    if self.categories is None or self.categories.pop(question_id, None) is None:
+      return
+    for token in self.tokens.pop(question_id):
+      del self.postings[token][question_id]
+      if not self.postings[token]:
+        del self.postings[token]
+    self.vocabulary = None
+
+  def sync(self, question):
+    if self.categories is None:
+      return
+    self.remove(question.id)
+    self.add(question.id, question.question, question.category)
+
+  def expand(self, prefix):
+    # indexed tokens starting with ``prefix``
+    i = bisect_left(self.vocabulary, prefix)
+    tokens = []
+    while i < len(self.vocabulary) and self.vocabulary[i].startswith(prefix):
+      tokens.append(self.vocabulary[i])
+      i += 1
+    return tokens
+
+  def search(self, tokens, category, offset, limit):
+    if self.categories is None:
+      self.build()
+    if self.vocabulary is None:
+      self.vocabulary = sorted(self.postings)
+
+    # intersect the words' id sets, smallest first, then score the matches:
+    # occurrences x idf of every token a word starts
+    expanded = sorted((self.expand(token) for token in tokens),
+                      key=lambda words: sum(len(self.postings[word]) for word in words))
+    matched = None
+    for words in expanded:
+      ids = set()
+      for word in words:
+        ids.update(self.postings[word].keys() if matched is None else
+                   self.postings[word].keys() & matched)
+      matched = ids
+    if category is not None:
+      matched = {i for i in matched if self.categories[i] == str(category)}
+    scores = dict.fromkeys(matched, 0)
+    for words in expanded:
+      for word in words:
+        ids = self.postings[word]
+        weight = math.log(1 + len(self.categories) / len(ids))
+        for question_id in ids.keys() & matched:
+          scores[question_id] += ids[question_id] * weight
+
+    page_ids = heapq.nsmallest(offset + limit, scores, key=lambda i: (-scores[i], i))[offset:]
+    questions = {question.id: question
+                 for question in Question.query.filter(Question.id.in_(page_ids))} if page_ids else {}
+    return {
+      'questions': [questions[i] for i in page_ids if i in questions],
+      'total': len(scores)
+    }
+
+
+memory_index = MemoryIndex()
+
+
+def question_updated(mapper, connection, target):
+  state = inspect(target)
+  if state.attrs.question.history.has_changes() or state.attrs.category.history.has_changes():
+    memory_index.sync(target)
+
+
+event.listen(Question, 'after_insert', lambda mapper, conn, target: memory_index.sync(target))
+event.listen(Question, 'after_update', question_updated)
+event.listen(Question, 'after_delete', lambda mapper, conn, target: memory_index.remove(target.id))
+event.listen(Question.__table__, 'after_create', lambda *args, **kw: memory_index.reset())
@@ -0,0 +1,14 @@
+--
+-- Full-text index for question search (flaskr/search.py).
+--
+-- The expression must match SEARCH_VECTOR in flaskr/search.py for the
+-- planner to use the index. Postgres maintains it on every insert, update
+-- and delete. CONCURRENTLY keeps the table writable while it is built, so
+-- run this outside a transaction:
+--
+--     psql trivia < migrations/001_question_search.sql
+--
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_questions_search
+    ON public.questions
+    USING gin (to_tsvector('simple', coalesce(question, '')));
@@ -1,3 +1,4 @@
+import io
 import os
 import unittest
 import json
@@ -5,6 +6,7 @@ from flask_sqlalchemy import SQLAlchemy
 
 from flaskr import create_app
 from models import setup_db, Question, Category
+from flaskr.quiz import QuizSessions, ALL_CATEGORIES
 
 
 class TriviaTestCase(unittest.TestCase):
@@ -34,6 +36,229 @@ class TriviaTestCase(unittest.TestCase):
     Write at least one test for each test for successful operation and for expected errors.
     """
 
+    def test_get_categories(self):
+        res = self.client().get('/categories')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertTrue(len(data['categories']))
+        self.assertIn('max-age', res.headers['Cache-Control'])
+
+        res = self.client().get('/categories', headers={'If-None-Match': res.headers['ETag']})
+        self.assertEqual(res.status_code, 304)
+
+    def test_get_paginated_questions(self):
+        res = self.client().get('/questions?page=1')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertTrue(data['total_questions'])
+        self.assertTrue(len(data['questions']))
+        self.assertLessEqual(len(data['questions']), 10)
+        self.assertTrue(len(data['categories']))
+
+    def test_cursor_pages_match_page_numbers(self):
+        by_cursor, url = [], '/questions'
+        while url:
+            data = json.loads(self.client().get(url).data)
+            by_cursor += [question['id'] for question in data['questions']]
+            url = data['next_cursor'] and '/questions?cursor=' + data['next_cursor']
+
+        by_page, page = [], 1
+        while True:
+            data = json.loads(self.client().get(f'/questions?page={page}').data)
+            by_page += [question['id'] for question in data['questions']]
+            if not data['next_cursor']:
+                break
+            page += 1
+        # jumping back to the first pages goes through the cached anchors
+        data = json.loads(self.client().get('/questions?page=2').data)
+
+        self.assertEqual(by_cursor, by_page)
+        self.assertEqual(by_cursor, sorted(set(by_cursor)))
+        self.assertEqual(len(by_cursor), data['total_questions'])
+        self.assertEqual([question['id'] for question in data['questions']], by_page[10:20])
+
+    def test_404_requesting_beyond_valid_page(self):
+        res = self.client().get('/questions?page=1000')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'resource not found')
+
+    def test_400_for_invalid_cursor(self):
+        res = self.client().get('/questions?cursor=not-a-cursor')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    def test_search_questions(self):
+        with self.app.app_context():
+            question = Question('What is the title of the tallest tower in Paris?', 'Eiffel Tower', '3', 1)
+            question.insert()
+            added_id, category = question.id, question.category
+
+        res = self.client().post('/questions', json={'searchTerm': 'TITLE'})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        ids = [question['id'] for question in data['questions']]
+        self.assertIn(added_id, ids)
+        self.assertEqual(data['total_questions'], len(ids))
+        self.assertTrue(all('title' in question['question'].lower() for question in data['questions']))
+
+        # every word has to match, by prefix; the category narrows it down
+        data = json.loads(self.client().post('/questions', json={
+            'searchTerm': 'tall tow', 'category': category}).data)
+        self.assertEqual([question['id'] for question in data['questions']], [added_id])
+
+        with self.app.app_context():
+            Question.query.get(added_id).delete()
+        data = json.loads(self.client().post('/questions', json={'searchTerm': 'tall tow'}).data)
+        self.assertEqual(data['total_questions'], 0)
+
+    def test_422_search_with_invalid_page(self):
+        res = self.client().post('/questions', json={'searchTerm': 'title', 'page': 0})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data['success'], False)
+
+    def test_import_questions_jsonl(self):
+        lines = [
+            {'question': 'Which element has the symbol Fe?', 'answer': 'Iron', 'category': 'Science', 'difficulty': 2},
+            {'question': 'which element has the symbol  FE', 'answer': 'Iron', 'category': 1, 'difficulty': 2},
+            {'question': 'WHO discovered penicillin', 'answer': 'Fleming', 'category': 1, 'difficulty': 3},
+            {'question': 'Who painted Guernica?', 'answer': 'Picasso', 'category': 'Painting', 'difficulty': 2},
+            {'question': 'Who wrote Hamlet?', 'answer': 'Shakespeare', 'category': 4, 'difficulty': 9},
+        ]
+        body = '\n'.join(json.dumps(line) for line in lines) + '\n{not json\n'
+
+        res = self.client().post('/questions/import?format=jsonl', data=body,
+                                 content_type='application/x-ndjson')
+        data = json.loads(res.data)
+        with self.app.app_context():
+            added = Question.query.filter_by(question='Which element has the symbol Fe?').all()
+            for question in added:
+                question.delete()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((data['accepted'], data['duplicates'], data['rejected']), (1, 2, 3))
+        self.assertEqual([reject['line'] for reject in data['rejects']], [4, 5, 6])
+        self.assertEqual(len(added), 1)
+        self.assertEqual(str(added[0].category), '1')
+
+    def test_import_questions_csv_upload(self):
+        upload = (io.BytesIO(b'question,answer,category,difficulty\n'
+                             b'What is the capital of Peru?,Lima,Geography,1\n'
+                             b'What is the capital of Chile?,Santiago,3,two\n'), 'questions.csv')
+
+        res = self.client().post('/questions/import', data={'file': upload},
+                                 content_type='multipart/form-data')
+        data = json.loads(res.data)
+        with self.app.app_context():
+            for question in Question.query.filter(Question.question.like('What is the capital of %')):
+                question.delete()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((data['accepted'], data['duplicates'], data['rejected']), (1, 0, 1))
+        self.assertEqual(data['rejects'][0]['line'], 3)
+
+    def test_422_import_csv_without_fields(self):
+        res = self.client().post('/questions/import?format=csv', data='question,answer\nA?,B\n')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data['success'], False)
+
+    def test_play_quiz_excludes_previous_questions(self):
+        with self.app.app_context():
+            category = Question.query.first().category
+            ids = [question.id for question in Question.query.filter_by(category=category)]
+        quiz_category = {'id': category, 'type': 'any'}
+
+        res = self.client().post('/quizzes', json={
+            'previous_questions': ids[1:], 'quiz_category': quiz_category})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['question']['id'], ids[0])
+        self.assertIsNone(data['quiz_token'])
+
+        data = json.loads(self.client().post('/quizzes', json={
+            'previous_questions': ids, 'quiz_category': quiz_category}).data)
+        self.assertIsNone(data['question'])
+
+    def test_quiz_session_asks_every_question_once(self):
+        with self.app.app_context():
+            question = Question('Which planet is the largest?', 'Jupiter', '1', 1)
+            question.insert()
+            added_id = question.id
+            ids = {question.id for question in Question.query.filter_by(category='1')}
+
+        data = json.loads(self.client().post('/quizzes', json={
+            'previous_questions': [], 'quiz_category': {'id': '1', 'type': 'Science'}}).data)
+        token, asked = data['quiz_token'], []
+        while data['question']:
+            asked.append(data['question']['id'])
+            data = json.loads(self.client().post('/quizzes', json={'quiz_token': token}).data)
+
+        with self.app.app_context():
+            Question.query.get(added_id).delete()
+        self.assertEqual(len(asked), len(set(asked)))
+        self.assertEqual(set(asked), ids)
+
+    def test_quiz_deck_is_dealt_again_until_all_are_asked(self):
+        data = json.loads(self.client().post('/quizzes', json={
+            'previous_questions': [], 'quiz_category': {'id': 0, 'type': 'click'}}).data)
+        token, asked = data['quiz_token'], []
+        while data['question']:
+            asked.append(data['question']['id'])
+            data = json.loads(self.client().post('/quizzes', json={'quiz_token': token}).data)
+
+        with self.app.app_context():
+            self.assertEqual(sorted(asked), [question.id for question in Question.query.order_by(Question.id)])
+
+    def test_quiz_sessions_evict_least_recently_used(self):
+        sessions = QuizSessions(max_sessions=2)
+        first, second = sessions.start(ALL_CATEGORIES), sessions.start(ALL_CATEGORIES)
+        sessions.get(first.token)
+        third = sessions.start(ALL_CATEGORIES)
+
+        self.assertIs(sessions.get(first.token), first)
+        self.assertIsNone(sessions.get(second.token))
+        self.assertIs(sessions.get(third.token), third)
+
+    def test_unknown_quiz_token_falls_back_to_previous_questions(self):
+        with self.app.app_context():
+            ids = [question.id for question in Question.query.filter_by(category='1')]
+
+        res = self.client().post('/quizzes', json={
+            'quiz_token': 'another-worker', 'previous_questions': ids[1:],
+            'quiz_category': {'id': '1', 'type': 'Science'}})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['question']['id'], ids[0])
+        self.assertIsNone(data['quiz_token'])
+
+    def test_404_unknown_quiz_token(self):
+        res = self.client().post('/quizzes', json={'quiz_token': 'expired'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def test_422_invalid_previous_questions(self):
+        res = self.client().post('/quizzes', json={
+            'previous_questions': 'all', 'quiz_category': {'id': 0, 'type': 'click'}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data['success'], False)
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
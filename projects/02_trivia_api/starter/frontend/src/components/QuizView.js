@@ -10,6 +10,7 @@ class QuizView extends Component {
     super();
     this.state = {
         quizCategory: null,
+        quizToken: null,
         previousQuestions: [], 
         showAnswer: false,
         categories: {},
@@ -52,9 +53,12 @@ class QuizView extends Component {
       type: "POST",
       dataType: 'json',
       contentType: 'application/json',
+      // the session's token, plus what a server without the session (another
+      // worker, a restart, an evicted session) needs to answer statelessly
       data: JSON.stringify({
         previous_questions: previousQuestions,
-        quiz_category: this.state.quizCategory
+        quiz_category: this.state.quizCategory,
+        quiz_token: this.state.quizToken || undefined
       }),
       xhrFields: {
         withCredentials: true
@@ -64,6 +68,7 @@ class QuizView extends Component {
         this.setState({
           showAnswer: false,
           previousQuestions: previousQuestions,
+          quizToken: result.quiz_token,
           currentQuestion: result.question,
           guess: '',
           forceEnd: result.question ? false : true
@@ -90,6 +95,7 @@ class QuizView extends Component {
   restartGame = () => {
     this.setState({
       quizCategory: null,
+      quizToken: null,
       previousQuestions: [], 
       showAnswer: false,
       numCorrect: 0,